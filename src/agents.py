@@ -1,8 +1,12 @@
 from util import raiseNotDefined
 from util import raiseErrorAtLoc
+import os
 import random
+import numpy as np
 from actions import Actions
-from diskIO import readPolicy
+from diskIO import readPolicy, readPolicyTable, writePolicyTable, Policy
+from diskIO import policyStateCode, policyStates, handTypeIdx, CAN_HIT, CAN_DOUBLE, CAN_SPLIT, N_POLICY_STATES
+import probability
 
 class Agent():
     """
@@ -34,8 +38,12 @@ class Player(Agent):
     """
     Base player class that all player types inherit fromt
     """
-    def __init__(self, startingMoney):
-        """ Set the players amount of money and bet amount """
+    def __init__(self, startingMoney, rng = None):
+        """
+        Set the players amount of money and bet amount
+        rng is a random.Random the player makes its random choices with, or None for the global random module
+        """
+        self.rng = rng if rng is not None else random
         self.money = int(startingMoney)
         self.betAmt = 10
         self.wins = 0
@@ -94,6 +102,24 @@ class Player(Agent):
 
         return validActions
 
+    def getLegalMask(self, gameState):
+        """
+        Same as getValidActions, as a diskIO legality mask
+        returns: (int) mask with CAN_HIT, CAN_DOUBLE, CAN_SPLIT bits set for valid actions
+        """
+        playerHand = gameState.getCurrentPlayableHand()
+        if playerHand.isBlackjack():
+            return 0
+
+        legalMask = 0
+        if Actions.isHitValid(playerHand):
+            legalMask |= CAN_HIT
+        if Actions.isDoubleDownValid(playerHand, gameState):
+            legalMask |= CAN_DOUBLE
+        if Actions.isSplitValid(playerHand, gameState):
+            legalMask |= CAN_SPLIT
+        return legalMask
+
     def bet(self, gameState):
         """
         Bet either self.betAmt or the max money you have if you have less than that
@@ -110,11 +136,11 @@ class Random(Player):
     A Random blackjack player
     Chooses randomly from valid actions at every state
     """
-    def __init__(self, startingMoney):
-        super().__init__(startingMoney)
+    def __init__(self, startingMoney, rng = None):
+        super().__init__(startingMoney, rng)
 
     def getAction(self, gameState):
-        return random.choice(self.getValidActions(gameState))
+        return self.rng.choice(self.getValidActions(gameState))
 
 class UserPlayer(Player):
     """
@@ -200,139 +226,78 @@ class OptimalPlayer(Player):
         """ Return dealer hand value """
         return dealerHand.getHandValue()
 
-    def getAction(self, gameState):
+    def getStateCode(self, gameState):
         """
-        Get the features of the hand and lookup in policy which action to return
+        Get the features of the hand as a single policy state code
+        A pair is only a 'double' hand type while it can still be split, otherwise it's hard or soft
         """
-        dealerHand = gameState.getDealerHand()
         playerHand = gameState.getCurrentPlayableHand()
+        legalMask = self.getLegalMask(gameState)
 
-        legalActions = self.getValidActions(gameState)
-
-        # params for policy.getActionsFromPolicy
-        handType = self.getHandType(playerHand)
-
-        # If split not allowed (after a previous split in same hand), the hand is no longer
-        # considered a doubles but is hard or soft
-        if (handType == 'double' and Actions.SPLIT not in legalActions):
-            handType = 'hard' if playerHand.isHard() else 'soft'
+        if legalMask & CAN_SPLIT:
+            typeIdx = handTypeIdx['double']
+            playerVal = self.getPlayerVal(playerHand, 'double')
+        else:
+            typeIdx = handTypeIdx['hard' if playerHand.isHard() else 'soft']
+            playerVal = playerHand.getHandValue()
 
-        playerVal = self.getPlayerVal(playerHand, handType)
-        dealerVal = self.getDealerVal(dealerHand)
+        return policyStateCode(typeIdx, playerVal, gameState.getDealerHand().getHandValue(), legalMask)
 
-        actionList = self.policy.getActionsFromPolicy(handType, playerVal, dealerVal)
-        
-        # Return legal action from policy
-        for action in actionList:
-            if action in legalActions:
-                return action
+    def getAction(self, gameState):
+        """
+        Lookup in the compiled policy which legal action to return
+        """
+        return self.policy.getAction(self.getStateCode(gameState))
 
-class Expectimax(Player):
+class Expectimax(OptimalPlayer):
     """
     Player that implements an expectimax policy for choosing actions
+    Chance nodes are exact draws from the infinite deck and the dealer plays out to 17 from the upcard
+    (see probability.py). Every decision state is solved once when the agent is made, into a compiled
+    policy table like the optimal player's, so an action is a table lookup. The table can be kept in
+    a file so later runs load it instead of solving again
     """
-    def __init__(self, startingMoney):
-        # Init player parent
-        super().__init__(startingMoney)
-        self.avgVal = float(4*(1+2+3+4+5+6+7+8+9+10+10+10+10))/float(52)
-
-    def getAction(self, gameState):
+    def __init__(self, startingMoney, tablePath = None):
         """
-        GetAction for UserPlayer prints valid actions and asks for input for the action to take
-        input: gameState of current game
-        returns: action to take
+        input: tablePath
+            file to load the solved table from, or to write it to if it doesn't hold one yet. None to always solve
         """
+        self.tablePath = tablePath
+        # Init optimal player parent, which loads the policy
+        super().__init__(startingMoney)
 
-        """
-        Get the expected dealer hand value using the dealers current hand and
-        the average value of a deck
-        """
-        averageValue = self.avgVal
-        dVal = gameState.dealerHand.getHandValue()
-        while dVal < 17:
-            dVal += averageValue
-        hand = gameState.getCurrentPlayableHand()
-        handVal = hand.getHandValue()
-        splitPossible = hand.isDoubles()
-
-        # Overall function that tests for an end state and returns a score
-        def overall(self, state, agent, pStand, dealerVal, bet):
-            if pStand or state > 21:
-                pBust = state > 21
-                if pBust:
-                    return [-bet]
-                elif dealerVal > 21:
-                    return [bet]
-                elif dealerVal > state:
-                    return [-bet]
-                elif state > dealerVal:
-                    return [bet]
-                else:
-                    return [0]
-
-            if agent == 0:
-                return maxVal(self, state, agent, pStand, dealerVal, bet)
-            else:
-                return expVal(self, state, agent, pStand, dealerVal, bet)
-
-        # if its the agents turn, then take the maximum of the possible actions
-        def maxVal(self, state, agent, pStand, dealerVal, bet):
-
-            # initialize a highschore (in a list so we can add optimal action)
-            highScore = [float('-inf')]
-
-            # get possible actions for first turn
-            if splitPossible:
-                actions = [Actions.HIT, Actions.STAND, Actions.DOUBLE_DOWN, Actions.SPLIT]
-            else:
-                actions = [Actions.HIT, Actions.STAND, Actions.DOUBLE_DOWN]
-
-            # keep the max action score of the actions
-            for action in actions:
-                if action == Actions.SPLIT:
-                    score1 = overall(self, state/2, 1, False, dealerVal, bet)
-                    score2 = overall(self, state/2, 1, False, dealerVal, bet)
-                    if score1[0] + score2[0] >= highScore[0]:
-                        highScore = [score1[0] + score2[0], action]
-                else:
-                    nS = generateSuccessor(state, pStand, bet, action)
-                    score = overall(self, nS[0], 1, nS[1], dealerVal, nS[2])
-                    if score[0] >= highScore[0]:
-                        highScore = [score[0], action]
-            return highScore
-
-        # for all subsequent turns, take the expected val of possible actions
-        def expVal(self, state, agent, pStand, dealerVal, bet):
-
-            highScore = [0]
-            actions = [Actions.HIT, Actions.STAND]
-
-            # accumulate expected val of actions
-            for action in actions:
-                nS = generateSuccessor(state, pStand, bet, action)
-                score = overall(self, nS[0], 1, nS[1], dealerVal, nS[2])
-                highScore[0] += float(score[0])/float(len(actions))
-                # print(state.getPlayerHands() == og, '****')
-            return highScore
-
-        # depending on the action, update the card val, stand status, and bet
-        def generateSuccessor(state, pStand, bet, action):
-            averageValue = self.avgVal
-            if action == Actions.HIT:
-                newState = state + averageValue
-                newStand = pStand
-                newBet = bet
-            if action == Actions.STAND:
-                newStand = True
-                newState = state
-                newBet = bet
-            if action == Actions.DOUBLE_DOWN:
-                newBet = bet*2
-                newState = state + averageValue
-                newStand = True
-            return [newState, newStand, newBet]
-
-        return overall(self, handVal, 0, False, dVal, gameState.bets[gameState.playerHandIdx])[1]
+    def loadPolicy(self):
+        """ Load the solved table from self.tablePath if it has one, otherwise solve it (and write it there) """
+        if self.tablePath is not None and os.path.exists(self.tablePath):
+            try:
+                self.policy = readPolicyTable(self.tablePath)
+                return
+            except (ValueError, EOFError):
+                # Not a table this version can read, solve it again and replace it
+                pass
+        self.policy = self.solvePolicy()
+        if self.tablePath is not None:
+            writePolicyTable(self.policy, self.tablePath)
+
+    def getActionValues(self, total, soft, pairVal, upcard, legalMask):
+        """ Expected payout per unit bet of each action the legality mask allows """
+        values = {Actions.STAND : probability.standEV(total, upcard)}
+        if legalMask & CAN_HIT:
+            values[Actions.HIT] = probability.hitEV(total, soft, upcard)
+        if legalMask & CAN_DOUBLE:
+            values[Actions.DOUBLE_DOWN] = probability.doubleEV(total, soft, upcard)
+        if legalMask & CAN_SPLIT:
+            values[Actions.SPLIT] = probability.splitEV(pairVal, upcard)
+        return values
+
+    def solvePolicy(self):
+        """ Policy whose compiled table holds the legal action with the highest expected payout for every state code """
+        policy = Policy()
+        policy.table = [None] * N_POLICY_STATES
+        for handType, playerVal, total, soft, upcard, legalMask in policyStates():
+            values = self.getActionValues(total, soft, playerVal, upcard, legalMask)
+            policy.table[policyStateCode(handTypeIdx[handType], playerVal, upcard, legalMask)] = max(values, key = lambda act: values[act])
+        return policy
 
 
 """                                             """
@@ -353,6 +318,15 @@ class QState():
         self.playerVal = playerHand.getHandValue()
         self.hard = playerHand.isHard()
 
+    @staticmethod
+    def fromValues(dealerVal, playerVal, hard):
+        """ QState with the given features, without a gameState """
+        qstate = QState.__new__(QState)
+        qstate.dealerVal = dealerVal
+        qstate.playerVal = playerVal
+        qstate.hard = hard
+        return qstate
+
     def __eq__(self, other):
         """ Two QStates equal IFF dealervalue, playervalue, and hand hardness are same """
         inst = isinstance(other, QState)
@@ -368,24 +342,70 @@ class QState():
         return hash( (self.dealerVal, self.playerVal, self.hard) )
 
 
+"""
+The Q-learner's tables are dense arrays with a row per (dealerVal, playerVal, hard) state
+and a column per action, in the order of Actions.allActs
+"""
+STAND_IDX = 1
+actionIdx = {action : idx for idx, action in enumerate(Actions.allActs)}
+
+# Dealer values go up to 11 (an ace showing), player values up to 30 (20 plus a 10 busts)
+N_DEALER_VALS = 12
+N_PLAYER_VALS = 31
+N_QSTATES = N_DEALER_VALS * N_PLAYER_VALS * 2
+
+def qStateIdx(dealerVal, playerVal, hard):
+    """ Row of the (dealerVal, playerVal, hard) state in the Q and N tables """
+    return (dealerVal * N_PLAYER_VALS + playerVal) * 2 + hard
+
+# Legal action indices for each (can hit, can double, can split), standing is always legal
+legalActionIdx = {}
+for canHit in (False, True):
+    for canDouble in (False, True):
+        for canSplit in (False, True):
+            flags = [canHit, True, canDouble, canSplit]
+            legalActionIdx[(canHit, canDouble, canSplit)] = tuple(idx for idx in range(len(flags)) if flags[idx])
+
+
 class QLearning(Player):
     """
     Implements a QLearning algorithm for policy improvement to play blackjack
     """
-    
-    def __init__(self, startingMoney, numTraining, discount=.3):
+
+    def __init__(self, startingMoney, numTraining, discount=.3, rng = None):
         """
-        Init parent, init Q dictionary and N dictionary, 
-        and varaibles to keep track of training vs testing 
+        Init parent, init Q table and N table,
+        and varaibles to keep track of training vs testing
         """
-        super().__init__(startingMoney)
+        super().__init__(startingMoney, rng)
         self.discount = float(discount)
         self.numTraining = int(numTraining)
-        self.QValues = {}                   # Q(s,a) nested dictionary, value of a state is QValues[<Qstate>][<action>]
-        self.NVisited = {}                  # N(s,a) nested dictionary, number of updates to QValues is NVisited[<Qstate>][<action>]
+        self.QValues = np.zeros((N_QSTATES, len(Actions.allActs)))   # Q(s,a) table, value of a state is QValues[<qStateIdx>, <actionIdx>]
+        self.NVisited = np.zeros((N_QSTATES, len(Actions.allActs)))  # N(s,a) table, number of updates to QValues
+        self.seen = np.zeros(N_QSTATES, dtype=bool)                    # States whose Q values have been looked up
         self.omega = .97                    # Used in hyperharmonic alpha calculation
         self.episodeNumber = 0
 
+    def getStateIdx(self, gameState):
+        """ Return (row of gameState in the Q and N tables, player's hand value) """
+        playerHand = gameState.getCurrentPlayableHand()
+        playerVal = playerHand.getHandValue()
+        return qStateIdx(gameState.getDealerHand().getHandValue(), playerVal, playerHand.isHard()), playerVal
+
+    def getValidActionIdx(self, gameState):
+        """ Same as getValidActions, as a tuple of action indices """
+        try:
+            playerHand = gameState.getCurrentPlayableHand()
+        except IndexError as e:
+            return ()
+
+        if playerHand.isBlackjack():
+            return (STAND_IDX,)
+
+        return legalActionIdx[(Actions.isHitValid(playerHand),
+                               Actions.isDoubleDownValid(playerHand, gameState),
+                               Actions.isSplitValid(playerHand, gameState))]
+
     def isTraining(self):
         """ Is agent training or testing """
         return self.episodeNumber < self.numTraining
@@ -398,7 +418,7 @@ class QLearning(Player):
         """
         Get epsilon value for Q value updates
         While training, bias towards high randomness
-        When testing, epsilon is 0 for determinsitic action 
+        When testing, epsilon is 0 for determinsitic action
         """
         fracPlayed = self.episodeNumber / float(self.numTraining)
         if fracPlayed < .9:
@@ -408,96 +428,98 @@ class QLearning(Player):
         else:
             return 0.0
 
+    def getAlphaIdx(self, stateIdx, actIdx):
+        """ Count a visit to (s,a) and return alpha = 1 / (N(s,a) ^ omega) """
+        self.NVisited[stateIdx, actIdx] += 1
+        return 1 / float(self.NVisited[stateIdx, actIdx] ** self.omega)
+
     def getAlpha(self, state, action):
-        """ 
+        """
         Get the learning rate for a state, action pair
-        Uses hyperharmonic strategy to have higher learning rate 
+        Uses hyperharmonic strategy to have higher learning rate
         for states that havent been visited as much
         alpha = 1 / (N(s,a) ^ omega)
         """
-        qstate = QState(state)
-        if qstate not in self.NVisited:
-            self.NVisited[qstate] = {
-                Actions.HIT : 0,
-                Actions.STAND : 0,
-                Actions.DOUBLE_DOWN : 0,
-                Actions.SPLIT : 0
-            }
-        self.NVisited[qstate][action] += 1
-        return 1 / float(self.NVisited[qstate][action] ** self.omega)
+        return self.getAlphaIdx(self.getStateIdx(state)[0], actionIdx[action])
+
+    def getQValueIdx(self, stateIdx, playerVal, actIdx):
+        """ Return Q(s,a) from table indices, a busted state is worth -100 """
+        if playerVal > 21:
+            return -100.0
+        self.seen[stateIdx] = True
+        return self.QValues[stateIdx, actIdx]
 
     def getQValue(self, gameState, action):
         """ Return Q(s,a) """
-        qstate = QState(gameState)
-
-        if qstate not in self.QValues:
-            # if state is a bust, the value is just -100
-            if qstate.playerVal > 21 and qstate.dealerVal <= 21:
-                if qstate.dealerVal <= 21:
-                    return -100.0
-                else:
-                    return 0
-            else:
-                # Insert new state into dict if never visted
-                self.QValues[qstate] = {
-                    Actions.HIT: 0.0,
-                    Actions.STAND: 0.0,
-                    Actions.DOUBLE_DOWN: 0.0,
-                }
-                # no split unless even number
-                if (qstate.playerVal % 2 == 0):
-                    self.QValues[qstate][Actions.SPLIT] = 0.0
-
-        return self.QValues[qstate][action]
+        stateIdx, playerVal = self.getStateIdx(gameState)
+        return self.getQValueIdx(stateIdx, playerVal, actionIdx[action])
+
+    def computeActionIdx(self, stateIdx, playerVal, legalIdx):
+        """ Index of the legal action with the highest Q value, ties broken randomly """
+        max_value = -float("inf")
+        max_action = None
+        for actIdx in legalIdx:
+            value = self.getQValueIdx(stateIdx, playerVal, actIdx)
+            if value > max_value:
+                max_value = value
+                max_action = actIdx
+            elif value == max_value:
+                max_action = self.rng.choice((actIdx, max_action))
+        return max_action
 
     def getValue(self, state):
         '''
         Returns max_action Q(state, action)
         '''
-        if not self.getValidActions(state):
+        legalIdx = self.getValidActionIdx(state)
+        if not legalIdx:
             return 0.0
 
-        else:
-            return self.getQValue(state, self.computeActionFromQValues(state))
+        stateIdx, playerVal = self.getStateIdx(state)
+        return self.getQValueIdx(stateIdx, playerVal, self.computeActionIdx(stateIdx, playerVal, legalIdx))
 
     def computeActionFromQValues(self, state):
         '''
         Computes best action to take in a state
         '''
+        legalIdx = self.getValidActionIdx(state)
+        if not legalIdx:
+            return None
 
-        #initializes max value, action
-        max_value = -float("inf")
-        max_action = None
-
-        # iterates through possible actions and their values, returning argmax
-        for action in self.getValidActions(state):
-            value = self.getQValue(state, action)
-            if value > max_value:
-                max_value = value
-                max_action = action
-            elif value == max_value:
-                max_action = random.choice((action, max_action))
-
-        return max_action
+        stateIdx, playerVal = self.getStateIdx(state)
+        return Actions.allActs[self.computeActionIdx(stateIdx, playerVal, legalIdx)]
 
     def getAction(self, state):
         """ Get action from state using epsilon-greedy strategy """
-        legalActions = self.getValidActions(state)
-        action = None
         self.episodeNumber += 1
-        if random.uniform(0,1) < self.getEpsilon():
-            return random.choice(legalActions)
+        if self.rng.uniform(0,1) < self.getEpsilon():
+            return Actions.allActs[self.rng.choice(self.getValidActionIdx(state))]
         else:
             return self.computeActionFromQValues(state)
 
     def update(self, state, action, nextState, reward):
         """
-        Apply update rule update(s,a,r,s') 
+        Apply update rule update(s,a,r,s')
         Q(s,a) += alpha [r + discount * max_a Q(s',a) - Q(s,a)]
         """
-        qOriginal = self.getQValue(state, action)
-        error = self.getAlpha(state, action) * (reward + self.discount * self.getValue(nextState) - qOriginal)
-        legalActions = self.getValidActions(state)
-        qState = QState(state)
-        self.QValues[qState][action] = qOriginal + error
+        stateIdx, playerVal = self.getStateIdx(state)
+        actIdx = actionIdx[action]
+        qOriginal = self.getQValueIdx(stateIdx, playerVal, actIdx)
+        error = self.getAlphaIdx(stateIdx, actIdx) * (reward + self.discount * self.getValue(nextState) - qOriginal)
+        self.QValues[stateIdx, actIdx] = qOriginal + error
 
+    def getQDict(self):
+        """
+        Return Q(s,a) of the states that have been seen as a nested dictionary QDict[<QState>][<action>],
+        the form diskIO.QDictIO writes. Split is only an action for even player values
+        """
+        QDict = {}
+        for dealerVal in range(N_DEALER_VALS):
+            for playerVal in range(N_PLAYER_VALS):
+                for hard in (False, True):
+                    stateIdx = qStateIdx(dealerVal, playerVal, hard)
+                    if not self.seen[stateIdx]:
+                        continue
+                    actions = Actions.allActs if playerVal % 2 == 0 else [Actions.HIT, Actions.STAND, Actions.DOUBLE_DOWN]
+                    QDict[QState.fromValues(dealerVal, playerVal, hard)] = {action : float(self.QValues[stateIdx, actionIdx[action]]) for action in actions}
+        return QDict
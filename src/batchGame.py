@@ -0,0 +1,270 @@
+import numpy as np
+
+from deck import rankPoints, ACE_RANK
+from agents import Player, OptimalPlayer, Expectimax
+from actions import Actions
+from diskIO import policyStateCode, handTypeIdx, CAN_HIT, CAN_DOUBLE, CAN_SPLIT
+from runningStats import GameStats, outcomeOrder
+from probability import dealerTable
+
+"""
+Vectorized simulator that plays many hands at once as numpy arrays instead of one
+GameState at a time. Only works for agents whose action is a fixed function of the
+hand, ie the random agent and table driven policies like the optimal and expectimax players, and
+only for the infinite deck. Follows the same rules as GameState, quirks included
+"""
+
+# Action codes the batch engine works with, in the order of Actions.allActs
+HIT = 0
+STAND = 1
+DOUBLE_DOWN = 2
+SPLIT = 3
+
+actionCodes = {
+    Actions.HIT : HIT,
+    Actions.STAND : STAND,
+    Actions.DOUBLE_DOWN : DOUBLE_DOWN,
+    Actions.SPLIT : SPLIT
+}
+
+# Outcome codes, their index in outcomeOrder
+WIN = 0
+PUSH = 1
+BLACKJACK = 2
+LOSE = 3
+
+# Payout per unit bet of each outcome code
+outcomePayouts = np.array([1.0, 0.0, 1.5, -1.0])
+
+# Hard points of each card rank (aces are 1), and the value of a rank as the single card
+# in a dealer's hand or as the card of a pair in the policy (aces are 11)
+POINTS = np.array(rankPoints, dtype=np.int16)
+CARD_VALUES = np.where(np.arange(len(rankPoints)) == ACE_RANK, 11, POINTS).astype(np.int16)
+
+def policyTable(policy):
+    """
+    Turn the compiled table of a diskIO Policy into an array of action codes indexed by
+    policyStateCode. States without an action stand
+    """
+    return np.array([STAND if action is None else actionCodes[action] for action in policy.table], dtype=np.int8)
+
+def handValues(hard, aces):
+    """ Value of hands from their hard totals and ace counts, one ace counts 11 if it doesn't bust """
+    return hard + 10 * ((aces > 0) & (hard <= 11))
+
+class BatchGame():
+    """
+    BatchGame plays nHands hands for a fixed policy agent in chunks of chunkSize hands at a time,
+    and reports the same stats as Game.playGame
+    """
+    batchAgents = ['optimal', 'expectimax', 'random']
+
+    def __init__(self, agentType, nHands, startingMoney, seed = None, chunkSize = 1000000, expectimaxTable = None, policy = None):
+        """
+        input: agentType
+            'optimal', 'expectimax' or 'random'
+        input: nHands
+            number of hands to play at max if agent never runs out of money
+        input: startingMoney
+            the amount of money the agent gets to start with
+        input: seed
+            seed for the numpy card and action generator
+        input: chunkSize
+            number of hands simulated together in one set of arrays
+        input: expectimaxTable
+            file the expectimax agent keeps its solved policy table in
+        input: policy
+            compiled diskIO Policy to play instead of the agent type's, like a frozen q-learner's from houseEdge.chooserPolicy
+        """
+        self.agentType = agentType
+        self.nHands = int(nHands)
+        self.startingMoney = startingMoney
+        self.chunkSize = int(chunkSize)
+        self.rng = np.random.default_rng(seed)
+        self.betAmt = Player(startingMoney).getBetAmt()
+
+        self.dealerTable = dealerTable()
+        self.table = None
+        if policy is not None:
+            self.table = policyTable(policy)
+        elif agentType == 'optimal':
+            self.table = policyTable(OptimalPlayer(startingMoney).policy)
+        elif agentType == 'expectimax':
+            self.table = policyTable(Expectimax(startingMoney, expectimaxTable).policy)
+
+    def isValidGame(self):
+        """ Make sure the agent can be simulated in batches """
+        return self.agentType in self.batchAgents or self.table is not None
+
+    def drawRanks(self, n):
+        """ Deal n cards with replacement, returns their ranks """
+        return self.rng.integers(0, len(rankPoints), n, dtype=np.int8)
+
+    def chooseActions(self, hard, aces, rank0, rank1, dealerVal, canHit, canDouble, canSplit):
+        """ Pick an action code for each hand being played """
+        n = len(hard)
+        if self.table is None:
+            # Random agent, uniform over the legal actions
+            legal = np.stack([canHit, np.ones(n, dtype=bool), canDouble, canSplit], axis=1)
+            pick = (self.rng.random(n) * legal.sum(axis=1)).astype(np.int64)
+            return np.argmax(np.cumsum(legal, axis=1) > pick[:, None], axis=1)
+
+        # Table policy, one lookup of the compiled policy per hand. A pair is only a double while it can still be split
+        values = handValues(hard, aces)
+        soft = values != hard
+        typeIdx = np.where(canSplit, handTypeIdx['double'], np.where(soft, handTypeIdx['soft'], handTypeIdx['hard']))
+        playerVal = np.where(canSplit, CARD_VALUES[rank0], values)
+        legalMask = CAN_HIT * canHit + CAN_DOUBLE * canDouble + CAN_SPLIT * canSplit
+        return self.table[policyStateCode(typeIdx, playerVal, dealerVal, legalMask)]
+
+    def playChunk(self, n):
+        """
+        Play n hands at once
+        returns: (outcomes, bets, nPlayerHands) outcomes and bets are (n, 2) arrays, one column per hand
+            the player can have after a split, nPlayerHands says how many columns of each row are real hands
+        """
+        rows = np.arange(n)
+        hard = np.zeros((n, 2), dtype=np.int16)
+        aces = np.zeros((n, 2), dtype=np.int16)
+        nCards = np.zeros((n, 2), dtype=np.int16)
+        rank0 = np.zeros((n, 2), dtype=np.int8)
+        rank1 = np.zeros((n, 2), dtype=np.int8)
+        bets = np.zeros((n, 2), dtype=np.int64)
+        bets[:, 0] = self.betAmt
+        nPlayerHands = np.ones(n, dtype=np.int8)
+        handIdx = np.zeros(n, dtype=np.int8)
+
+        # Initial deal, 2 cards to the player and one to the dealer
+        rank0[:, 0] = self.drawRanks(n)
+        rank1[:, 0] = self.drawRanks(n)
+        hard[:, 0] = POINTS[rank0[:, 0]] + POINTS[rank1[:, 0]]
+        aces[:, 0] = (rank0[:, 0] == ACE_RANK).astype(np.int16) + (rank1[:, 0] == ACE_RANK)
+        nCards[:, 0] = 2
+
+        dealerRank = self.drawRanks(n)
+        dealerHard = POINTS[dealerRank]
+        dealerAces = (dealerRank == ACE_RANK).astype(np.int16)
+        dealerVal = CARD_VALUES[dealerRank]
+
+        # A dealt blackjack ends the hand right away
+        playing = handValues(hard[:, 0], aces[:, 0]) != 21
+
+        # Player turn, every iteration takes one action on the current hand of every row still playing
+        while playing.any():
+            idx = rows[playing]
+            h = handIdx[idx]
+            hHard = hard[idx, h]
+            hAces = aces[idx, h]
+            hCards = nCards[idx, h]
+            hRank0 = rank0[idx, h]
+            values = handValues(hHard, hAces)
+            oneHand = nPlayerHands[idx] == 1
+
+            twoCards = hCards == 2
+            blackjack = twoCards & (values == 21)
+            canHit = (values < 21) & ~blackjack
+            canDouble = oneHand & twoCards & ~blackjack
+            canSplit = oneHand & twoCards & (hRank0 == rank1[idx, h]) & ~blackjack
+
+            actions = self.chooseActions(hHard, hAces, hRank0, rank1[idx, h], dealerVal[idx], canHit, canDouble, canSplit)
+
+            # Hit and double down deal a card to the current hand
+            draw = (actions == HIT) | (actions == DOUBLE_DOWN)
+            dIdx, dH = idx[draw], h[draw]
+            newRanks = self.drawRanks(len(dIdx))
+            hard[dIdx, dH] += POINTS[newRanks]
+            aces[dIdx, dH] += newRanks == ACE_RANK
+            nCards[dIdx, dH] += 1
+
+            # Split the pair, each hand keeps one card and is dealt a new one
+            split = actions == SPLIT
+            sIdx = idx[split]
+            pairRank = rank0[sIdx, 0]
+            newRanks0 = self.drawRanks(len(sIdx))
+            newRanks1 = self.drawRanks(len(sIdx))
+            for hand, newRanks in ((0, newRanks0), (1, newRanks1)):
+                rank0[sIdx, hand] = pairRank
+                rank1[sIdx, hand] = newRanks
+                hard[sIdx, hand] = POINTS[pairRank] + POINTS[newRanks]
+                aces[sIdx, hand] = (pairRank == ACE_RANK).astype(np.int16) + (newRanks == ACE_RANK)
+                nCards[sIdx, hand] = 2
+            bets[sIdx, 1] = self.betAmt
+            nPlayerHands[sIdx] = 2
+
+            # Double down doubles the bet and ends the player's turn
+            double = actions == DOUBLE_DOWN
+            bets[idx[double], 0] += self.betAmt
+            playing[idx[double]] = False
+
+            # Standing or busting moves on to the next hand, or ends the turn after the last one
+            bust = (actions == HIT) & (handValues(hard[idx, h], aces[idx, h]) > 21)
+            nextHand = (actions == STAND) | bust
+            nIdx = idx[nextHand]
+            handIdx[nIdx] += 1
+            playing[nIdx[handIdx[nIdx] == nPlayerHands[nIdx]]] = False
+
+        playerVals = handValues(hard, aces)
+        lastHand = nPlayerHands - 1
+        handBlackjack = (nCards == 2) & (playerVals == 21)
+
+        # Dealer turn, the dealer only plays if the player's last hand didn't bust or wasn't a dealt blackjack.
+        # Only the dealer's final total matters, so it's sampled from the cached distribution for the upcard
+        dealerPlays = (playerVals[rows, lastHand] <= 21) & ~((nPlayerHands == 1) & handBlackjack[:, 0])
+        dIdx = rows[dealerPlays]
+        dealerBlackjack = np.zeros(n, dtype=bool)
+        dealerVal[dIdx], dealerBlackjack[dIdx] = self.dealerTable.sampleArray(dealerVal[dIdx], self.rng)
+
+        # A player blackjack against the dealer's lone card deals the dealer a second one to check for a push
+        dIdx = rows[handBlackjack[:, 0] & ~dealerPlays]
+        newRanks = self.drawRanks(len(dIdx))
+        dealerVal[dIdx] = handValues(dealerHard[dIdx] + POINTS[newRanks], dealerAces[dIdx] + (newRanks == ACE_RANK))
+        dealerBlackjack[dIdx] = dealerVal[dIdx] == 21
+
+        # Same comparisons as GameState.getWinState
+        dv = dealerVal[:, None]
+        playerBust = playerVals > 21
+        outcomes = np.where(playerVals > dv, np.where(playerBust, LOSE, WIN),
+                   np.where(playerVals < dv, np.where(dv > 21, WIN, LOSE),
+                   np.where(playerBust, LOSE, PUSH)))
+        outcomes = np.where(handBlackjack, np.where(dealerBlackjack[:, None], PUSH, BLACKJACK), outcomes)
+
+        return outcomes, bets, nPlayerHands
+
+    def playGame(self, report = True, targetCI = None, ciChunkSize = 100000):
+        """ Play hands in chunks until agent out of money or we reach self.nHands
+        input: report
+            print the summary at the end
+        input: targetCI
+            stop early, after the first chunk where the 95% confidence interval on the house edge is narrower than +/- targetCI
+        input: ciChunkSize
+            most hands in a chunk when stopping early, so the check comes often enough
+        returns: stat dictionary with summary of performance, same as Game.playGame
+        """
+        gameStats = GameStats(self.startingMoney, self.betAmt)
+        chunkSize = self.chunkSize if targetCI is None else min(self.chunkSize, int(ciChunkSize))
+
+        nLeft = self.nHands
+        while nLeft > 0:
+            n = min(nLeft, chunkSize)
+            nLeft -= n
+            outcomes, bets, nPlayerHands = self.playChunk(n)
+
+            # Columns past the number of hands a row has aren't real hands
+            real = np.arange(2)[None, :] < nPlayerHands[:, None]
+            payouts = (outcomePayouts[outcomes] * bets * real).sum(axis=1)
+
+            # Stop after the hand where the agent runs out of money
+            money = gameStats.net + int(self.startingMoney) + np.cumsum(payouts)
+            broke = np.nonzero(money <= 0)[0]
+            if len(broke):
+                n = broke[0] + 1
+                outcomes, bets, real, payouts, nPlayerHands = outcomes[:n], bets[:n], real[:n], payouts[:n], nPlayerHands[:n]
+                nLeft = 0
+
+            splits = nPlayerHands == 2
+            doubles = ~splits & (bets[:, 0] > self.betAmt)
+            gameStats.addArrays(np.bincount(outcomes[real], minlength=len(outcomeOrder)), payouts, (bets * real).sum(axis=1), splits, doubles)
+            if targetCI is not None and gameStats.running.houseEdgeCI() < targetCI:
+                nLeft = 0
+
+        return gameStats.report(report)
@@ -0,0 +1,271 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+from collections import namedtuple
+from time import perf_counter
+
+from actions import Actions
+from agents import QLearning
+from deck import Deck, Hand, CARDS
+from game import Game
+from gameState import GameState
+from util import atomicWrite
+
+"""
+Benchmark suite: a fixed set of micro benchmarks of the game's hot functions and macro benchmarks of whole runs,
+each measured as operations per second, best of a few repeats. Results are saved as json and a later run
+can be compared to a stored baseline, flagging every benchmark whose throughput dropped by more than a threshold
+
+    python3 benchmark.py run --save-baseline         measure and store the baseline
+    python3 benchmark.py run                         measure again, written to latest.json
+    python3 benchmark.py compare --threshold .1      compare latest.json to the baseline, exits 1 on a regression
+
+Throughput depends on the machine, only compare results measured on the same one
+"""
+
+benchFolder = "../benchmarks/"
+baselineFile = os.path.join(benchFolder, "baseline.json")
+latestFile = os.path.join(benchFolder, "latest.json")
+
+# A benchmark: its name, 'micro' or 'macro', what an operation is, and its function of scale -> (operations, body),
+# where body() performs the operations and is what gets timed
+Benchmark = namedtuple('Benchmark', ['name', 'group', 'unit', 'setup'])
+
+# Agents whose hands per second are measured on their own, the q-learner has its own train and test run
+macroAgents = ['optimal', 'expectimax', 'random']
+
+def playerStates(n, seed = 0):
+    """ The optimal player and n copying game states dealt to it from a seeded deck where it's the player's turn to act """
+    game = Game(False, 'optimal', 0, 1000000, 0, seed)
+    deck = Deck(random.Random(seed))
+    states = []
+    while len(states) < n:
+        state = GameState(False, game.dealer, Hand(), game.player, [Hand()], deck)
+        state.initialDeal()
+        if state.isPlayerTurn() and not state.isTerminal():
+            states.append(state)
+    return game.player, states
+
+def benchHand(scale):
+    """ Build three card hands with receiveCard and read their value """
+    n = int(100000 * scale)
+    rng = random.Random(0)
+    cards = [(rng.choice(CARDS), rng.choice(CARDS), rng.choice(CARDS)) for i in range(n)]
+    def body():
+        for first, second, third in cards:
+            hand = Hand()
+            hand.receiveCard(first)
+            hand.receiveCard(second)
+            hand.getHandValue()
+            hand.receiveCard(third)
+            hand.getHandValue()
+    return n, body
+
+def benchSuccessor(scale):
+    """ generatePlayerSuccessor on copying states, as the q-learner plays them, hitting and standing """
+    n = int(50000 * scale)
+    player, states = playerStates(1000)
+    actions = [(states[i % len(states)], Actions.HIT if i % 2 else Actions.STAND) for i in range(n)]
+    def body():
+        for state, action in actions:
+            state.generatePlayerSuccessor(action)
+    return n, body
+
+def benchDeck(scale):
+    """ Deal cards from the infinite deck """
+    n = int(1000000 * scale)
+    deck = Deck(random.Random(0))
+    def body():
+        getRandomCard = deck.getRandomCard
+        for i in range(n):
+            getRandomCard()
+    return n, body
+
+def benchQUpdate(scale):
+    """ QLearning.update on (s, a, s') transitions of hits and stands """
+    n = int(50000 * scale)
+    player, states = playerStates(1000)
+    agent = QLearning(1000000, n)
+    transitions = []
+    for i, state in enumerate(states):
+        action = Actions.HIT if i % 2 else Actions.STAND
+        transitions.append((state, action, state.generatePlayerSuccessor(action), 0 if action == Actions.HIT else 1))
+    transitions = [transitions[i % len(transitions)] for i in range(n)]
+    def body():
+        for state, action, nextState, reward in transitions:
+            agent.update(state, action, nextState, reward)
+    return n, body
+
+def benchOptimalAction(scale):
+    """ OptimalPlayer.getAction on dealt states """
+    n = int(50000 * scale)
+    player, states = playerStates(1000)
+    states = [states[i % len(states)] for i in range(n)]
+    def body():
+        for state in states:
+            player.getAction(state)
+    return n, body
+
+def benchAgentHands(agentType):
+    """ Hands per second of a game of agentType, the agent is created outside the timing """
+    def setup(scale):
+        n = int(20000 * scale)
+        game = Game(False, agentType, n, 100000000, 0, 0)
+        def body():
+            for result in game.iterHands():
+                pass
+        return n, body
+    return setup
+
+def benchQLearningRun(scale):
+    """ Hands per second of a q-learner training for 10k hands and testing for 10k """
+    n = int(10000 * scale)
+    game = Game(False, 'qlearning', n, 100000000, n, 0)
+    def body():
+        for result in game.iterHands():
+            pass
+    return 2 * n, body
+
+benchmarks = [
+    Benchmark('hand.receiveCard+getHandValue', 'micro', 'hands', benchHand),
+    Benchmark('gameState.generatePlayerSuccessor', 'micro', 'successors', benchSuccessor),
+    Benchmark('deck.getRandomCard', 'micro', 'cards', benchDeck),
+    Benchmark('qlearning.update', 'micro', 'updates', benchQUpdate),
+    Benchmark('optimal.getAction', 'micro', 'actions', benchOptimalAction),
+] + [Benchmark('hands.{}'.format(agentType), 'macro', 'hands', benchAgentHands(agentType)) for agentType in macroAgents] + [
+    Benchmark('qlearning.10kTrain10kTest', 'macro', 'hands', benchQLearningRun),
+]
+
+def timeBenchmark(benchmark, scale = 1.0, repeats = 3):
+    """
+    Best time of repeats runs of a benchmark, each set up fresh and only its body timed
+    returns: dict with 'group', 'unit', 'ops' per run, the best run's 'seconds' and 'opsPerSec'
+    """
+    best = float('inf')
+    for i in range(repeats):
+        ops, body = benchmark.setup(scale)
+        start = perf_counter()
+        body()
+        best = min(best, perf_counter() - start)
+    return {'group' : benchmark.group, 'unit' : benchmark.unit, 'ops' : ops, 'seconds' : best, 'opsPerSec' : ops / best if best > 0 else float('inf')}
+
+def runBenchmarks(names = None, scale = 1.0, repeats = 3, report = True):
+    """
+    Run the benchmarks
+    input: names
+        names of the benchmarks to run, all of them if None
+    input: scale
+        multiplies the operations of every benchmark, smaller for a quick check
+    returns: results dict with the run's 'scale', 'repeats', 'python', 'platform', 'time' and 'benchmarks', name -> timeBenchmark's dict
+    """
+    results = {
+            'scale' : scale,
+            'repeats' : repeats,
+            'python' : platform.python_version(),
+            'platform' : platform.platform(),
+            'time' : time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'benchmarks' : {},
+            }
+    for benchmark in benchmarks:
+        if names is not None and benchmark.name not in names:
+            continue
+        result = timeBenchmark(benchmark, scale, repeats)
+        results['benchmarks'][benchmark.name] = result
+        if report:
+            print("{:<36} {:>14,.0f} {}/sec".format(benchmark.name, result['opsPerSec'], benchmark.unit))
+    return results
+
+def writeResults(results, path):
+    """ Write results as json """
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok = True)
+    atomicWrite(path, 'w', lambda f: json.dump(results, f, indent = 2))
+
+def readResults(path):
+    """ Results written by writeResults """
+    with open(path) as f:
+        return json.load(f)
+
+def compareResults(baseline, current, threshold = .1, report = True):
+    """
+    Compare the throughput of every benchmark in both results
+    input: threshold
+        fraction the throughput can drop by before it counts as a regression
+    returns: dict name -> {'baseline', 'current' (ops per second), 'change' (fraction, negative is slower), 'regression'}
+    """
+    comparison = {}
+    for name, result in current['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        base = baseline['benchmarks'][name]['opsPerSec']
+        change = result['opsPerSec'] / base - 1
+        comparison[name] = {'baseline' : base, 'current' : result['opsPerSec'], 'change' : change, 'regression' : change < -threshold}
+        if report:
+            print("{:<36} {:>14,.0f} -> {:>14,.0f} {}/sec {:>+8.1%}{}".format(
+                name, base, result['opsPerSec'], result['unit'], change, "  REGRESSION" if change < -threshold else ""))
+
+    if report:
+        missing = [name for name in baseline['benchmarks'] if name not in current['benchmarks']]
+        if missing:
+            print("Not in the current results: {}".format(", ".join(missing)))
+        if baseline.get('scale') != current.get('scale'):
+            print("Results were measured at different scales ({} and {}), per second rates are still comparable".format(baseline.get('scale'), current.get('scale')))
+    return comparison
+
+def set_args(arguments):
+    """ Set the command line args """
+    parser = argparse.ArgumentParser(description="Blackjack Benchmarks")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', help="Run the benchmarks and save the results")
+    run.add_argument('--out', default=latestFile, help="File to write the results to")
+    run.add_argument('--save-baseline', action='store_true', help="Also store the results as the baseline to compare against")
+    run.add_argument('--only', default=None, help="Comma separated names of the benchmarks to run, all of them by default")
+    run.add_argument('--scale', default=1.0, help="Multiplies the operations of every benchmark, smaller for a quick check")
+    run.add_argument('--repeats', default=3, help="Runs of each benchmark, the best one counts")
+
+    compare = commands.add_parser('compare', help="Compare results to the baseline, exits with 1 if any benchmark regressed")
+    compare.add_argument('current', nargs='?', default=latestFile, help="Results to check")
+    compare.add_argument('--baseline', default=baselineFile, help="Results to compare them to")
+    compare.add_argument('--threshold', default=.1, help="Fraction the throughput of a benchmark can drop by before it's a regression")
+
+    return parser.parse_args(arguments)
+
+def main(arguments):
+    args = set_args(arguments)
+
+    if args.command == 'run':
+        names = None if args.only is None else args.only.split(',')
+        results = runBenchmarks(names, float(args.scale), int(args.repeats))
+        writeResults(results, args.out)
+        print("Results written to {}".format(args.out))
+        if args.save_baseline:
+            writeResults(results, baselineFile)
+            print("Stored as the baseline in {}".format(baselineFile))
+        return 0
+
+    elif args.command == 'compare':
+        try:
+            baseline = readResults(args.baseline)
+            current = readResults(args.current)
+        except (OSError, ValueError) as e:
+            print("Couldn't read the results to compare ({}), store a baseline with 'run --save-baseline' first".format(e))
+            return 1
+        comparison = compareResults(baseline, current, float(args.threshold))
+        regressions = [name for name, values in comparison.items() if values['regression']]
+        if regressions:
+            print("{} of {} benchmarks regressed by more than {:.0%}".format(len(regressions), len(comparison), float(args.threshold)))
+            return 1
+        print("No benchmark regressed by more than {:.0%}".format(float(args.threshold)))
+        return 0
+
+    print("Choose a command, 'run' or 'compare'")
+    return 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -10,11 +10,26 @@ def set_args(arguments):
     global args
     parser = argparse.ArgumentParser( description="Blackjack Arguments", formatter_class=argparse.RawDescriptionHelpFormatter)
 
-    parser.add_argument('-a', '--agent_type', default='user', help="Agent type for blackjack: One of 'user', 'expectimax', 'q-learning'")
+    parser.add_argument('-a', '--agent_type', default='user', help="Agent type for blackjack: One of 'user', 'optimal', 'expectimax', 'random', 'qlearning' (or 'q-learning')")
     parser.add_argument('-n', '--hands', default=0, help="Number of hands to play (if not a user agent)")
     parser.add_argument('-s', '--starting_money', default = 1000, help="Amount player starts with")
     parser.add_argument('-v', '--verbose', default = False, help="Print each step if verbose, user_agent is automatically verbose")
     parser.add_argument('-t', '--training', default=0, help="Number of qlearning training rounds")
+    parser.add_argument('-b', '--batch', action='store_true', help="Simulate hands in vectorized batches, only for 'optimal', 'expectimax' and 'random' agents")
+    parser.add_argument('-w', '--workers', default=1, help="Number of processes to split the hands across (not for user agents)")
+    parser.add_argument('--seed', default=None, help="Integer seed for the cards and agents so runs can be reproduced")
+    parser.add_argument('-d', '--decks', default=0, help="Number of decks in a shoe dealt without replacement, 0 for an infinite deck")
+    parser.add_argument('--penetration', default=.75, help="Fraction of the shoe dealt before it is reshuffled")
+    parser.add_argument('--target-ci', default=None, help="Stop once the 95%% confidence interval on the house edge is narrower than +/- this, -n is the most hands played (not for parallel runs)")
+    parser.add_argument('--log', default=None, help="File to write every event of the game to as lines of json (not for batch or parallel runs)")
+    parser.add_argument('--history', default=None, help="File to write a binary record of every hand to, read it with handHistory.HandHistory (not for batch or parallel runs)")
+    parser.add_argument('--off-policy', default=None, help="Estimate the house edge of the agent's policy from a --history file of hands the random agent played, q-learning agents play and train first")
+    parser.add_argument('--expectimax-table', default=None, help="File to keep the expectimax agent's solved policy table in, it's solved and written the first time and loaded after that")
+    parser.add_argument('--stratify', default=None, help="Deal the initial hands stratum by stratum for a tighter house edge estimate, 'proportional' or 'neyman' allocation (infinite deck, one process, not batch)")
+    parser.add_argument('--compare', default=None, help="Comma separated agent types to play on the same cards hand for hand and compare to the first, like 'optimal,expectimax' (infinite deck only)")
+    parser.add_argument('--profile-phases', action='store_true', help="Time each phase of playing a hand and report hands/sec, decisions/sec and each phase's share of the time (one process, not batch)")
+    parser.add_argument('--memprofile', action='store_true', help="Trace memory with tracemalloc and report memory per hand, the peak, the modules holding memory and a q-learner's table sizes over time (one process, not batch)")
+    parser.add_argument('-e', '--exact', action='store_true', help="Calculate the exact house edge of the agent's policy, q-learning agents play and train first")
 
     args = parser.parse_args(arguments)
 
@@ -33,15 +48,115 @@ def main(arguments):
             print("Error: Options for verbose are 'True','T','t','False','F','f'")
             return 1
 
-    # Initialize the game
-    game = Game(verbose, args.agent_type, int(args.hands), args.starting_money, args.training)
+    seed = None if args.seed is None else int(args.seed)
+    nDecks = int(args.decks)
+    penetration = float(args.penetration)
+    if nDecks > 0 and (args.batch or args.exact or args.off_policy is not None or args.compare is not None or args.stratify is not None):
+        print("Batch, exact, off-policy, compare and stratified runs are only for the infinite deck, please try again")
+        return 1
+
+    if args.target_ci is not None and int(args.workers) > 1:
+        print("Stopping at a target confidence interval is only for runs on one process, please try again")
+        return 1
+
+    if args.stratify is not None and (args.batch or int(args.workers) > 1 or args.target_ci is not None):
+        print("Stratified runs play a fixed number of hands on one process without batches, please try again")
+        return 1
+
+    if args.compare is not None and (args.batch or int(args.workers) > 1 or args.log is not None or args.history is not None):
+        print("Comparisons play each agent on one process without batches, logs or hand histories, please try again")
+        return 1
 
-    if not game.isValidGame():
-        print("Invalid game setup, please try again")
+    if (args.log is not None or args.history is not None) and (args.batch or int(args.workers) > 1):
+        print("Event logs and hand histories are only for hands played one at a time on one process, please try again")
         return 1
 
-    # Play the game
-    results = game.playGame()
+    if (args.profile_phases or args.memprofile) and (args.batch or int(args.workers) > 1 or args.exact or args.off_policy is not None or args.compare is not None):
+        print("Profiling phases or memory is only for hands played one at a time on one process, please try again")
+        return 1
+
+    # Play every agent on the same cards and compare them to the first
+    if args.compare is not None:
+        from compare import compareAgents
+        results = compareAgents(args.compare.split(','), int(args.hands), args.starting_money, args.training, seed if seed is not None else 0)
+
+    # Calculate the house edge instead of (or for q-learning, after) simulating, exactly or from logged hands
+    elif args.exact or args.off_policy is not None:
+        from houseEdge import HouseEdgeCalculator, chooserForAgent
+        game = Game(False, args.agent_type, int(args.hands), args.starting_money, args.training, seed, expectimaxTable = args.expectimax_table)
+        if game.q:
+            game.playGame()
+
+        chooser = chooserForAgent(game.player)
+        if chooser is None:
+            print("Can't calculate the house edge of {} agents, please try again".format(args.agent_type))
+            return 1
+        if args.exact:
+            results = HouseEdgeCalculator(chooser).calculate()
+            print("Exact house edge of the {} policy: {:.3%} (expected payout {:.4f} on an expected bet of {:.4f} per hand dealt)".format(args.agent_type, results['houseEdge'], results['expectedPayout'], results['expectedBet']))
+        else:
+            from offPolicy import OffPolicyEvaluator
+            results = OffPolicyEvaluator(args.off_policy).evaluate(chooser)
+            print("Estimated house edge of the {} policy from {} hands played by the random agent: {:.3%} weighted importance sampling, {:.3%} doubly robust (effective sample size {:.0f})".format(
+                args.agent_type, results['nRounds'], results['houseEdge'], results['drHouseEdge'], results['effectiveSampleSize']))
+
+    # Split the hands across worker processes
+    elif int(args.workers) > 1:
+        from parallel import playParallel, parallelAgents
+        if args.agent_type not in parallelAgents:
+            print("Can't play {} agents in parallel, please try again".format(args.agent_type))
+            return 1
+        results = playParallel(args.agent_type, int(args.hands), args.starting_money, args.training, args.workers, seed, args.batch, nDecks, penetration, args.expectimax_table)
+
+    else:
+        # Initialize the game
+        if args.batch:
+            from batchGame import BatchGame
+            game = BatchGame(args.agent_type, int(args.hands), args.starting_money, seed, expectimaxTable = args.expectimax_table)
+        elif args.stratify is not None:
+            from stratified import StratifiedGame
+            try:
+                game = StratifiedGame(args.agent_type, int(args.hands), args.starting_money, args.training, seed, args.stratify, profile = args.profile_phases)
+            except ValueError as e:
+                print("{}, please try again".format(e))
+                return 1
+        else:
+            game = Game(verbose, args.agent_type, int(args.hands), args.starting_money, args.training, seed, nDecks, penetration, args.expectimax_table, profile = args.profile_phases)
+
+        if not game.isValidGame():
+            print("Invalid game setup, please try again")
+            return 1
+
+        # Log the game's events to a file
+        logger = None
+        if args.log is not None:
+            from events import FileLogger
+            logger = game.hooks.subscribe(FileLogger(args.log))
+
+        # Record every hand
+        history = None
+        if args.history is not None:
+            from handHistory import HandHistoryWriter
+            history = game.hooks.subscribe(HandHistoryWriter(args.history))
+
+        # Trace the memory the hands take
+        memory = None
+        if args.memprofile:
+            from memProfile import MemoryProfiler
+            memory = game.hooks.subscribe(MemoryProfiler(game.game.player if args.stratify is not None else game.player))
+            memory.start()
+
+        # Play the game
+        targetCI = None if args.target_ci is None else float(args.target_ci)
+        results = game.playGame(targetCI = targetCI)
+
+        if memory is not None:
+            results['memory'] = memory.report()
+
+        if logger is not None:
+            logger.close()
+        if history is not None:
+            history.close()
 
     if __name__ != '__main__':
         return results
@@ -0,0 +1,88 @@
+from math import sqrt
+import numpy as np
+
+from game import Game, normalizeAgentType
+from runningStats import GameStats, Z_95
+
+"""
+Paired comparison of agents on common random numbers: every agent plays the same number of hands from a
+PairedDeck with the same seed, so hand i deals each of them the same starting cards, draws and dealer cards.
+Their payouts on a hand move together, and the difference of their house edges has a much smaller variance
+than the difference of two runs on independent cards. Its confidence interval comes from the delta method
+on the per-hand difference of each agent's influence on its house edge
+"""
+
+def edgeInfluence(payouts, bets):
+    """ Contribution of each round to the error of the house edge -sum(payouts) / sum(bets), to first order """
+    meanBet = bets.mean()
+    return -(payouts - (payouts.mean() / meanBet) * bets) / meanBet
+
+def pairedDifference(payoutsA, betsA, payoutsB, betsB, z = Z_95):
+    """
+    Difference of the house edges of two agents that played the same hands, and the half widths of its
+    confidence interval as paired and as if the hands had been independent
+    returns: (difference, paired CI, independent CI)
+    """
+    influenceA = edgeInfluence(payoutsA, betsA)
+    influenceB = edgeInfluence(payoutsB, betsB)
+    n = len(payoutsA)
+    difference = -payoutsA.sum() / betsA.sum() + payoutsB.sum() / betsB.sum()
+    pairedCI = z * sqrt((influenceA - influenceB).var(ddof = 1) / n)
+    independentCI = z * sqrt((influenceA.var(ddof = 1) + influenceB.var(ddof = 1)) / n)
+    return difference, pairedCI, independentCI
+
+def playPaired(agentType, nHands, startingMoney, nTraining, seed):
+    """
+    Play an agent on the paired deck, a q-learner trains for nTraining hands first
+    returns: (GameStats of the counted hands, payouts, bets) with the payout and bet of every counted hand as arrays
+    """
+    # Only a q-learner trains, other agents would count the training hands as played
+    if normalizeAgentType(agentType) != 'qlearning':
+        nTraining = 0
+    game = Game(False, agentType, nHands, startingMoney, nTraining, seed, paired = True)
+    gameStats = GameStats(startingMoney, game.player.getBetAmt())
+    payouts = []
+    bets = []
+    for result in game.iterHands():
+        if result.training:
+            continue
+        gameStats.add(result.winStates, result.payout, result.bet)
+        payouts.append(result.payout)
+        bets.append(result.bet)
+    return gameStats, np.array(payouts, dtype=float), np.array(bets, dtype=float)
+
+def compareAgents(agentTypes, nHands, startingMoney, nTraining = 0, seed = 0, report = True):
+    """
+    Play every agent on the same nHands hands and compare each to the first
+    input: agentTypes
+        agent types to compare, the first is the baseline. A q-learner trains for nTraining hands first
+    input: report
+        print each agent's house edge and its difference from the baseline
+    returns: dict with 'agents', the stat dictionary of each agent type (see GameStats.report), 'differences', a dict
+        of agent type -> {'difference', 'ci', 'independentCI'} of its house edge minus the baseline's, and 'nHands'
+        paired, which is fewer than nHands if an agent ran out of money
+    """
+    seed = int(seed)
+    played = [playPaired(agentType, nHands, startingMoney, nTraining, seed) for agentType in agentTypes]
+    # Only the hands every agent played are paired
+    n = min(len(payouts) for gameStats, payouts, bets in played)
+    baseline = agentTypes[0]
+    basePayouts, baseBets = played[0][1][:n], played[0][2][:n]
+
+    results = {'agents' : {}, 'differences' : {}, 'nHands' : n, 'baseline' : baseline, 'seed' : seed}
+    if report:
+        print("Paired comparison over {} hands dealt the same cards (seed {})".format(n, seed))
+    for agentType, (gameStats, payouts, bets) in zip(agentTypes, played):
+        stats = gameStats.report(printSummary = False)
+        results['agents'][agentType] = stats
+        if report:
+            print("{}: house edge {:.3%} +/- {:.3%}".format(agentType, stats['houseEdge'], stats['houseEdgeCI']))
+        if agentType == baseline:
+            continue
+
+        difference, pairedCI, independentCI = pairedDifference(payouts[:n], bets[:n], basePayouts, baseBets)
+        results['differences'][agentType] = {'difference' : difference, 'ci' : pairedCI, 'independentCI' : independentCI}
+        if report:
+            print("{} - {}: {:+.3%} +/- {:.3%} paired, +/- {:.3%} on independent cards ({:.1f}x the hands for the same interval)".format(
+                agentType, baseline, difference, pairedCI, independentCI, (independentCI / pairedCI) ** 2 if pairedCI else float('inf')))
+    return results
@@ -1,4 +1,7 @@
 import random
+from itertools import chain, repeat, starmap
+from collections import deque
+import numpy as np
 
 class Face:
     """ Face of a card class """
@@ -57,19 +60,46 @@ class Suit:
     DIAMONDS = 'Diamonds'
     HEARTS = 'Hearts'
 
+# Faces and suits in the order the deck is built, a card's rank and suit are indices into these
+faceOrder = [Face.ACE, Face.KING, Face.QUEEN, Face.JACK, Face.TEN, Face.NINE, Face.EIGHT, Face.SEVEN, Face.SIX, Face.FIVE, Face.FOUR, Face.THREE, Face.TWO]
+suitOrder = [Suit.SPADES, Suit.CLUBS, Suit.DIAMONDS, Suit.HEARTS]
+
+# Small int lookups so faces and suits don't need to be compared as strings
+faceRank = {face : rank for rank, face in enumerate(faceOrder)}
+suitRank = {suit : rank for rank, suit in enumerate(suitOrder)}
+
+# Hard point value of each rank, aces count as 1 (a hand promotes one ace to 11 if it can)
+ACE_RANK = faceRank[Face.ACE]
+rankPoints = [1 if face == Face.ACE else Face.valueMapping[face][0] for face in faceOrder]
+
 class Card():
-    """ Card class wraps a face and a suit and provides methods for printing and getting value """
+    """ Card class wraps a face and a suit and provides methods for printing and getting value
+    Cards are immutable, rank and suit are small ints and points is the hard value of the card
+    """
+    __slots__ = ('face', 'suit', 'rank', 'suitIdx', 'points', 'index')
+
     def __init__(self, face, suit):
         """ Init card with face and suit """
         self.face = face
         self.suit = suit
+        self.rank = faceRank[face]
+        self.suitIdx = suitRank[suit]
+        self.points = rankPoints[self.rank]
+        # Index of the card in the 52 card table
+        self.index = 4 * self.rank + self.suitIdx
 
     def __eq__(self, card):
         """ Consider cards equal if faces match, not suits
         input: card to compare
         returns: (bool) if they're same face or not
         """
-        return self.face == card.face
+        return self.rank == card.rank
+
+    def __hash__(self):
+        return self.rank
+
+    def isAce(self):
+        return self.rank == ACE_RANK
 
     def getFace(self):
         return self.face
@@ -101,43 +131,212 @@ class Card():
         returns: (int) value of card if not an ace
                 or (list) possible values of aces
         """
-        values = Face.valueMapping[self.face]
-        if len(values) == 1:
-            return values[0]
+        if self.rank == ACE_RANK:
+            return [11, 1]
         else:
-            return values 
+            return self.points
+
+# Preallocated table of the 52 cards, indexed by Card.index. Cards are immutable so these
+# are shared by every deck and hand instead of allocating new cards
+CARDS = [Card(face, suit) for face in faceOrder for suit in suitOrder]
 
 class Deck():
     """ Deck of cards class
     Decks in this game are infinite. All 52 cards are initialized and dealt with replacement
+    Cards are drawn ahead in blocks of blockSize from a numpy generator and dealt by a C level iterator
+    chained over the blocks, which costs a fraction of a random.choice call per card
     """
-    def __init__(self):
-        self.cards = []
+    def __init__(self, rng = None, blockSize = 65536):
+        """ rng is a random.Random to seed the draws from, or None for the global random module """
+        self.cards = CARDS
+        rng = rng if rng is not None else random
+        self.npRng = np.random.default_rng(rng.getrandbits(64))
+        self.blockSize = int(blockSize)
+
+        # Get a random card from the deck, returns: a card from the list of 52 cards. The dealer draws from the same stream
+        self.getRandomCard = chain.from_iterable(self.drawBlocks()).__next__
+        self.getDealerCard = self.getRandomCard
+
+    def drawBlocks(self):
+        """ Generate blocks of blockSize random cards, a block is only drawn once the last one is dealt """
+        while True:
+            block = self.npRng.integers(0, len(self.cards), self.blockSize).tolist()
+            yield list(map(self.cards.__getitem__, block))
+
+    def checkCutCard(self):
+        """ Called before each hand is dealt, an infinite deck never needs shuffling """
+        pass
 
-        for face in [Face.ACE, Face.KING, Face.QUEEN, Face.JACK, Face.TEN, Face.NINE, Face.EIGHT, Face.SEVEN, Face.SIX, Face.FIVE, Face.FOUR, Face.THREE, Face.TWO]:
-            for suit in [Suit.SPADES, Suit.CLUBS, Suit.DIAMONDS, Suit.HEARTS]:
-                self.cards.append( Card(face, suit) )
+class StratifiedDeck(Deck):
+    """ Infinite deck whose initial deals can be chosen
+    Each hand pops its deal off self.deals, a (first player card, second player card, dealer upcard) tuple or None
+    for a random deal, and hands played once self.deals is empty are dealt at random too. The cards after a chosen
+    deal are dealt at random as usual
+    """
+    def __init__(self, rng = None, blockSize = 65536):
+        super().__init__(rng, blockSize)
+        self.deals = deque()
+        self.drawRandom = self.getRandomCard
+
+    def checkCutCard(self):
+        """ Called before each hand is dealt, sets up its deal """
+        deal = self.deals.popleft() if self.deals else None
+        if deal is None:
+            self.getRandomCard = self.getDealerCard = self.drawRandom
+        else:
+            first, second, upcard = deal
+            self.getRandomCard = chain((first, second), starmap(self.drawRandom, repeat(()))).__next__
+            self.getDealerCard = chain((upcard,), starmap(self.drawRandom, repeat(()))).__next__
+
+class Shoe():
+    """ Shoe of nDecks decks dealt without replacement
+    The shoe is shuffled in bulk into a list of the shared cards and dealt from an iterator over it, so a card
+    costs no allocation or bookkeeping. When a hand starts past the cut card, placed after penetration of the
+    shoe has been dealt, the whole shoe is reshuffled
+    """
+    def __init__(self, nDecks, penetration = .75, rng = None):
+        """ rng is a random.Random to seed the shuffles from, or None for the global random module """
+        rng = rng if rng is not None else random
+        self.npRng = np.random.default_rng(rng.getrandbits(64))
+        self.allCards = CARDS * int(nDecks)
+        # Number of cards left in the shoe when the cut card comes out
+        self.cutCardLeft = len(self.allCards) - int(len(self.allCards) * float(penetration))
+        self.shuffle()
+
+    def shuffle(self):
+        """ Shuffle every card back into the shoe """
+        order = self.npRng.permutation(len(self.allCards)).tolist()
+        self.cards = list(map(self.allCards.__getitem__, order))
+        self.dealer = iter(self.cards)
+        self.dealNext = self.dealer.__next__
 
     def getRandomCard(self):
-        """ Get a random card from the deck
-        returns: a card from the list of 52 cards 
+        """ Deal the next card in the shoe, reshuffling if a hand runs the shoe out
+        returns: a card from the shoe
+        """
+        try:
+            return self.dealNext()
+        except StopIteration:
+            self.shuffle()
+            return self.dealNext()
+
+    # The dealer is dealt from the same shoe
+    getDealerCard = getRandomCard
+
+    def getNumCardsLeft(self):
+        """ Return how many cards are left before the shoe runs out """
+        return self.dealer.__length_hint__()
+
+    def checkCutCard(self):
+        """ Called before each hand is dealt, reshuffle if the cut card has come out """
+        if self.getNumCardsLeft() <= self.cutCardLeft:
+            self.shuffle()
+
+class PairedDeck():
+    """ Infinite deck for comparing agents on common random numbers
+    Every hand is dealt from its own two rows of cards, one the player's cards are dealt from in order and one the
+    dealer's, fixed by the seed and the hand's number. Agents playing with the same seed are dealt the same starting
+    hands, draws and dealer cards hand for hand, whatever they do with them. Rows are drawn for blockSize hands at a time
+    """
+    # Most cards a hand can deal, to the player's two hands after a split and to the dealer
+    PLAYER_CARDS = 24
+    DEALER_CARDS = 12
+
+    def __init__(self, seed, nUnpaired = 0, blockSize = 4096):
+        """
+        input: seed
+            integer seed of the rows
+        input: nUnpaired
+            number of hands at the start, like a q-learner's training hands, dealt from a separate stream so the
+            hand after them is dealt the same cards as the first hand of an agent without them
         """
-        return random.choice(self.cards)
+        self.seed = int(seed)
+        self.nUnpaired = int(nUnpaired)
+        self.blockSize = int(blockSize)
+        self.handIdx = -1
+        self.getRandomCard = None
+        self.getDealerCard = None
+
+    def drawBlock(self, stream, blockIdx):
+        """ Draw the card rows of blockSize hands, stream is 0 for paired hands and 1 for unpaired ones """
+        rng = np.random.default_rng([self.seed, stream, blockIdx])
+        self.playerRows = rng.integers(0, len(CARDS), (self.blockSize, self.PLAYER_CARDS)).tolist()
+        self.dealerRows = rng.integers(0, len(CARDS), (self.blockSize, self.DEALER_CARDS)).tolist()
+
+    def checkCutCard(self):
+        """ Called before each hand is dealt, moves on to the rows of the next hand """
+        self.handIdx += 1
+        if self.handIdx < self.nUnpaired:
+            stream, idx = 1, self.handIdx
+        else:
+            stream, idx = 0, self.handIdx - self.nUnpaired
+        row = idx % self.blockSize
+        if row == 0 or idx == 0:
+            self.drawBlock(stream, idx // self.blockSize)
+        # Deal the next card of the hand's player or dealer row, returns: a card from the list of 52 cards
+        self.getRandomCard = map(CARDS.__getitem__, self.playerRows[row]).__next__
+        self.getDealerCard = map(CARDS.__getitem__, self.dealerRows[row]).__next__
+
+class CardList(list):
+    """ List of cards in a hand. Assigning or popping cards directly marks the
+    owning hand's cached value stale so it is recomputed on the next getHandValue
+    """
+    __slots__ = ('owner',)
+
+    def __setitem__(self, idx, card):
+        list.__setitem__(self, idx, card)
+        self.owner.stale = True
+
+    def pop(self, idx = -1):
+        card = list.pop(self, idx)
+        self.owner.stale = True
+        return card
 
 class Hand():
-    """ Hand class for player and dealer hands """
+    """ Hand class for player and dealer hands
+    The hand keeps its hard total, ace count and soft/hard flag up to date as cards are received,
+    so value, bust and blackjack queries are constant time
+    """
+    __slots__ = ('hand', 'nCards', 'hard', 'hardTotal', 'nAces', 'value', 'blackjack', 'stale')
+
     def __init__(self):
-        self.hand = []
+        self.hand = CardList()
+        self.hand.owner = self
         self.nCards = 0
+        self.hardTotal = 0
+        self.nAces = 0
+        self.value = 0
+        self.blackjack = False
+        self.stale = False
         
-        # Soft hand when an ace is demoted to 1 b/c 11 would bust
+        # Soft hand when an ace is counted as 11 without busting
         self.hard = True
+
+    def copy(self):
+        """ Return a new hand holding the same cards. Cards are immutable so they are shared """
+        newHand = Hand.__new__(Hand)
+        newHand.hand = CardList(self.hand)
+        newHand.hand.owner = newHand
+        newHand.nCards = self.nCards
+        newHand.hardTotal = self.hardTotal
+        newHand.nAces = self.nAces
+        newHand.value = self.value
+        newHand.blackjack = self.blackjack
+        newHand.stale = self.stale
+        newHand.hard = self.hard
+        return newHand
+
+    def __deepcopy__(self, memo):
+        """ Deep copies only need new card lists, the cards themselves are immutable """
+        return self.copy()
    
     """ Determine if hand is soft or hard """
     def isHard(self):
+        if self.stale:
+            self.recompute()
         return self.hard
     def isSoft(self):
-        return not self.hard
+        return not self.isHard()
 
     def getNumCards(self):
         """ Return how many cards are in hand"""
@@ -158,81 +357,73 @@ class Hand():
         return "Cards: {}\n Value: {} ({})\n".format(cards, value, "hard" if self.isHard() else "soft")
 
     def receiveCard(self, card):
-        """ Add a card to hand
+        """ Add a card to hand and update the totals
         input: a new card
         returns: nothing
         """
+        if self.stale:
+            self.recompute()
         self.hand.append(card)
         self.nCards += 1
-        # to set if hand is hard or soft
-        self.getHandValue()
+        self.hardTotal += card.points
+        if card.points == 1:
+            self.nAces += 1
+        self.updateValue()
 
-    def getHandValue(self):
-        """ Return the value of the hand
-        Determines the value of hard and soft aces, defaults to soft ace unless it'd be a bust
-        Returns: (int) value of hand
+    def updateValue(self):
+        """ Set value, hard flag and blackjack from the hard total and ace count
+        One ace is counted as 11 (soft hand) unless that would bust
         """
-        nAces = 0
-        hardValue = 0
-        softValue = 0
-        for card in self.hand:
-            value = card.getValue()
-            if type(value) is int:
-                hardValue += value
-                softValue += value
-            # Else its a [11,1] list for values for ace
-            else:
-                # First ace can be 11 (soft hand) or 1 (hard hand)
-                if nAces == 0:
-                    # ace is 11
-                    softValue += value[0]
-                    # ace is 1
-                    hardValue += value[1]
-                # Any more aces are 1
-                else:
-                    softValue += value[1]
-                    hardValue += value[1]
-                nAces += 1
-        # Determine if hand is soft or hard (hard is default, soft only if ace and the value < 21)
-        if softValue > hardValue and softValue <= 21:
+        if self.nAces and self.hardTotal <= 11:
+            self.value = self.hardTotal + 10
             self.hard = False
         else:
+            self.value = self.hardTotal
             self.hard = True
-        
-        return hardValue if self.hard else softValue
+        self.blackjack = self.nCards == 2 and self.value == 21
+
+    def recompute(self):
+        """ Rebuild the totals from scratch after cards were changed directly """
+        self.nCards = len(self.hand)
+        self.hardTotal = 0
+        self.nAces = 0
+        for card in self.hand:
+            self.hardTotal += card.points
+            if card.points == 1:
+                self.nAces += 1
+        self.updateValue()
+        self.stale = False
+
+    def getHandValue(self):
+        """ Return the value of the hand
+        Aces default to soft (11) unless it'd be a bust
+        Returns: (int) value of hand
+        """
+        if self.stale:
+            self.recompute()
+        return self.value
 
     def isDoubles(self):
         """ Determine if hand is doubles or not
-        return: (bool) True if 2 cards that have same value
+        return: (bool) True if 2 cards that have same face
         """
         if len(self.hand) != 2:
             return False
         else:
-            return self.hand[0] == self.hand[1]
+            return self.hand[0].rank == self.hand[1].rank
 
    
     def isBlackjack(self):
         """ determines if hand is blackjack or not
-        blackjack is limited toa 2 card hand of value 21
+        blackjack is limited to a 2 card hand of value 21
         returns: (bool) whether or not hand is blackjack
         """
-        if len(self.hand) > 2:
-            return False
-        if self.hand[0].face == Face.ACE:
-            if self.hand[1].face in [Face.KING, Face.QUEEN, Face.JACK, Face.TEN]:
-                return True
-        if self.hand[1].face == Face.ACE:
-            if self.hand[0].face in [Face.KING, Face.QUEEN, Face.JACK, Face.TEN]:
-                return True
-        return False
+        if self.stale:
+            self.recompute()
+        return self.blackjack
 
     def isBust(self):
         """ Return true if hand is a busted hand """
-        return self.getHandValue() > 21
-
-
-
-
-
-
-
+        if self.stale:
+            self.recompute()
+        return self.value > 21
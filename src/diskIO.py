@@ -1,6 +1,6 @@
 from actions import Actions
 from pprint import pprint
-from util import raiseErrorAtLoc
+from util import raiseErrorAtLoc, atomicWrite
 import csv
 
 policyActionMap = {
@@ -12,6 +12,53 @@ policyActionMap = {
     5 : [Actions.DOUBLE_DOWN, Actions.STAND] # Double if allowed, else stand
 }
 
+# Hand types index the compiled policy table
+handTypeIdx = {
+    'hard' : 0,
+    'soft' : 1,
+    'double' : 2
+}
+
+# Bits of the legality mask of a state, standing is always legal
+CAN_HIT = 1
+CAN_DOUBLE = 2
+CAN_SPLIT = 4
+N_LEGAL_MASKS = 8
+
+# Player values (hand value, or the card of a double) and dealer values go up to 21 and 11
+N_POLICY_PLAYER_VALS = 22
+N_POLICY_DEALER_VALS = 12
+N_POLICY_STATES = len(handTypeIdx) * N_POLICY_PLAYER_VALS * N_POLICY_DEALER_VALS * N_LEGAL_MASKS
+
+def policyStateCode(typeIdx, playerVal, dealerVal, legalMask):
+    """ Single integer code of a (hand type index, player value, dealer value, legality mask) state """
+    return ((typeIdx * N_POLICY_PLAYER_VALS + playerVal) * N_POLICY_DEALER_VALS + dealerVal) * N_LEGAL_MASKS + legalMask
+
+def policyStates():
+    """
+    (hand type, player value, hand total, soft, dealer value, legality mask) of every state a compiled table needs
+    an action for. Pairs are only 'double' hands while they can be split, so those are the only states with CAN_SPLIT
+    """
+    hands = [('hard', total, total, False) for total in range(4, 22)]
+    hands += [('soft', total, total, True) for total in range(12, 22)]
+    hands += [('double', pairVal, 12 if pairVal == 11 else 2 * pairVal, pairVal == 11) for pairVal in range(2, 12)]
+    for handType, playerVal, total, soft in hands:
+        for dealerVal in range(2, 12):
+            for legalMask in range(N_LEGAL_MASKS):
+                if (handType == 'double') == bool(legalMask & CAN_SPLIT):
+                    yield handType, playerVal, total, soft, dealerVal, legalMask
+
+def legalActionsFromMask(legalMask):
+    """ List of actions a legality mask allows """
+    legalActions = [Actions.STAND]
+    if legalMask & CAN_HIT:
+        legalActions.append(Actions.HIT)
+    if legalMask & CAN_DOUBLE:
+        legalActions.append(Actions.DOUBLE_DOWN)
+    if legalMask & CAN_SPLIT:
+        legalActions.append(Actions.SPLIT)
+    return legalActions
+
 class Policy():
     """
     Policy is hard-coded optimal policy read in from a CSV
@@ -32,6 +79,8 @@ class Policy():
                 values: list of actions to take (list because lets say q-learning says to double,
                 but you've just split and so now can't double. need a backup
 
+    compile() flattens the dictionaries into self.table, a list indexed by policyStateCode that holds
+    the first legal action of the list for every legality mask, or None if none of them are legal
     """
     def __init__(self):
         """ Init the nested dictionaries """ 
@@ -49,6 +98,7 @@ class Policy():
             'soft' : playerHandSoft,
             'double' : playerHandDouble
         }
+        self.table = None
 
     def initDealerCardDict(self):
         """ Init a subdict for policy """
@@ -75,6 +125,23 @@ class Policy():
             print("Error getting policy from dictionary! {}\n".format(e))
         return actions
 
+    def compile(self):
+        """ Build the flat table of resolved actions from the policy dictionaries """
+        self.table = [None] * N_POLICY_STATES
+        for handType, playerDict in self.policy.items():
+            for playerVal, dealerDict in playerDict.items():
+                for dealerVal, actions in dealerDict.items():
+                    if actions is None:
+                        continue
+                    for legalMask in range(N_LEGAL_MASKS):
+                        legalActions = legalActionsFromMask(legalMask)
+                        code = policyStateCode(handTypeIdx[handType], playerVal, dealerVal, legalMask)
+                        self.table[code] = next((action for action in actions if action in legalActions), None)
+
+    def getAction(self, code):
+        """ Action for a state code from policyStateCode, compile() must have been called """
+        return self.table[code]
+
 def readPolicy(fname):
     """
     Read the policy csv stored at fname into a policy class and return the object
@@ -100,8 +167,28 @@ def readPolicy(fname):
                     dealerValue = dealerValueList[idx] #map 0-9 to 2-11 for what dealer has
 
                     policy.insertActions(actions, player_type, player_val, dealerValue)
+    policy.compile()
     return policy 
 
+def writePolicyTable(policy, fname):
+    """
+    Write the compiled table of a policy to fname as a numpy array of action indices in Actions.allActs,
+    -1 where there's no action
+    """
+    import numpy as np
+    codes = np.array([-1 if action is None else Actions.allActs.index(action) for action in policy.table], dtype=np.int8)
+    atomicWrite(fname, 'wb', lambda f: np.save(f, codes, allow_pickle = False))
+
+def readPolicyTable(fname):
+    """ Policy with the compiled table written by writePolicyTable, raises ValueError if fname doesn't hold one """
+    import numpy as np
+    codes = np.load(fname, allow_pickle = False)
+    if codes.shape != (N_POLICY_STATES,) or codes.dtype != np.int8:
+        raise ValueError("{} isn't a compiled policy table".format(fname))
+    policy = Policy()
+    policy.table = [None if code < 0 else Actions.allActs[code] for code in codes.tolist()]
+    return policy
+
 class QDictIO():
     """ A class to write a Q dictionary of form Q[state][action] = Q(s,a) to the disk for analyzing """
     def __init__(self, QDict):
@@ -0,0 +1,136 @@
+import json
+
+"""
+Structured events the game emits as it plays, in place of printing as it goes. Subscribers register
+on a game's EventHooks and get called with (event, fields) for every event, where fields is a dict:
+
+    NEW_HAND    : bet, money
+    DEAL        : to ('player' or 'dealer'), handIdx (player hands only), card
+    TURN        : turn ('player' or 'dealer'), playerHands, handIdx, dealerHand
+    ACTION      : by ('player' or 'dealer'), action, handIdx (the player hand being played)
+    SPLIT       : handIdx, bet
+    DOUBLE      : handIdx, bet
+    DEALER_DRAW : card, dealerVal
+    OUTCOME     : handIdx, playerVal, dealerVal, winState, payout
+    PAYOUT      : payout, bet, money (totals of the round), playerHands, dealerHand, and winStates, bets, payouts per hand
+
+Cards and hands are the game's own objects, only read them inside the hook. The fields are only built
+when someone subscribes to the event, with no subscribers an event costs the game a single check of the hooks
+"""
+
+class Events:
+    """ Types of events the game emits """
+    NEW_HAND = 'NEW_HAND'
+    DEAL = 'DEAL'
+    TURN = 'TURN'
+    ACTION = 'ACTION'
+    SPLIT = 'SPLIT'
+    DOUBLE = 'DOUBLE'
+    DEALER_DRAW = 'DEALER_DRAW'
+    OUTCOME = 'OUTCOME'
+    PAYOUT = 'PAYOUT'
+
+    allEvents = [NEW_HAND, DEAL, TURN, ACTION, SPLIT, DOUBLE, DEALER_DRAW, OUTCOME, PAYOUT]
+
+class EventHooks(list):
+    """
+    The subscribers of a game. It's a list so an empty one is falsy without a python level call, emitters
+    check it (and that the event has subscribers) before building an event:
+        if self.hooks and self.hooks.byEvent[Events.DEAL]: self.hooks.emit(Events.DEAL, {...})
+    """
+    def __init__(self):
+        super().__init__()
+        # Event -> functions of the subscribers that want it
+        self.byEvent = {event : [] for event in Events.allEvents}
+
+    def subscribe(self, hook, events = None):
+        """
+        Register hook, a callable hook(event, fields) or an object with an onEvent(event, fields) method,
+        for the events in events or for every event if None. Hooks can list the events they want in an events attribute
+        """
+        function = getattr(hook, 'onEvent', hook)
+        events = events if events is not None else getattr(hook, 'events', Events.allEvents)
+        self.append((hook, function))
+        for event in events:
+            self.byEvent[event].append(function)
+        return hook
+
+    def unsubscribe(self, hook):
+        """ Stop calling hook """
+        for subscriber in [subscriber for subscriber in self if subscriber[0] is hook]:
+            self.remove(subscriber)
+            for functions in self.byEvent.values():
+                if subscriber[1] in functions:
+                    functions.remove(subscriber[1])
+
+    def emit(self, event, fields):
+        """ Call every subscriber of the event """
+        for function in self.byEvent[event]:
+            function(event, fields)
+
+class ConsolePrinter():
+    """ Prints each step of the game as it's played, what verbose games show """
+    def onEvent(self, event, fields):
+        if event == Events.NEW_HAND:
+            print("\n\n*************** NEW HAND ***************\n\n")
+            print("New hand: Player bet: {}\tPlayer money: {}\n".format(fields['bet'], fields['money']))
+            print("...Dealing...\n")
+        elif event == Events.DEAL:
+            print("{} dealt {}".format(fields['to'].capitalize(), fields['card'].getPrettyStr()))
+        elif event == Events.TURN:
+            print("***** {}'s turn *****\n\n".format(fields['turn'].capitalize()))
+            for idx, hand in enumerate(fields['playerHands']):
+                print("Player hand {}: {}\n".format(idx, hand.strFromHand()))
+            if fields['turn'] == 'player':
+                print("Player is currently playing hand {}\n".format(fields['handIdx']))
+            print("Dealer's shown card: {}\n".format(fields['dealerHand'].strFromHand()))
+        elif event == Events.ACTION:
+            print("{} action is {}\n".format(fields['by'].capitalize(), fields['action']))
+        elif event == Events.SPLIT:
+            print("Splitting player's hand...\nPlayer adding bet to new hand...\n")
+        elif event == Events.DOUBLE:
+            print("Doubling down the bet on the hand...\nReceiving final card...\n")
+        elif event == Events.OUTCOME:
+            print("=============\n\nHand {}:\nPlayer has {}, dealer has {}\n\nResult of hand is a {} for the player, payout is {}\n\n=============\n\n".format(
+                fields['handIdx'], fields['playerVal'], fields['dealerVal'], fields['winState'], fields['payout']))
+        elif event == Events.PAYOUT:
+            print("Total payout across all hands is {}\n".format(fields['payout']))
+
+def eventRecord(event, fields):
+    """ Plain dict of an event that can be written as json, cards and hands become their strings """
+    record = {'event' : event}
+    for key, value in fields.items():
+        if hasattr(value, 'getPrettyStr'):
+            value = value.getPrettyStr()
+        elif hasattr(value, 'strFromHand'):
+            value = value.strFromHand()
+        elif isinstance(value, list):
+            value = [hand.strFromHand() for hand in value]
+        record[key] = value
+    return record
+
+class FileLogger():
+    """ Writes every event to a file as a line of json """
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def onEvent(self, event, fields):
+        self.file.write(json.dumps(eventRecord(event, fields)))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+class MetricsCounter():
+    """ Counts events by type, and actions and outcomes by what they were """
+    def __init__(self):
+        self.events = {event : 0 for event in Events.allEvents}
+        self.actions = {}
+        self.outcomes = {}
+
+    def onEvent(self, event, fields):
+        self.events[event] += 1
+        if event == Events.ACTION and fields['by'] == 'player':
+            self.actions[fields['action']] = self.actions.get(fields['action'], 0) + 1
+        elif event == Events.OUTCOME:
+            self.outcomes[fields['winState']] = self.outcomes.get(fields['winState'], 0) + 1
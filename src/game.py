@@ -1,4 +1,7 @@
 from deck import Deck
+from deck import Shoe
+from deck import PairedDeck
+from deck import StratifiedDeck
 from deck import Card
 from deck import Face
 from deck import Suit
@@ -10,24 +13,78 @@ from agents import Expectimax
 from agents import QLearning
 from agents import Random
 from actions import Actions
-from util import vPrint
 from util import raiseErrorAtLoc
 from gameState import WinStates
 from gameState import GameState
 from diskIO import QDictIO
+from events import Events, EventHooks, ConsolePrinter
+from runningStats import GameStats
+from phaseProfile import PhaseProfiler, Phases
 
-from time import sleep
+from time import sleep, perf_counter_ns
+import random
 from functools import reduce
+from collections import namedtuple
 # PLAYER IS IDX 0, TURN 0
 # DEALER IS IDX 1, TURN 1
 
+"""
+Result of one hand as Game.iterHands yields it: the WinStates of each player hand, the total payout and bet
+across them, the player's money after the payout, and whether it was one of a q-learner's training hands
+"""
+HandResult = namedtuple('HandResult', ['winStates', 'payout', 'bet', 'money', 'training'])
+
+def normalizeAgentType(agentType):
+    """ Agent type with 'q-learning' spelled 'qlearning', the one name the rest of the game checks for """
+    return 'qlearning' if agentType == 'q-learning' else agentType
+
+def reportPerformance(startingMoney, aggregateOutcomes, payout, totalBet,  moneyLeft, maxAmtHad, minAmtHad, printSummary = True, running = None):
+    """
+    Output a summary of player performance over the hands played by an agent that started with startingMoney
+    Return the stats so they can be passed to statEngine (or merged with other runs, see parallel.py)
+    running is the RunningStats of the rounds in units of the bet, if kept, to report the house edge's confidence interval
+    """
+    nHandsPlayed = sum(aggregateOutcomes.values())
+    aggregatePercentages = {k : float(v) / float(nHandsPlayed) for k, v in aggregateOutcomes.items()}
+    
+    totalWinnings = payout
+    houseEdge = - totalWinnings / float(totalBet)
+
+    if printSummary:
+        print("Counting all splits as two hands, there were {} hands played by the agent who started with ${}\n".format(nHandsPlayed, startingMoney))
+        print("Most money ever had: {}\t Least money ever had: {}\n".format(maxAmtHad, minAmtHad))
+        print("Money remaining after all hands:  ${}\n".format(moneyLeft))
+        print("Total winnings {} on total bets of {} for a house edge of {:.1%}".format(totalWinnings, totalBet,  houseEdge))
+        if running is not None:
+            print("House edge 95% confidence interval: +/- {:.3%} over {} rounds, payout variance per round {:.4f}\n".format(running.houseEdgeCI(), running.n, running.payoutVariance()))
+        for state, number in aggregateOutcomes.items():
+            print("{} : {} ({:.1%})\n".format(state, number, aggregatePercentages[state]))
+
+    stats = {
+            'nHands' : nHandsPlayed,
+            'outcomes' : aggregateOutcomes,
+            'percentages' : aggregatePercentages,
+            'totalWinnings' : payout,
+            'totalBet' : totalBet,
+            'houseEdge' : houseEdge,
+            'moneyLeft' : moneyLeft,
+            'maxMoney' : maxAmtHad,
+            'minMoney' : minAmtHad,
+            }
+    if running is not None:
+        stats['houseEdgeCI'] = running.houseEdgeCI()
+        stats['returnVariance'] = running.payoutVariance()
+        stats['nRounds'] = running.n
+
+    return stats
+
 class Game():
     """
     Game class instantiates dealer and player and the initial game state. It plays the game by playing
     a sequence of hands until the player bustso or until the nHands value is reached (nHands should be used
     when not using a user-agent so if the agent keeps winning the game doesnt go on forever)
     """
-    def __init__(self, verbose, agentType, nHands, startingMoney, nTraining):
+    def __init__(self, verbose, agentType, nHands, startingMoney, nTraining, seed = None, nDecks = 0, penetration = .75, expectimaxTable = None, paired = False, stratified = False, profile = False):
         """
         Initialize the game! Create dealer and player objects and an initial gameState
         input: verbose
@@ -40,33 +97,72 @@ class Game():
             the amount of money the agent gets to start with
         input: nTraining
             the number of training hands to do for a qlearning player
+        input: seed
+            seed for the cards dealt and the agent's random choices, None to use the unseeded global random
+        input: nDecks
+            number of decks in a shoe dealt without replacement, 0 for an infinite deck
+        input: penetration
+            fraction of the shoe dealt before the cut card comes out and it gets reshuffled
+        input: expectimaxTable
+            file an expectimax agent keeps its solved policy table in, None to solve it every time
+        input: paired
+            deal the infinite deck from a PairedDeck, so agents with the same seed get the same cards hand for hand
+            after any training hands (see compare.py)
+        input: stratified
+            deal the infinite deck from a StratifiedDeck whose initial deals are chosen by the caller (see stratified.py)
+        input: profile
+            time each phase of every hand with a PhaseProfiler, reported by playGame (see phaseProfile.py)
         returns: nothing
         """
         self.verbose = verbose
-        self.agentType = agentType
+        self.agentType = normalizeAgentType(agentType)
         self.nHands = int(nHands) + int(nTraining)
         self.nStartingHands = int(nHands) + int(nTraining)
         print("{} test {} train {} total".format(nHands, nTraining, self.nHands))
         self.startingMoney = startingMoney
         self.nTraining = int(nTraining)
         self.dealer = Dealer()
-        self.player = self.createAgent(self.agentType, self.startingMoney, nTraining)
+
+        # The agent and the deck draw from their own generators, both seeded from the game's seed, so
+        # games in the same process don't share a stream. Unseeded games use the global random module
+        rng = None
+        agentRng = None
+        if seed is not None:
+            rng = random.Random(seed)
+            agentRng = random.Random(rng.getrandbits(64))
+        self.player = self.createAgent(self.agentType, self.startingMoney, nTraining, expectimaxTable, agentRng)
 
         self.agents = [self.player, self.dealer]
 
+        # Subscribers to the game's events, see events.py. Verbose games print each step
+        self.hooks = EventHooks()
+        if verbose:
+            self.hooks.subscribe(ConsolePrinter())
+
+        # Times the phases of each hand when profiling, None otherwise
+        self.profiler = PhaseProfiler() if profile else None
+
         # Clean slate
         dealerHand = Hand()
         playerHand = Hand()
-        deck = Deck()
+        if paired:
+            deck = PairedDeck(seed if seed is not None else random.getrandbits(64), self.nTraining if self.agentType == 'qlearning' else 0)
+        elif stratified:
+            deck = StratifiedDeck(rng)
+        elif int(nDecks) > 0:
+            deck = Shoe(nDecks, penetration, rng)
+        else:
+            deck = Deck(rng)
+
+        self.q = self.agentType == 'qlearning'
 
         # list because player can split
         playerHands = [playerHand]
         if self.player:
             initialBets = [self.player.getBetAmt()]
-            # Create initial game state
-            self.gameState = GameState(verbose, self.dealer, dealerHand, self.player, playerHands, deck, initialBets)
-
-        self.q = self.agentType == 'qlearning'
+            # Create initial game state. Only the q-learner looks back at previous states, so every
+            # other agent plays on a single state that is changed in place
+            self.gameState = GameState(verbose, self.dealer, dealerHand, self.player, playerHands, deck, initialBets, inPlace = not self.q, hooks = self.hooks)
 
     def isValidGame(self):
         """ Make sure we created the player correctly """
@@ -74,12 +170,16 @@ class Game():
             return False
         return True
 
-    def createAgent(self, agentType, startingMoney, nTraining):
+    def createAgent(self, agentType, startingMoney, nTraining, expectimaxTable = None, rng = None):
         """ Create an agent of the right type
         input: string agentType
             type of agent to create
         input: int startingMoney
             how much money the agent starts off with
+        input: expectimaxTable
+            file an expectimax agent keeps its solved policy table in
+        input: rng
+            random.Random the agent makes its random choices with, None for the global random module
 
         returns: An instantiated agent with startingMoney, or None if agent not supported yet
         """
@@ -88,91 +188,38 @@ class Game():
         elif (agentType == 'optimal'):
             return OptimalPlayer(startingMoney)
         elif (agentType == 'expectimax'):
-            return Expectimax(startingMoney)
+            return Expectimax(startingMoney, expectimaxTable)
         elif (agentType == 'q-learning' or agentType == 'qlearning'):
-            return QLearning(startingMoney, nTraining)
+            return QLearning(startingMoney, nTraining, rng = rng)
         elif (agentType == 'random'):
-            return Random(startingMoney)
+            return Random(startingMoney, rng)
         else:
             print("Can't create other agent types at this point\n")
             return None
 
 
-    def reportPerformance(self, aggregateOutcomes, payout, totalBet,  moneyLeft, maxAmtHad, minAmtHad):
+    def reportPerformance(self, aggregateOutcomes, payout, totalBet,  moneyLeft, maxAmtHad, minAmtHad, printSummary = True, running = None):
         """
         Take the values from the playGame loop and output a summary of player performance over the hands 
         Return the stats to the game so they can be passed to statEngine
         """
-        nHandsPlayed = sum(aggregateOutcomes.values())
-        aggregatePercentages = {k : float(v) / float(nHandsPlayed) for k, v in aggregateOutcomes.items()}
-        
-        totalWinnings = payout
-        houseEdge = - totalWinnings / float(totalBet)
-
-        print("Counting all splits as two hands, there were {} hands played by the agent who started with ${}\n".format(nHandsPlayed, self.startingMoney))
-        print("Most money ever had: {}\t Least money ever had: {}\n".format(maxAmtHad, minAmtHad))
-        print("Money remaining after all hands:  ${}\n".format(moneyLeft))
-        print("Total winnings {} on total bets of {} for a house edge of {:.1%}".format(totalWinnings, totalBet,  houseEdge))
-        for state, number in aggregateOutcomes.items():
-            print("{} : {} ({:.1%})\n".format(state, number, aggregatePercentages[state]))
-
-        stats = {
-                'nHands' : nHandsPlayed,
-                'outcomes' : aggregateOutcomes,
-                'percentages' : aggregatePercentages,
-                'totalWinnings' : payout,
-                'totalBet' : totalBet,
-                'houseEdge' : houseEdge,
-                }
-
-        return stats
-    def playGame(self):
-        """ Loop through playing hands until agent out of money or we reach self.nHands
-        input: none
-        returns: stat dictionary with summary of performance
+        return reportPerformance(self.startingMoney, aggregateOutcomes, payout, totalBet, moneyLeft, maxAmtHad, minAmtHad, printSummary, running)
 
+    def iterHands(self):
+        """ Play hands until agent out of money or we reach self.nHands, or a user agent stops,
+        yielding the result of each hand as soon as it's played
+        returns: generator of HandResult, one per hand including a q-learner's training hands
         """
         if(self.verbose):
             print("**** Welcome to CS182 Blackjack! ****\n\n\nNew game:\nYour starting money: {}\n".format(self.startingMoney))
 
-        # Performance bookkeeping
-        aggregateOutcomes = {
-            WinStates.WIN : 0,
-            WinStates.PUSH : 0,
-            WinStates.BLACKJACK : 0,
-            WinStates.LOSE: 0,
-        }
-        aggregatePayout = 0
-        aggregateBet = 0
-        minVal = int(self.startingMoney)
-        maxVal = int(self.startingMoney)
-        stats = None 
-        # Game loop
         while(True):
-            if self.nHands % 10000 == 0:
-                print(self.nHands)
+            # Only the q-learner has training hands, they come first
+            training = self.q and (self.nStartingHands - self.nHands) < self.nTraining
 
             # Play hand
             winStateList, payout, betAmount = self.playHand()
-
-            # Performance tracking. Only track performance for Q-learner if it's out of training
-            bookkeep = True
-            if self.q:
-                if((self.nStartingHands - self.nHands) < (self.nTraining)):
-                    bookkeep = False
-       
-            if bookkeep:
-                # Bookkeeping on performance
-                for winState in winStateList:
-                    aggregateOutcomes[winState] += 1
-                aggregatePayout += payout
-                aggregateBet += betAmount
-    
-                curMoney = self.gameState.player.getMoney()
-                if curMoney > maxVal:
-                    maxVal = curMoney
-                if curMoney < minVal:
-                    minVal = curMoney
+            yield HandResult(winStateList, payout, betAmount, self.gameState.player.getMoney(), training)
 
             # Reset hands 
             self.gameState.resetHands()
@@ -182,18 +229,49 @@ class Game():
                 sleep(2)
                 cont = input("Another hand? y/n ---> ")
                 if cont == "n" or cont == "N" or cont == "no":
-                    break
+                    return
 
             # Out of money or game over
             if self.nHands == 0 or self.gameState.player.getMoney() <= 0:
-                stats = self.reportPerformance(aggregateOutcomes, aggregatePayout, aggregateBet, curMoney, maxVal, minVal)
-                
-                # If qlearner, write the policy to disk
-                if self.q:
-                    diskIO = QDictIO(self.player.QValues)
-                    diskIO.write()
+                return
+
+    def playGame(self, report = True, targetCI = None, minRounds = 1000):
+        """ Play the hands of iterHands and sum up how the agent did
+        input: report
+            print the summary and write the qlearner's policy to disk at the end, False for parallel workers
+        input: targetCI
+            stop early, once the 95% confidence interval on the house edge is narrower than +/- targetCI.
+            self.nHands is still the most hands played
+        input: minRounds
+            rounds to play before checking the confidence interval, and how often to check it
+        returns: stat dictionary with summary of performance, see GameStats.report, and the PhaseProfiler's report
+            as 'profile' when profiling
+
+        """
+        # Performance bookkeeping
+        gameStats = GameStats(self.startingMoney, self.player.getBetAmt())
+
+        for result in self.iterHands():
+            if report and self.nHands % 10000 == 0:
+                print(self.nHands)
+
+            # Only track performance for Q-learner if it's out of training
+            if result.training:
+                continue
+
+            gameStats.add(result.winStates, result.payout, result.bet)
+            if targetCI is not None and gameStats.running.n % minRounds == 0 and gameStats.running.houseEdgeCI() < targetCI:
                 break
-        
+
+        stats = gameStats.report(report)
+        if self.profiler is not None:
+            stats['profile'] = self.profiler.report(report)
+
+        # If qlearner, write the policy to disk
+        if self.q and report:
+            diskIO = QDictIO(self.player.getQDict())
+            diskIO.write()
+
         return stats
 
 
@@ -207,16 +285,23 @@ class Game():
         (multiple hands mentioned in case fo split)
         """
 
-        vPrint("\n\n*************** NEW HAND ***************\n\n", self.verbose)
-
         self.nHands -= 1
 
+        # Every phase is timed only when profiling, otherwise it costs a check of the local
+        profiler = self.profiler
+        if profiler:
+            handStart = perf_counter_ns()
+
+        if self.hooks and self.hooks.byEvent[Events.NEW_HAND]:
+            self.hooks.emit(Events.NEW_HAND, {'bet' : self.player.getBetAmt(), 'money' : self.player.getMoney()})
+
         # Place bet and deal
+        if profiler:
+            start = perf_counter_ns()
         self.gameState.initialDeal()
+        if profiler:
+            profiler.add(Phases.DEAL, start)
 
-        vPrint("New hand: Player bet: {}\tPlayer money: {}\n".format(self.player.getBetAmt(), self.player.getMoney()), self.verbose)
-        vPrint("...Dealing...\n", self.verbose)
-    
         # for storing last actions of each hand for qlearning updates
         lastActions = []
         lastNewStates = []
@@ -226,21 +311,27 @@ class Game():
         while not self.gameState.isTerminal():
             # Player turn
             if self.gameState.isPlayerTurn():
-                vPrint("***** Player's turn *****\n\n", self.verbose)
-                for idx, hand in enumerate(self.gameState.getPlayerHands()):
-                    vPrint("Player hand {}: {}\n".format(idx, hand.strFromHand()), self.verbose)
-
-                vPrint("Player is currently playing hand {}\n".format(self.gameState.getPlayerHandIdx()), self.verbose)
-                vPrint("Dealer's shown card: {}\n".format(self.gameState.dealerHand.strFromHand()), self.verbose)
+                if self.hooks and self.hooks.byEvent[Events.TURN]:
+                    self.hooks.emit(Events.TURN, {'turn' : 'player', 'playerHands' : self.gameState.getPlayerHands(),
+                                                  'handIdx' : self.gameState.getPlayerHandIdx(), 'dealerHand' : self.gameState.dealerHand})
 
 
                 # Get action player takes in this state (will make sure its action for the hand they're playing)
+                if profiler:
+                    start = perf_counter_ns()
                 playerAction = self.player.getAction(self.gameState)
+                if profiler:
+                    profiler.add(Phases.ACTION, start)
 
-                vPrint("Player action is {}\n".format(playerAction), self.verbose)
+                if self.hooks and self.hooks.byEvent[Events.ACTION]:
+                    self.hooks.emit(Events.ACTION, {'by' : 'player', 'action' : playerAction, 'handIdx' : self.gameState.getPlayerHandIdx()})
 
                 # Take the action
+                if profiler:
+                    start = perf_counter_ns()
                 newGameState = self.gameState.generatePlayerSuccessor(playerAction)
+                if profiler:
+                    start = profiler.add(Phases.SUCCESSOR, start)
 
                 # If Q learner player, update them or store their last action to update after the dealer plays
                 if self.q:
@@ -259,29 +350,39 @@ class Game():
                         lastActions.append(playerAction)
                         lastPrevStates.append(self.gameState)
                         lastNewStates.append(newGameState)
+                    if profiler:
+                        profiler.add(Phases.Q_UPDATE, start)
 
                 # Update the gamestate
                 self.gameState = newGameState
        
             # Dealer turn
             else:
-                vPrint("***** Dealer's turn ****** \n\n", self.verbose)
-                for idx, hand in enumerate(self.gameState.getPlayerHands()):
-                    vPrint("Player hand {}: {}\n".format(idx, hand.strFromHand()), self.verbose)
-                vPrint("Dealer's shown card: {}\n".format(self.gameState.dealerHand.strFromHand()), self.verbose)
+                if self.hooks and self.hooks.byEvent[Events.TURN]:
+                    self.hooks.emit(Events.TURN, {'turn' : 'dealer', 'playerHands' : self.gameState.getPlayerHands(),
+                                                  'handIdx' : self.gameState.getPlayerHandIdx(), 'dealerHand' : self.gameState.dealerHand})
 
                 # Get dealers action
+                if profiler:
+                    start = perf_counter_ns()
                 dealerAction = self.dealer.getAction(self.gameState)
 
-                vPrint("Dealer action is {}\n".format(dealerAction), self.verbose)
+                if self.hooks and self.hooks.byEvent[Events.ACTION]:
+                    self.hooks.emit(Events.ACTION, {'by' : 'dealer', 'action' : dealerAction, 'handIdx' : self.gameState.getPlayerHandIdx()})
 
                 # Take the action
                 self.gameState = self.gameState.generateDealerSuccessor(dealerAction)
+                if profiler:
+                    profiler.add(Phases.DEALER, start)
 
         # Evaluate who won
+        if profiler:
+            start = perf_counter_ns()
         winStates = self.gameState.getWinState()
         totalBet = sum(self.gameState.getBets())
         payouts = [self.gameState.getPayout(winState, handIdx) for handIdx, winState in enumerate(winStates)]
+        if profiler:
+            start = profiler.add(Phases.WIN_STATE, start)
 
         # Update the qlearner with payouts based on their last actions
         if self.q:
@@ -300,15 +401,26 @@ class Game():
             lastActions = []
             lastPrevStates = []
             lastNewStates = []
+            if profiler:
+                profiler.add(Phases.Q_UPDATE, start)
 
         # Get the total payout and apply it, return the results to the game loop
         payout = reduce(lambda p1, p2: p1 + p2, payouts)
 
-        # vPrint the results of each hand and total payout
-        for idx, hand in enumerate(self.gameState.getPlayerHands()):
-            vPrint("=============\n\nHand {}:\nPlayer has {}, dealer has {}\n\nResult of hand is a {} for the player, payout is {}\n\n=============\n\n".format(idx, hand.getHandValue(), self.gameState.dealerHand.getHandValue(), winStates[idx], payouts[idx]), self.verbose)
-        vPrint("Total payout across all hands is {}\n".format(payout), self.verbose)
+        # Report the results of each hand and total payout
+        bets = self.gameState.getBets()
+        if self.hooks and self.hooks.byEvent[Events.OUTCOME]:
+            for idx, hand in enumerate(self.gameState.getPlayerHands()):
+                self.hooks.emit(Events.OUTCOME, {'handIdx' : idx, 'playerVal' : hand.getHandValue(), 'dealerVal' : self.gameState.dealerHand.getHandValue(),
+                                                 'winState' : winStates[idx], 'payout' : payouts[idx]})
 
         self.gameState = self.gameState.applyPayout(payout)
 
+        if self.hooks and self.hooks.byEvent[Events.PAYOUT]:
+            self.hooks.emit(Events.PAYOUT, {'payout' : payout, 'bet' : totalBet, 'money' : self.player.getMoney(), 'playerHands' : self.gameState.getPlayerHands(),
+                                            'dealerHand' : self.gameState.dealerHand, 'winStates' : winStates, 'bets' : bets, 'payouts' : payouts})
+
+        if profiler:
+            profiler.addHand(handStart)
+
         return (winStates, payout, totalBet)
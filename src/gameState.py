@@ -6,10 +6,9 @@ from deck import Hand
 from agents import Dealer
 from agents import UserPlayer
 from actions import Actions
-from util import vPrint
+from events import Events, EventHooks, ConsolePrinter
 from util import raiseErrorAtLoc
 
-from copy import deepcopy
 from time import sleep
 from functools import reduce
 # PLAYER IS IDX 0, TURN 0
@@ -29,8 +28,17 @@ class GameState():
     """
     GameState class gets dealer, player, hands, tracks turns, and takes actions
     """
-    def __init__(self, verbose, dealer, dealerHand, player, playerHands, deck, bets = None,playerHandIdx = 0, turn = 0):
+    def __init__(self, verbose, dealer, dealerHand, player, playerHands, deck, bets = None,playerHandIdx = 0, turn = 0, inPlace = False, hooks = None):
         self.verbose = verbose
+        # Subscribers to the events of the game, verbose states without any print each step
+        if hooks is None:
+            hooks = EventHooks()
+            if verbose:
+                hooks.subscribe(ConsolePrinter())
+        self.hooks = hooks
+        # In place states are mutated by the successor functions instead of copied, for when
+        # nothing needs to hold on to previous states
+        self.inPlace = inPlace
         self.turn = turn
         self.dealer = dealer
         self.player = player
@@ -47,13 +55,30 @@ class GameState():
         return self.bets
 
     def copy(self):
-        """ A copy of a state is the same state but we need to do a deep copy of each hand to ensure altering hands in the 
+        """ A copy of a state is the same state but with its own copy of each hand to ensure altering hands in the 
             copied state doesn't affect the original state
         """
-        copyDealerHand = deepcopy(self.dealerHand)
-        copyPlayerHands = [deepcopy(hand) for hand in self.playerHands]
+        copyDealerHand = self.dealerHand.copy()
+        copyPlayerHands = [hand.copy() for hand in self.playerHands]
         
-        return GameState(self.verbose, self.dealer, copyDealerHand, self.player, copyPlayerHands, self.deck, self.bets,  self.playerHandIdx, self.turn)
+        return GameState(self.verbose, self.dealer, copyDealerHand, self.player, copyPlayerHands, self.deck, list(self.bets),  self.playerHandIdx, self.turn, self.inPlace, self.hooks)
+
+    def successor(self):
+        """ A successor shares its hands with this state, so it costs no hand copies. Whatever changes a hand
+            of the successor must replace it with a copy first (see ownPlayerHand, ownDealerHand), which
+            leaves this state untouched for anyone still holding on to it, like the q-learning updates
+        """
+        return GameState(self.verbose, self.dealer, self.dealerHand, self.player, list(self.playerHands), self.deck, list(self.bets), self.playerHandIdx, self.turn, self.inPlace, self.hooks)
+
+    def ownPlayerHand(self, handIdx):
+        """ Make the player hand at handIdx private to this state before changing it """
+        if not self.inPlace:
+            self.playerHands[handIdx] = self.playerHands[handIdx].copy()
+
+    def ownDealerHand(self):
+        """ Make the dealer hand private to this state before changing it """
+        if not self.inPlace:
+            self.dealerHand = self.dealerHand.copy()
  
         
     ########### OBSERVING INFO ABOUT STATE ###############
@@ -120,6 +145,7 @@ class GameState():
                 # it's a push if dealer also has blackjack,
                 # so deal the dealer's second card and see
                 if self.dealerHand.nCards == 1:
+                    self.ownDealerHand()
                     self.dealDealerCard()
                 if self.dealerHand.isBlackjack():
                     winStatesForHands.append(WinStates.PUSH)
@@ -171,7 +197,7 @@ class GameState():
     def dealCard(self):
         """
         Deal a card
-        returns: a Card object from deck
+        returns: a Card object from deck (an infinite Deck or a Shoe)
         """
         return self.deck.getRandomCard()
 
@@ -182,24 +208,27 @@ class GameState():
         returns: nothing
         """
         newCard = self.dealCard()
-        vPrint("Player dealt {}".format(newCard.getPrettyStr()), self.verbose)
+        if self.hooks and self.hooks.byEvent[Events.DEAL]:
+            self.hooks.emit(Events.DEAL, {'to' : 'player', 'handIdx' : handIdx, 'card' : newCard})
         self.playerHands[handIdx].receiveCard(newCard)
 
     def dealDealerCard(self):
         """
         Deal a card to dealer by adding a dealt card to their hand
-        returns: nothing
+        returns: the card dealt
         """
-        newCard = self.dealCard()
-        if self.verbose:
-            vPrint("Dealer dealt {}".format(newCard.getPrettyStr()), self.verbose)
+        newCard = self.deck.getDealerCard()
+        if self.hooks and self.hooks.byEvent[Events.DEAL]:
+            self.hooks.emit(Events.DEAL, {'to' : 'dealer', 'card' : newCard})
         self.dealerHand.receiveCard(newCard)
+        return newCard
 
     def initialDeal(self):
         """
         Deal an initial hand of 2 cards to player and one to dealer
         returns: nothing
         """
+        self.deck.checkCutCard()
         for i in range(2):
             self.dealPlayerCard()
         self.dealDealerCard()
@@ -212,7 +241,7 @@ class GameState():
         input: payout amount
         returns: new gameState with the payout applied, turn reset to 0, hand reset to first, and default bet for one hand
         """
-        newState = GameState(self.verbose, self.dealer, self.dealerHand, self.player, self.playerHands, self.deck)
+        newState = GameState(self.verbose, self.dealer, self.dealerHand, self.player, self.playerHands, self.deck, inPlace = self.inPlace, hooks = self.hooks)
         newState.player.payout(payout)
         return newState
 
@@ -240,6 +269,7 @@ class GameState():
         returns: nothing
         """
         # Get the hand to split and remove it from the list
+        self.ownPlayerHand(self.playerHandIdx)
         handBeingSplit = self.playerHands.pop(self.playerHandIdx)
 
         if not handBeingSplit.isDoubles():
@@ -250,8 +280,11 @@ class GameState():
         newHand.receiveCard(handBeingSplit.hand.pop(1))
 
         # Deal each one a new card
-        handBeingSplit.receiveCard(self.dealCard())
-        newHand.receiveCard(self.dealCard())
+        for handIdx, hand in ((self.playerHandIdx, handBeingSplit), (self.playerHandIdx + 1, newHand)):
+            newCard = self.dealCard()
+            if self.hooks and self.hooks.byEvent[Events.DEAL]:
+                self.hooks.emit(Events.DEAL, {'to' : 'player', 'handIdx' : handIdx, 'card' : newCard})
+            hand.receiveCard(newCard)
 
         # Insert new hands back into the list where original was
         self.playerHands.insert(self.playerHandIdx, handBeingSplit)
@@ -266,13 +299,13 @@ class GameState():
         """
         Generate the successor gamestate after the player action
         input: (Action) player's action
-        returns: (GameState) new gameState object after the action has been taken
+        returns: (GameState) new gameState object after the action has been taken (this object if in place)
         """
-        # copy gamestate
-        newState = self.copy()
+        newState = self if self.inPlace else self.successor()
 
         if action == Actions.HIT:
             # Deal a card to player
+            newState.ownPlayerHand(newState.playerHandIdx)
             newState.dealPlayerCard(newState.playerHandIdx)
 
             # If current played hand is now busted, move on to next one in the new state
@@ -280,25 +313,28 @@ class GameState():
             # game loop, so no worries about the index going over the number of hands)
             if newState.getCurrentPlayableHand().isBust():
                 newState.playerHandIdx += 1
-            if newState.playerHandIdx == len(self.playerHands):
+            if newState.playerHandIdx == len(newState.playerHands):
                 newState.makeDealerTurn()
 
         elif action == Actions.STAND:
             # If standing on a hand, either move play to the next hand player has or to dealer
             # if player has played all hands
-            if self.playerHandIdx == len(self.playerHands) - 1:
+            if newState.playerHandIdx == len(newState.playerHands) - 1:
                 newState.makeDealerTurn()
             else:
                 newState.playerHandIdx += 1
 
         elif action == Actions.SPLIT:
-            vPrint("Splitting player's hand...\nPlayer adding bet to new hand...\n", self.verbose)
+            if self.hooks and self.hooks.byEvent[Events.SPLIT]:
+                self.hooks.emit(Events.SPLIT, {'handIdx' : newState.playerHandIdx, 'bet' : self.player.getBetAmt()})
             newState.splitPlayableHand()
 
         elif action == Actions.DOUBLE_DOWN:
-            vPrint("Doubling down the bet on the hand...\nReceiving final card...\n", self.verbose)
-            newState.dealPlayerCard()
-            newState.bets[self.playerHandIdx] += self.player.getBetAmt()
+            if self.hooks and self.hooks.byEvent[Events.DOUBLE]:
+                self.hooks.emit(Events.DOUBLE, {'handIdx' : newState.playerHandIdx, 'bet' : self.player.getBetAmt()})
+            newState.ownPlayerHand(newState.playerHandIdx)
+            newState.dealPlayerCard(newState.playerHandIdx)
+            newState.bets[newState.playerHandIdx] += self.player.getBetAmt()
             newState.makeDealerTurn()
         return newState
 
@@ -306,13 +342,15 @@ class GameState():
         """
         Generate the successor gamestate after the dealer action
         input: (Action) dealer's action
-        returns: (GameState) new gameState object after the action has been taken
+        returns: (GameState) new gameState object after the action has been taken (this object if in place)
         """
-        # copy game state
-        newState = self.copy() 
+        newState = self if self.inPlace else self.successor()
 
         if action == Actions.HIT:
-            newState.dealDealerCard()
+            newState.ownDealerHand()
+            newCard = newState.dealDealerCard()
+            if self.hooks and self.hooks.byEvent[Events.DEALER_DRAW]:
+                self.hooks.emit(Events.DEALER_DRAW, {'card' : newCard, 'dealerVal' : newState.dealerHand.getHandValue()})
         elif action == Actions.STAND:
             pass
         else:
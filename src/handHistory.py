@@ -0,0 +1,174 @@
+import os
+import struct
+import numpy as np
+
+from actions import Actions
+from deck import rankPoints, ACE_RANK
+from events import Events
+from runningStats import outcomeOrder
+
+"""
+Hand histories: every round of a game as a fixed width binary record, so long runs can be analyzed
+after the fact without playing them again. HandHistoryWriter subscribes to a game's events and packs
+a record per round into a buffer it writes out in large blocks. HandHistory memory maps a file and
+gives its records as a numpy structured array
+
+A file is a short header (magic, version, record size) followed by the records. Cards are their index
+in the 52 card table (rank * 4 + suit), actions their index in Actions.allActs and outcomes their index
+in outcomeOrder. Unused slots hold EMPTY. A player can have two hands after a split, hand 1 is empty otherwise
+"""
+
+MAGIC = b'BJHH'
+VERSION = 2
+HEADER = struct.Struct('<4sHH')
+EMPTY = 255
+
+# Most cards a hand can hold from the infinite deck: hard 20 from twenty aces, plus the card that reaches 21 or busts.
+# Most actions on a hand: the split, a hit for each of those cards past the first two, and the stand on 21
+MAX_CARDS = 21
+MAX_ACTIONS = MAX_CARDS
+
+recordDtype = np.dtype([
+    ('nHands', np.uint8),
+    ('playerCards', np.uint8, (2, MAX_CARDS)),
+    ('nPlayerCards', np.uint8, (2,)),
+    ('actions', np.uint8, (2, MAX_ACTIONS)),
+    ('dealerCards', np.uint8, (MAX_CARDS,)),
+    ('nDealerCards', np.uint8),
+    ('outcomes', np.uint8, (2,)),
+    ('bets', np.float64, (2,)),
+    ('payouts', np.float64, (2,)),
+])
+
+# Byte offset of each field in a record, for writing records without numpy
+fieldOffsets = {name : recordDtype.fields[name][1] for name in recordDtype.names}
+DOUBLE = struct.Struct('<d')
+
+def blankRecord():
+    """ Bytes of a record with no cards, actions or outcomes """
+    record = np.zeros(1, dtype=recordDtype)
+    for name in ('playerCards', 'actions', 'dealerCards', 'outcomes'):
+        record[name] = EMPTY
+    return record.tobytes()
+
+actionCodes = {action : idx for idx, action in enumerate(Actions.allActs)}
+outcomeCodes = {state : idx for idx, state in enumerate(outcomeOrder)}
+
+class HandHistoryWriter():
+    """ Writes each round of the game it's subscribed to, buffering bufferSize records at a time """
+    events = [Events.ACTION, Events.PAYOUT]
+
+    def __init__(self, path, bufferSize = 65536):
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, recordDtype.itemsize))
+        self.recordSize = recordDtype.itemsize
+        self.blank = blankRecord()
+        self.buffer = bytearray(self.recordSize * int(bufferSize))
+        self.offset = 0
+        self.nRecords = 0
+        # Player's actions on each hand of the round being played
+        self.actions = [[], []]
+
+    def onEvent(self, event, fields):
+        if event == Events.ACTION:
+            if fields['by'] == 'player':
+                self.actions[fields['handIdx']].append(actionCodes[fields['action']])
+        elif event == Events.PAYOUT:
+            self.writeRound(fields)
+            self.actions = [[], []]
+
+    def writeRound(self, fields):
+        """ Write the round that just ended, from the fields of its PAYOUT event, into the buffer over a blank record """
+        buffer = self.buffer
+        offset = self.offset
+        buffer[offset : offset + self.recordSize] = self.blank
+
+        playerHands = fields['playerHands']
+        buffer[offset + fieldOffsets['nHands']] = len(playerHands)
+        for idx, hand in enumerate(playerHands):
+            cards = self.fit([card.index for card in hand.hand], MAX_CARDS, 'cards')
+            start = offset + fieldOffsets['playerCards'] + idx * MAX_CARDS
+            buffer[start : start + len(cards)] = cards
+            buffer[offset + fieldOffsets['nPlayerCards'] + idx] = len(cards)
+            actions = self.fit(self.actions[idx], MAX_ACTIONS, 'actions')
+            start = offset + fieldOffsets['actions'] + idx * MAX_ACTIONS
+            buffer[start : start + len(actions)] = actions
+            buffer[offset + fieldOffsets['outcomes'] + idx] = outcomeCodes[fields['winStates'][idx]]
+            DOUBLE.pack_into(buffer, offset + fieldOffsets['bets'] + 8 * idx, fields['bets'][idx])
+            DOUBLE.pack_into(buffer, offset + fieldOffsets['payouts'] + 8 * idx, fields['payouts'][idx])
+
+        cards = self.fit([card.index for card in fields['dealerHand'].hand], MAX_CARDS, 'cards')
+        start = offset + fieldOffsets['dealerCards']
+        buffer[start : start + len(cards)] = cards
+        buffer[offset + fieldOffsets['nDealerCards']] = len(cards)
+
+        self.offset += self.recordSize
+        self.nRecords += 1
+        if self.offset == len(buffer):
+            self.flush()
+
+    def fit(self, values, limit, what):
+        """ values if a record has room for them, a record is never written with some of a hand missing """
+        if len(values) > limit:
+            raise ValueError("A hand with {} {} doesn't fit a hand history record of at most {}".format(len(values), what, limit))
+        return values
+
+    def flush(self):
+        """ Write the buffered records to the file """
+        self.file.write(memoryview(self.buffer)[:self.offset])
+        self.offset = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Value of each card index on its own, aces are 11
+cardValues = np.array([11 if index // 4 == ACE_RANK else rankPoints[index // 4] for index in range(52)], dtype=np.int16)
+
+class HandHistory():
+    """ The records of a hand history file, memory mapped as a numpy structured array of recordDtype """
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            magic, version, recordSize = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION or recordSize != recordDtype.itemsize:
+            raise ValueError("{} isn't a version {} hand history".format(path, VERSION))
+        # numpy can't map an empty file
+        if os.path.getsize(path) == HEADER.size:
+            self.records = np.zeros(0, dtype=recordDtype)
+        else:
+            self.records = np.memmap(path, dtype=recordDtype, mode='r', offset=HEADER.size)
+
+    def __len__(self):
+        return len(self.records)
+
+    def startingHands(self):
+        """ (first card value, second card value, upcard value) arrays of each round's initial deal, aces are 11 """
+        records = self.records
+        # After a split the second dealt card is the first card of hand 1
+        split = records['nHands'] == 2
+        second = np.where(split, records['playerCards'][:, 1, 0], records['playerCards'][:, 0, 1])
+        return cardValues[records['playerCards'][:, 0, 0]], cardValues[second], cardValues[records['dealerCards'][:, 0]]
+
+    def baseBets(self):
+        """ Bet each round started with, before a double down doubled it """
+        doubled = (self.records['actions'][:, 0] == actionCodes[Actions.DOUBLE_DOWN]).any(axis=1)
+        return self.records['bets'][:, 0] / np.where(doubled, 2.0, 1.0)
+
+    def evByStartingHand(self):
+        """
+        Average payout per unit of the starting bet of the rounds dealt each starting hand
+        returns: dict of (lower card value, higher card value, upcard value) -> (number of rounds, average payout)
+        """
+        first, second, upcard = self.startingHands()
+        low = np.minimum(first, second)
+        high = np.maximum(first, second)
+        payouts = self.records['payouts'].sum(axis=1) / self.baseBets()
+
+        # One integer key per starting hand so the rounds can be grouped with bincount
+        keys = (low * 12 + high) * 12 + upcard
+        counts = np.bincount(keys, minlength=12 ** 3)
+        sums = np.bincount(keys, weights=payouts, minlength=12 ** 3)
+        evs = {}
+        for key in np.nonzero(counts)[0].tolist():
+            evs[(key // 144, key // 12 % 12, key % 12)] = (int(counts[key]), sums[key] / counts[key])
+        return evs
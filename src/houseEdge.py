@@ -0,0 +1,255 @@
+from actions import Actions
+from diskIO import Policy, policyStateCode, policyStates, handTypeIdx, CAN_HIT, CAN_DOUBLE, CAN_SPLIT, N_POLICY_STATES
+from probability import cardProbs, startHand, addCard, dealerOutcomes, NATURAL
+
+"""
+Exact house edge of a policy under the rules GameState implements, as an alternative to simulating:
+infinite deck, dealer stands on all 17s, blackjack pays 1.5, one split of identical faces,
+no double after split, a two card 21 after a split counts as a blackjack, and the dealer
+doesn't draw if the player's last hand busts (the other hand then plays against the upcard)
+
+A policy is given as a chooser, a function (total, soft, pairVal, upcard, legalMask) -> {action : probability}
+where pairVal is the value of the pair card if the hand can be split and 0 otherwise
+"""
+
+# Ranks of the 13 faces by hard points, ten, jack, queen and king are distinct faces worth 10
+rankPoints = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 10, 10, 10]
+rankProb = 1.0 / len(rankPoints)
+
+def cardValue(points):
+    """ Value of a card on its own, aces are 11 """
+    return 11 if points == 1 else points
+
+def compareToDealer(final, dealerFinal):
+    """
+    Payout per unit bet of a finished player hand against a finished dealer hand, same as GameState.getWinState
+    final and dealerFinal are totals or NATURAL
+    """
+    if final == NATURAL:
+        return 0.0 if dealerFinal == NATURAL else 1.5
+    dealerTotal = 21 if dealerFinal == NATURAL else dealerFinal
+    if final > dealerTotal:
+        return -1.0 if final > 21 else 1.0
+    elif final < dealerTotal:
+        return 1.0 if dealerTotal > 21 else -1.0
+    else:
+        return -1.0 if final > 21 else 0.0
+
+def policyChooser(policy):
+    """ Chooser for a compiled diskIO Policy, like the optimal player's """
+    def choose(total, soft, pairVal, upcard, legalMask):
+        if pairVal:
+            code = policyStateCode(handTypeIdx['double'], pairVal, upcard, legalMask)
+        else:
+            code = policyStateCode(handTypeIdx['soft' if soft else 'hard'], total, upcard, legalMask)
+        return {policy.getAction(code) : 1.0}
+    return choose
+
+def legalActions(legalMask):
+    """ Legal actions of a mask, in the order of Actions.allActs """
+    flags = [legalMask & CAN_HIT, True, legalMask & CAN_DOUBLE, legalMask & CAN_SPLIT]
+    return [action for action, flag in zip(Actions.allActs, flags) if flag]
+
+def randomChooser():
+    """ Chooser for the random agent, uniform over the legal actions """
+    def choose(total, soft, pairVal, upcard, legalMask):
+        actions = legalActions(legalMask)
+        return {action : 1.0 / len(actions) for action in actions}
+    return choose
+
+def qLearningChooser(agent):
+    """
+    Chooser for the greedy policy of a QLearning agent. Ties are broken the way
+    QLearning.computeActionIdx breaks them, by coin flips against the best so far
+    """
+    from agents import qStateIdx, actionIdx
+    def choose(total, soft, pairVal, upcard, legalMask):
+        stateIdx = qStateIdx(upcard, total, not soft)
+        maxValue = -float("inf")
+        probs = {}
+        for action in legalActions(legalMask):
+            value = agent.QValues[stateIdx, actionIdx[action]]
+            if value > maxValue:
+                maxValue = value
+                probs = {action : 1.0}
+            elif value == maxValue:
+                probs = {act : p / 2 for act, p in probs.items()}
+                probs[action] = 0.5
+        return probs
+    return choose
+
+def chooserPolicy(chooser):
+    """
+    Compiled diskIO Policy that takes the chooser's most likely action in every state, so the batch simulator
+    can play it. Ties go to the action the chooser lists first, which a randomized chooser would only take some of the time
+    """
+    policy = Policy()
+    policy.table = [None] * N_POLICY_STATES
+    for handType, playerVal, total, soft, upcard, legalMask in policyStates():
+        probs = chooser(total, soft, playerVal if legalMask & CAN_SPLIT else 0, upcard, legalMask)
+        policy.table[policyStateCode(handTypeIdx[handType], playerVal, upcard, legalMask)] = max(probs, key = lambda act: probs[act])
+    return policy
+
+def chooserForAgent(agent):
+    """ Chooser for the greedy policy of a player agent, None if the agent isn't supported """
+    from agents import OptimalPlayer, Random, QLearning
+    # Expectimax agents are optimal players with a solved policy table
+    if isinstance(agent, OptimalPlayer):
+        return policyChooser(agent.policy)
+    elif isinstance(agent, Random):
+        return randomChooser()
+    elif isinstance(agent, QLearning):
+        return qLearningChooser(agent)
+    return None
+
+class HouseEdgeCalculator():
+    """
+    Computes the exact expected payout and bet of a round for a chooser by enumerating the starting
+    hands, every draw and the dealer's final totals
+    """
+    def __init__(self, chooser):
+        self.chooser = chooser
+        # (total, soft, twoCards, pairVal, upcard, nHands) -> final hand distribution
+        self.memo = {}
+        # (final, upcard) -> expected payout against a dealer playing out
+        self.vsDealer = {}
+
+    def payoutVsDealer(self, final, upcard):
+        """ Expected payout per unit bet of a finished hand against a dealer that plays out from upcard """
+        key = (final, upcard)
+        if key not in self.vsDealer:
+            self.vsDealer[key] = sum(p * compareToDealer(final, dealerFinal) for dealerFinal, p in dealerOutcomes(upcard).items())
+        return self.vsDealer[key]
+
+    def payoutVsUpcard(self, final, upcard):
+        """
+        Expected payout of a finished hand against a dealer left with just the upcard, after the last hand busts.
+        A blackjack deals the dealer one more card to check for a push
+        """
+        if final == NATURAL:
+            pDealerNatural = sum(p for points, p in cardProbs.items() if addCard(*startHand(upcard), points)[0] == 21)
+            return 1.5 * (1.0 - pDealerNatural)
+        return compareToDealer(final, upcard)
+
+    def decide(self, total, soft, twoCards, pairVal, upcard, nHands):
+        """ Legality mask and the chooser's {action : probability} for a hand """
+        legalMask = 0
+        if total < 21:
+            legalMask |= CAN_HIT
+        if twoCards and nHands == 1:
+            legalMask |= CAN_DOUBLE
+        if pairVal and nHands == 1:
+            legalMask |= CAN_SPLIT
+        return self.chooser(total, soft, pairVal if legalMask & CAN_SPLIT else 0, upcard, legalMask)
+
+    def playHand(self, total, soft, twoCards, pairVal, upcard, nHands):
+        """
+        Distribution of how a hand finishes when played with the chooser, split aside
+        returns: dict of (final total or NATURAL, doubled) -> probability. Busted totals are kept
+            because a busted hand can still beat a busted dealer with a higher total after a split
+        """
+        key = (total, soft, twoCards, pairVal, upcard, nHands)
+        if key in self.memo:
+            return self.memo[key]
+
+        # A two card 21 after a split is a blackjack and can only stand
+        if twoCards and total == 21:
+            self.memo[key] = {(NATURAL, False) : 1.0}
+            return self.memo[key]
+
+        finals = {}
+        for action, pAction in self.decide(total, soft, twoCards, pairVal, upcard, nHands).items():
+            for outcome, p in self.playAction(action, total, soft, upcard, nHands).items():
+                finals[outcome] = finals.get(outcome, 0.0) + pAction * p
+        self.memo[key] = finals
+        return finals
+
+    def playAction(self, action, total, soft, upcard, nHands):
+        """ Final hand distribution after taking a hit, stand or double down """
+        if action == Actions.HIT:
+            finals = {}
+            for points, p in cardProbs.items():
+                newTotal, newSoft = addCard(total, soft, points)
+                if newTotal > 21:
+                    outcomes = {(newTotal, False) : 1.0}
+                else:
+                    outcomes = self.playHand(newTotal, newSoft, False, 0, upcard, nHands)
+                for outcome, q in outcomes.items():
+                    finals[outcome] = finals.get(outcome, 0.0) + p * q
+            return finals
+        elif action == Actions.DOUBLE_DOWN:
+            finals = {}
+            for points, p in cardProbs.items():
+                outcome = (addCard(total, soft, points)[0], True)
+                finals[outcome] = finals.get(outcome, 0.0) + p
+            return finals
+        else:
+            # Stand, or no action from the policy which leaves the hand as it is
+            return {(total, False) : 1.0}
+
+    def splitHand(self, pairVal, upcard):
+        """ Final distribution of one of the two hands after a split """
+        startTotal, startSoft = startHand(pairVal)
+        finals = {}
+        for points, p in cardProbs.items():
+            total, soft = addCard(startTotal, startSoft, points)
+            for outcome, q in self.playHand(total, soft, True, 0, upcard, 2).items():
+                finals[outcome] = finals.get(outcome, 0.0) + p * q
+        return finals
+
+    def splitPayout(self, pairVal, upcard):
+        """
+        Expected payout of splitting. If the second hand busts the dealer doesn't draw and the
+        first hand plays against the upcard, otherwise both hands play against the dealer's final total
+        """
+        finals = self.splitHand(pairVal, upcard)
+        pSecondBusts = sum(p for (final, doubled), p in finals.items() if final != NATURAL and final > 21)
+        vsDealer = sum(p * self.payoutVsDealer(final, upcard) for (final, doubled), p in finals.items())
+        vsUpcard = sum(p * self.payoutVsUpcard(final, upcard) for (final, doubled), p in finals.items())
+
+        secondNotBust = sum(p * self.payoutVsDealer(final, upcard) for (final, doubled), p in finals.items() if final == NATURAL or final <= 21)
+        firstIfSecondNotBust = (1.0 - pSecondBusts) * vsDealer
+        ifSecondBusts = pSecondBusts * (-1.0 + vsUpcard)
+        return secondNotBust + firstIfSecondNotBust + ifSecondBusts
+
+    def roundValue(self, points1, points2, pair, upcard):
+        """ (expected payout, expected bet) in units of the bet for a starting hand against an upcard """
+        total, soft = addCard(*startHand(cardValue(points1)), points2)
+        if total == 21:
+            return self.payoutVsUpcard(NATURAL, upcard), 1.0
+
+        payout = 0.0
+        bet = 0.0
+        pairVal = cardValue(points1) if pair else 0
+        for action, pAction in self.decide(total, soft, True, pairVal, upcard, 1).items():
+            if action == Actions.SPLIT:
+                payout += pAction * self.splitPayout(pairVal, upcard)
+                bet += pAction * 2.0
+                continue
+            for (final, doubled), p in self.playAction(action, total, soft, upcard, 1).items():
+                mult = 2.0 if doubled else 1.0
+                # A lone busted hand loses without the dealer drawing
+                payout += pAction * p * mult * (-1.0 if final > 21 else self.payoutVsDealer(final, upcard))
+                bet += pAction * p * mult
+        return payout, bet
+
+    def calculate(self):
+        """
+        Exact expected payout and bet per round
+        returns: dict with 'houseEdge' (-payout / bet, as Game reports it), 'expectedPayout' and 'expectedBet' per round
+        """
+        payout = 0.0
+        bet = 0.0
+        for rank1, points1 in enumerate(rankPoints):
+            for rank2, points2 in enumerate(rankPoints):
+                for upcard, pUpcard in ((cardValue(points), p) for points, p in cardProbs.items()):
+                    p = rankProb * rankProb * pUpcard
+                    roundPayout, roundBet = self.roundValue(points1, points2, rank1 == rank2, upcard)
+                    payout += p * roundPayout
+                    bet += p * roundBet
+
+        return {
+            'houseEdge' : -payout / bet,
+            'expectedPayout' : payout,
+            'expectedBet' : bet,
+        }
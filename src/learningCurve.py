@@ -0,0 +1,57 @@
+from collections import namedtuple
+from itertools import islice
+
+from game import Game
+from houseEdge import HouseEdgeCalculator, qLearningChooser, chooserPolicy
+
+"""
+Learning curve of the q-learner from a single training run: one agent trains for as many hands as the
+last checkpoint, and at every checkpoint its current greedy policy is frozen and evaluated, exactly
+with houseEdge.py or by simulating it with the batch simulator. Retraining a fresh agent for every
+checkpoint costs the sum of the checkpoints in training hands, this costs the largest one
+
+The agent's exploration schedule is spread over the whole run, so a checkpoint's policy is not the one
+an agent trained for just that many hands would end with
+"""
+
+# One point of the curve: training hands played, house edge of the greedy policy then, and its 95% confidence interval (0 for exact)
+CurvePoint = namedtuple('CurvePoint', ['nTraining', 'houseEdge', 'houseEdgeCI'])
+
+def evaluateGreedy(agent, evalHands = 0, seed = None, startingMoney = 100000000):
+    """
+    House edge of a q-learner's current greedy policy and its 95% confidence interval
+    input: evalHands
+        hands to simulate the policy for in batches, 0 to calculate the house edge exactly
+    input: seed
+        seed for the simulated hands
+    input: startingMoney
+        money the simulated hands start with
+    returns: (houseEdge, houseEdgeCI)
+    """
+    chooser = qLearningChooser(agent)
+    if not evalHands:
+        return HouseEdgeCalculator(chooser).calculate()['houseEdge'], 0.0
+    from batchGame import BatchGame
+    stats = BatchGame('qlearning', evalHands, startingMoney, seed, policy = chooserPolicy(chooser)).playGame(report = False)
+    return stats['houseEdge'], stats['houseEdgeCI']
+
+def learningCurve(checkpoints, startingMoney = 100000000, seed = None, evalHands = 0):
+    """
+    Train one q-learner up to the largest checkpoint, evaluating its greedy policy at every checkpoint
+    input: checkpoints
+        numbers of training hands to evaluate the policy after
+    input: seed
+        seed for the training run, and for every checkpoint's simulated hands so they're compared on the same cards
+    input: evalHands
+        hands to simulate each checkpoint's policy for, 0 to calculate its house edge exactly
+    returns: generator of CurvePoint, one per checkpoint as soon as it's evaluated. It stops early if the agent runs out of money
+    """
+    checkpoints = sorted(set(int(checkpoint) for checkpoint in checkpoints))
+    game = Game(False, 'qlearning', 0, startingMoney, checkpoints[-1], seed)
+    hands = game.iterHands()
+    nPlayed = 0
+    for checkpoint in checkpoints:
+        nPlayed += sum(1 for result in islice(hands, checkpoint - nPlayed))
+        if nPlayed < checkpoint:
+            return
+        yield CurvePoint(nPlayed, *evaluateGreedy(game.player, evalHands, seed, startingMoney))
@@ -0,0 +1,126 @@
+import os
+import tracemalloc
+
+import numpy as np
+
+from events import Events
+
+"""
+Memory profiling of a game with tracemalloc: a MemoryProfiler subscribes to a game's NEW_HAND and PAYOUT events
+and, between start() and report(), measures how much memory each hand takes while it's played (the peak of the
+traced memory above what it was when the hand started), how much it leaves behind, the run's peak, and which
+modules the memory still held at the end was allocated in. Every interval hands it records the traced memory
+and, for a q-learner, how many states of its Q and N tables have been seen and how many (s,a) pairs visited
+
+tracemalloc counts live memory, not allocator calls, so a hand's churn shows up as its peak and not as a number
+of allocations. Tracing slows the game down several times, only time runs without it
+"""
+
+class MemoryProfiler():
+    """ Subscribe it to a game's hooks, call start() before playing and report() after """
+    events = [Events.NEW_HAND, Events.PAYOUT]
+
+    def __init__(self, player = None, interval = 10000, nTop = 10):
+        """
+        input: player
+            the game's player, a q-learner's tables are tracked in the timeline
+        input: interval
+            hands between points of the timeline
+        input: nTop
+            modules to report the memory of
+        """
+        self.player = player
+        self.interval = int(interval)
+        self.nTop = int(nTop)
+        self.nHands = 0
+        self.peak = 0
+        self.handPeakSum = 0
+        self.maxHandPeak = 0
+        self.handStart = 0
+        self.timeline = []
+        self.startSnapshot = None
+
+    def start(self):
+        """ Start tracing, only memory allocated from now on counts """
+        tracemalloc.start()
+        self.startSnapshot = self.snapshot()
+        self.startMemory = tracemalloc.get_traced_memory()[0]
+        self.addTimePoint()
+
+    def snapshot(self):
+        """ Snapshot of the traced memory, without the memory of tracemalloc and of this profiler """
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ])
+
+    def onEvent(self, event, fields):
+        if event == Events.NEW_HAND:
+            self.handStart = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        else:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.peak = max(self.peak, peak)
+            self.handPeakSum += peak - self.handStart
+            self.maxHandPeak = max(self.maxHandPeak, peak - self.handStart)
+            self.nHands += 1
+            if self.nHands % self.interval == 0:
+                self.addTimePoint()
+
+    def addTimePoint(self):
+        """ Record the traced memory and the q-learner's tables after the hands played so far """
+        point = {'nHands' : self.nHands, 'tracedBytes' : tracemalloc.get_traced_memory()[0]}
+        QValues = getattr(self.player, 'QValues', None)
+        if QValues is not None:
+            point['qStatesSeen'] = int(self.player.seen.sum())
+            point['pairsVisited'] = int(np.count_nonzero(self.player.NVisited))
+            point['tableBytes'] = QValues.nbytes + self.player.NVisited.nbytes + self.player.seen.nbytes
+        self.timeline.append(point)
+
+    def report(self, printSummary = True):
+        """
+        Stop tracing and output what the hands took
+        returns: dict with 'nHands', 'peakBytes' traced, 'handPeakBytes' (mean over hands) and 'maxHandPeakBytes' above
+            the memory a hand started with, 'retainedBytesPerHand' and 'retainedBlocksPerHand' still held at the end,
+            'topModules', a list of {'module', 'bytes', 'blocks'} held at the end by the modules they were allocated in,
+            and 'timeline', a list of {'nHands', 'tracedBytes'} with 'qStatesSeen', 'pairsVisited', 'tableBytes' for a q-learner
+        """
+        if self.nHands % self.interval != 0:
+            self.addTimePoint()
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        snapshot = self.snapshot()
+        tracemalloc.stop()
+
+        differences = snapshot.compare_to(self.startSnapshot, 'filename')
+        retainedBytes = sum(difference.size_diff for difference in differences)
+        retainedBlocks = sum(difference.count_diff for difference in differences)
+        top = sorted(differences, key=lambda difference: difference.size_diff, reverse=True)[:self.nTop]
+        hands = float(max(self.nHands, 1))
+
+        stats = {
+                'nHands' : self.nHands,
+                'peakBytes' : self.peak - self.startMemory,
+                'handPeakBytes' : self.handPeakSum / hands,
+                'maxHandPeakBytes' : self.maxHandPeak,
+                'retainedBytesPerHand' : retainedBytes / hands,
+                'retainedBlocksPerHand' : retainedBlocks / hands,
+                'topModules' : [{'module' : os.path.basename(difference.traceback[0].filename), 'bytes' : difference.size_diff, 'blocks' : difference.count_diff}
+                                for difference in top],
+                'timeline' : self.timeline,
+                }
+
+        if printSummary:
+            print("Memory over {} hands: peak {:,} bytes traced, each hand peaked {:,.0f} bytes above its start on average ({:,} at most) and left {:,.1f} bytes in {:.2f} blocks behind\n".format(
+                self.nHands, stats['peakBytes'], stats['handPeakBytes'], stats['maxHandPeakBytes'], stats['retainedBytesPerHand'], stats['retainedBlocksPerHand']))
+            print("Memory held at the end by the module it was allocated in:")
+            for module in stats['topModules']:
+                print("{:<24} {:>+14,} bytes {:>+10,} blocks".format(module['module'], module['bytes'], module['blocks']))
+            print("")
+            for point in self.timeline:
+                line = "After {:>10} hands: {:>14,} bytes traced".format(point['nHands'], point['tracedBytes'])
+                if 'qStatesSeen' in point:
+                    line += ", {} Q states seen, {} (s,a) pairs visited, {:,} bytes of Q and N tables".format(point['qStatesSeen'], point['pairsVisited'], point['tableBytes'])
+                print(line)
+            print("")
+        return stats
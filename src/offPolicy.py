@@ -0,0 +1,200 @@
+import numpy as np
+
+from actions import Actions
+from deck import rankPoints, ACE_RANK
+from diskIO import CAN_HIT, CAN_DOUBLE, CAN_SPLIT
+from handHistory import HandHistory, EMPTY
+from houseEdge import randomChooser, legalActions
+import probability
+
+"""
+Off-policy evaluation: estimate how a policy would do from a hand history logged while a different,
+randomized policy (the behavior, usually the random agent) played, without simulating anything.
+Every logged decision is weighted by how much more or less likely the policy being evaluated (the target)
+is to take the logged action, and a round by the product over its decisions. Policies are choosers,
+functions (total, soft, pairVal, upcard, legalMask) -> {action : probability} as in houseEdge.py
+
+Three estimates come out: ordinary importance sampling, the self normalized (weighted) version of it,
+and a doubly robust one that uses the infinite deck action values of probability.py as a model to take
+out most of the variance. The behavior must give every action the target can take a nonzero probability
+"""
+
+HIT_IDX, STAND_IDX, DOUBLE_IDX, SPLIT_IDX = range(len(Actions.allActs))
+
+def cardValue(cardIdx):
+    """ Value of a card index on its own, aces are 11 """
+    rank = cardIdx // 4
+    return 11 if rank == ACE_RANK else rankPoints[rank]
+
+def handTotal(cards):
+    """ (total, soft) of a hand of card indices """
+    hard = sum(rankPoints[card // 4] for card in cards)
+    if hard <= 11 and any(card // 4 == ACE_RANK for card in cards):
+        return hard + 10, True
+    return hard, False
+
+def epsilonGreedyChooser(greedy, epsilon):
+    """ Chooser that plays greedy, another chooser, but picks uniformly from the legal actions with probability epsilon """
+    def choose(total, soft, pairVal, upcard, legalMask):
+        actions = legalActions(legalMask)
+        probs = {action : epsilon / len(actions) for action in actions}
+        for action, p in greedy(total, soft, pairVal, upcard, legalMask).items():
+            action = Actions.STAND if action is None else action
+            probs[action] = probs.get(action, 0.0) + (1 - epsilon) * p
+        return probs
+    return choose
+
+class OffPolicyEvaluator():
+    """
+    Replays a hand history once into arrays of its decisions, then scores any number of target choosers
+    against it. Only decisions with more than one legal action are kept, standing on 21 isn't a choice
+    """
+    def __init__(self, history, behavior = None):
+        """
+        input: history
+            a HandHistory or the path of a hand history file
+        input: behavior
+            chooser of the policy that played the logged hands, the random agent's if None
+        """
+        if not isinstance(history, HandHistory):
+            history = HandHistory(history)
+        records = history.records
+        self.nRounds = len(records)
+
+        # Payout and bet of each round in units of the bet it started with
+        baseBets = history.baseBets()
+        self.payouts = records['payouts'].sum(axis=1) / baseBets
+        self.bets = records['bets'].sum(axis=1) / baseBets
+
+        # (total, soft, pairVal, upcard, legalMask) of each distinct decision state
+        self.states = []
+        self.stateIds = {}
+        decisionRounds = []
+        decisionStates = []
+        decisionActions = []
+
+        def addDecision(roundIdx, cards, nHands, upcard, action):
+            total, soft = handTotal(cards)
+            twoCards = len(cards) == 2
+            # A two card 21 is a blackjack and can only stand
+            if twoCards and total == 21:
+                return
+            legalMask = 0
+            if total < 21:
+                legalMask |= CAN_HIT
+            if twoCards and nHands == 1:
+                legalMask |= CAN_DOUBLE
+                if cards[0] // 4 == cards[1] // 4:
+                    legalMask |= CAN_SPLIT
+            if legalMask == 0:
+                return
+            key = (total, soft, cardValue(cards[0]) if legalMask & CAN_SPLIT else 0, upcard, legalMask)
+            if key not in self.stateIds:
+                self.stateIds[key] = len(self.states)
+                self.states.append(key)
+            decisionRounds.append(roundIdx)
+            decisionStates.append(self.stateIds[key])
+            decisionActions.append(action)
+
+        def replayHand(roundIdx, cards, actions, upcard, nHands):
+            nCards = 2
+            for action in actions:
+                addDecision(roundIdx, cards[:nCards], nHands, upcard, action)
+                if action == HIT_IDX or action == DOUBLE_IDX:
+                    nCards += 1
+
+        nHands = records['nHands'].tolist()
+        playerCards = records['playerCards'].tolist()
+        actions = records['actions'].tolist()
+        upcards = records['dealerCards'][:, 0].tolist()
+        for roundIdx in range(self.nRounds):
+            upcard = cardValue(upcards[roundIdx])
+            handActions = [[action for action in hand if action != EMPTY] for hand in actions[roundIdx]]
+            if nHands[roundIdx] == 2:
+                # The split was the first hand's first action, on the pair that became the first card of each hand
+                pair = [playerCards[roundIdx][0][0], playerCards[roundIdx][1][0]]
+                addDecision(roundIdx, pair, 1, upcard, handActions[0][0])
+                replayHand(roundIdx, playerCards[roundIdx][0], handActions[0][1:], upcard, 2)
+                replayHand(roundIdx, playerCards[roundIdx][1], handActions[1], upcard, 2)
+            else:
+                replayHand(roundIdx, playerCards[roundIdx][0], handActions[0], upcard, 1)
+
+        self.decisionRounds = np.array(decisionRounds, dtype=np.int64)
+        self.decisionStates = np.array(decisionStates, dtype=np.int64)
+        self.decisionActions = np.array(decisionActions, dtype=np.int64)
+
+        # Decisions of a round are stored together and in order, each one's first and the last decision of every round
+        self.roundStart = np.searchsorted(self.decisionRounds, self.decisionRounds)
+        self.lastDecisions = np.nonzero(np.append(np.diff(self.decisionRounds) != 0, True))[0] if len(decisionRounds) else np.zeros(0, dtype=np.int64)
+
+        self.behaviorProbs = self.policyTable(behavior if behavior is not None else randomChooser())[self.decisionStates, self.decisionActions]
+        if (self.behaviorProbs == 0).any():
+            raise ValueError("The behavior policy never takes some of the logged actions, the hands weren't played by it")
+        self.model = self.modelTable()
+
+    def policyTable(self, chooser):
+        """ (number of states, number of actions) array of the chooser's probability of each action in each state """
+        table = np.zeros((len(self.states), len(Actions.allActs)))
+        for stateId, (total, soft, pairVal, upcard, legalMask) in enumerate(self.states):
+            for action, p in chooser(total, soft, pairVal, upcard, legalMask).items():
+                # A policy without a legal action leaves the hand as it is, like standing
+                table[stateId, Actions.allActs.index(Actions.STAND if action is None else action)] += p
+        return table
+
+    def modelTable(self):
+        """ Infinite deck expected payout of each legal action in each state, played on optimally after it """
+        table = np.zeros((len(self.states), len(Actions.allActs)))
+        for stateId, (total, soft, pairVal, upcard, legalMask) in enumerate(self.states):
+            table[stateId, STAND_IDX] = probability.standEV(total, upcard)
+            if legalMask & CAN_HIT:
+                table[stateId, HIT_IDX] = probability.hitEV(total, soft, upcard)
+            if legalMask & CAN_DOUBLE:
+                table[stateId, DOUBLE_IDX] = probability.doubleEV(total, soft, upcard)
+            if legalMask & CAN_SPLIT:
+                table[stateId, SPLIT_IDX] = probability.splitEV(pairVal, upcard)
+        return table
+
+    def evaluate(self, target):
+        """
+        Estimate the target chooser's payout and bet per round, in units of the starting bet
+        returns: dict with 'houseEdge' (-payout / bet from the weighted estimates), 'expectedPayout' and 'expectedBet'
+            (weighted importance sampling), 'isPayout' (ordinary importance sampling), 'drPayout' and 'drHouseEdge'
+            (doubly robust), and 'effectiveSampleSize' of the weights out of 'nRounds'
+        """
+        pi = self.policyTable(target)
+        ratios = pi[self.decisionStates, self.decisionActions] / self.behaviorProbs
+
+        # Running products of the ratios within each round, through and before each decision, in logs so a
+        # zero ratio only zeroes the decisions after it
+        zero = ratios == 0
+        logRatios = np.log(np.where(zero, 1.0, ratios))
+        cumLog = np.cumsum(logRatios)
+        cumZero = np.cumsum(zero)
+        startLog = cumLog[self.roundStart] - logRatios[self.roundStart]
+        startZero = cumZero[self.roundStart] - zero[self.roundStart]
+        rhoThrough = np.exp(cumLog - startLog) * (cumZero == startZero)
+        rhoBefore = np.exp(cumLog - logRatios - startLog) * (cumZero - zero == startZero)
+
+        # Weight of each round, rounds without a decision (blackjacks, 21s) weigh 1
+        weights = np.ones(self.nRounds)
+        weights[self.decisionRounds[self.lastDecisions]] = rhoThrough[self.lastDecisions]
+
+        totalWeight = weights.sum()
+        expectedPayout = (weights * self.payouts).sum() / totalWeight
+        expectedBet = (weights * self.bets).sum() / totalWeight
+
+        # Doubly robust, each decision adds the model's value of the state under the target minus its value of the logged action
+        values = (pi * self.model).sum(axis=1)
+        corrections = rhoBefore * values[self.decisionStates] - rhoThrough * self.model[self.decisionStates, self.decisionActions]
+        drPayout = (weights * self.payouts + np.bincount(self.decisionRounds, weights=corrections, minlength=self.nRounds)).mean()
+
+        return {
+            'houseEdge' : -expectedPayout / expectedBet,
+            'expectedPayout' : expectedPayout,
+            'expectedBet' : expectedBet,
+            'isPayout' : (weights * self.payouts).mean(),
+            'drPayout' : drPayout,
+            'drHouseEdge' : -drPayout / expectedBet,
+            'effectiveSampleSize' : totalWeight ** 2 / (weights * weights).sum(),
+            'nRounds' : self.nRounds,
+        }
@@ -0,0 +1,60 @@
+from multiprocessing import Pool
+import random
+
+from game import Game
+from runningStats import mergeGameStats
+
+"""
+Parallel runs: shard the hands of a game across a pool of worker processes, each playing
+its own Game with its own seeded card and agent random streams, and merge the results
+"""
+
+# Agents that can be sharded, a user agent needs the terminal
+parallelAgents = ['optimal', 'expectimax', 'random', 'q-learning', 'qlearning']
+
+def workerSeeds(seed, nWorkers):
+    """
+    Seeds for each worker's random streams, derived from the master seed so runs are
+    reproducible for the same seed and number of workers
+    """
+    masterRng = random.Random(seed)
+    return [masterRng.getrandbits(128) for i in range(nWorkers)]
+
+def shardHands(nHands, nWorkers):
+    """ Split nHands as evenly as possible between nWorkers """
+    return [nHands // nWorkers + (1 if i < nHands % nWorkers else 0) for i in range(nWorkers)]
+
+def playShard(shard):
+    """
+    Worker: play one shard of the hands and return its stats without printing a summary
+    input: (agentType, nHands, startingMoney, nTraining, seed, batch, nDecks, penetration, expectimaxTable) tuple
+    """
+    agentType, nHands, startingMoney, nTraining, seed, batch, nDecks, penetration, expectimaxTable = shard
+    if batch:
+        from batchGame import BatchGame
+        game = BatchGame(agentType, nHands, startingMoney, seed, expectimaxTable = expectimaxTable)
+    else:
+        game = Game(False, agentType, nHands, startingMoney, nTraining, seed, nDecks, penetration, expectimaxTable)
+    return game.playGame(report = False)
+
+def mergeStats(statsList, printSummary = True):
+    """
+    Merge worker stats into one stat dictionary, as if the shards were played back to back in worker order,
+    from the GameStats accumulator each worker's stats carry
+    """
+    return mergeGameStats(statsList).report(printSummary)
+
+def playParallel(agentType, nHands, startingMoney, nTraining, nWorkers, seed = None, batch = False, nDecks = 0, penetration = .75, expectimaxTable = None):
+    """
+    Play nHands across nWorkers processes, each worker with its own shoe when nDecks > 0. A q-learner trains for the full nTraining hands in every
+    worker and only the testing hands are sharded. Its Q table isn't written to disk
+    returns: stat dictionary with summary of performance, same as Game.playGame
+    """
+    nWorkers = int(nWorkers)
+    seeds = workerSeeds(seed, nWorkers)
+    shards = [(agentType, n, startingMoney, nTraining, workerSeed, batch, nDecks, penetration, expectimaxTable) for n, workerSeed in zip(shardHands(int(nHands), nWorkers), seeds) if n > 0]
+
+    with Pool(nWorkers) as pool:
+        statsList = pool.map(playShard, shards)
+
+    return mergeStats(statsList)
@@ -0,0 +1,88 @@
+from time import perf_counter_ns
+
+"""
+Per-phase profiling of the game loop: a game with a PhaseProfiler times each phase of playing a hand with
+perf_counter_ns and counts how often it runs, to see where a slow run spends its time. Without one the
+game only checks that it has no profiler around each phase, like it checks its hooks before an event
+
+The phases are the initial deal, the player agent's getAction, generatePlayerSuccessor, the dealer's play
+(its getAction and generateDealerSuccessor), getWinState with the payouts of the hands, and the q-learner's
+updates. Events emitted inside a phase (the deal's DEAL events) count towards it, the rest of a hand's time
+is reported as other, and the time between hands (resetting them, the caller's bookkeeping) as between hands
+"""
+
+class Phases:
+    """ Phases of a hand the profiler times """
+    DEAL = 'initialDeal'
+    ACTION = 'getAction'
+    SUCCESSOR = 'generatePlayerSuccessor'
+    DEALER = 'dealerPlay'
+    WIN_STATE = 'getWinState'
+    Q_UPDATE = 'qUpdate'
+
+    allPhases = [DEAL, ACTION, SUCCESSOR, DEALER, WIN_STATE, Q_UPDATE]
+
+class PhaseProfiler():
+    """ Wall time and calls of each phase, and of the hands they're part of """
+    def __init__(self):
+        self.times = {phase : 0 for phase in Phases.allPhases}
+        self.calls = {phase : 0 for phase in Phases.allPhases}
+        self.nHands = 0
+        self.handTime = 0
+        # perf_counter_ns when the first hand started and the last one ended
+        self.firstStart = None
+        self.lastEnd = None
+
+    def add(self, phase, start):
+        """
+        Charge the time since start, a perf_counter_ns reading, to phase
+        returns: perf_counter_ns now, the start of whatever comes next
+        """
+        now = perf_counter_ns()
+        self.times[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def addHand(self, start):
+        """ Count a hand that started at start, a perf_counter_ns reading, and ends now """
+        now = perf_counter_ns()
+        self.nHands += 1
+        self.handTime += now - start
+        if self.firstStart is None:
+            self.firstStart = start
+        self.lastEnd = now
+
+    def report(self, printSummary = True):
+        """
+        Output hands and decisions per second and the share of the run's wall time of each phase
+        returns: dict with 'nHands', 'nDecisions' (the player's getAction calls), 'seconds' from the start of the first
+            hand to the end of the last, 'handsPerSec', 'decisionsPerSec' and 'phases', phase -> {'seconds', 'calls',
+            'percent'}, with 'other' for the rest of the hands' time and 'betweenHands' for the time outside them
+        """
+        wallTime = (self.lastEnd - self.firstStart) if self.nHands else 0
+        seconds = wallTime / 1e9
+        nDecisions = self.calls[Phases.ACTION]
+
+        phases = {phase : (self.times[phase], self.calls[phase]) for phase in Phases.allPhases}
+        phases['other'] = (self.handTime - sum(self.times.values()), self.nHands)
+        phases['betweenHands'] = (wallTime - self.handTime, max(self.nHands - 1, 0))
+        phases = {phase : {'seconds' : time / 1e9, 'calls' : calls, 'percent' : time / float(wallTime) if wallTime else 0.0}
+                  for phase, (time, calls) in phases.items()}
+
+        stats = {
+                'nHands' : self.nHands,
+                'nDecisions' : nDecisions,
+                'seconds' : seconds,
+                'handsPerSec' : self.nHands / seconds if seconds else 0.0,
+                'decisionsPerSec' : nDecisions / seconds if seconds else 0.0,
+                'phases' : phases,
+                }
+
+        if printSummary:
+            print("Played {} hands with {} decisions in {:.3f}s: {:.0f} hands/sec, {:.0f} decisions/sec\n".format(
+                self.nHands, nDecisions, seconds, stats['handsPerSec'], stats['decisionsPerSec']))
+            for phase, values in phases.items():
+                perCall = values['seconds'] * 1e9 / values['calls'] if values['calls'] else 0.0
+                print("{:<24} {:>6.1%} {:>10} calls {:>9.0f} ns/call".format(phase, values['percent'], values['calls'], perCall))
+            print("")
+        return stats
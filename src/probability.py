@@ -0,0 +1,187 @@
+from functools import lru_cache
+from bisect import bisect
+import random
+
+"""
+Exact expected values for the infinite deck. Every draw is a chance node over the 13 ranks,
+tens and faces all count 10 so the ranks collapse to 10 point values. Hands are described
+by (total, soft) where soft means an ace is being counted as 11, which is all that matters
+for how a hand can grow. Dealer cards are given as their value, 2-11 with an ace as 11
+"""
+
+# Probability of drawing a card of each hard point value, aces are 1
+cardProbs = {points : (4 if points == 10 else 1) / 13.0 for points in range(1, 11)}
+
+# Key for a dealer that ends on a two card 21, which only matters against a player blackjack
+NATURAL = 0
+
+def startHand(cardVal):
+    """ (total, soft) of a hand holding just a card of value cardVal (2-11) """
+    return (11, True) if cardVal == 11 else (cardVal, False)
+
+def addCard(total, soft, points):
+    """
+    Add a card with hard points to a hand
+    returns: (total, soft) of the new hand, an ace is counted as 11 as long as it doesn't bust
+    """
+    hard = (total - 10 if soft else total) + points
+    if (soft or points == 1) and hard <= 11:
+        return hard + 10, True
+    return hard, False
+
+class DealerTable():
+    """
+    Final dealer distributions by upcard for the dealer hitting until 17 and standing on soft 17,
+    computed once per upcard and cached. composition is the number of cards of each hard point
+    value (1-10) left to draw from, or None for the infinite deck. Also samples final totals
+    directly, for simulations that only need where the dealer ends up
+    """
+    def __init__(self, composition = None):
+        self.composition = None if composition is None else tuple(composition)
+        # upcard -> dict of final total (17-26, or NATURAL) to probability
+        self.outcomes = {}
+        # upcard -> (list of finals, list of cumulative probabilities) for sampling
+        self.cumulative = {}
+        self.memo = {}
+
+    def drawProbs(self, removed):
+        """ (points, probability) of the next card, after the cards counted in removed are dealt """
+        if self.composition is None:
+            return cardProbs.items()
+        left = [count - gone for count, gone in zip(self.composition, removed)]
+        nLeft = float(sum(left))
+        return [(points, count / nLeft) for points, count in zip(range(1, 11), left) if count > 0]
+
+    def dealerFrom(self, total, soft, nCards, removed):
+        """
+        Final dealer distribution from a dealer hand
+        returns: dict of final total (17-26, or NATURAL) to probability
+        """
+        if total >= 17:
+            return {NATURAL if nCards == 2 and total == 21 else total : 1.0}
+
+        # Only a two card hand can be a natural, so any count past 2 acts the same
+        key = (total, soft, min(nCards, 3), removed)
+        if key in self.memo:
+            return self.memo[key]
+
+        outcomes = {}
+        for points, p in self.drawProbs(removed):
+            newTotal, newSoft = addCard(total, soft, points)
+            newRemoved = removed
+            if self.composition is not None:
+                newRemoved = removed[:points - 1] + (removed[points - 1] + 1,) + removed[points:]
+            for final, q in self.dealerFrom(newTotal, newSoft, nCards + 1, newRemoved).items():
+                outcomes[final] = outcomes.get(final, 0.0) + p * q
+        self.memo[key] = outcomes
+        return outcomes
+
+    def getOutcomes(self, upcard):
+        """ Final dealer distribution when the dealer plays out from upcard (2-11) """
+        if upcard not in self.outcomes:
+            total, soft = startHand(upcard)
+            removed = None if self.composition is None else (0,) * 10
+            self.outcomes[upcard] = self.dealerFrom(total, soft, 1, removed)
+        return self.outcomes[upcard]
+
+    def getCumulative(self, upcard):
+        """ Finals of upcard and their cumulative probabilities """
+        if upcard not in self.cumulative:
+            finals = sorted(self.getOutcomes(upcard).items())
+            cumulative = []
+            total = 0.0
+            for final, p in finals:
+                total += p
+                cumulative.append(total)
+            self.cumulative[upcard] = ([final for final, p in finals], cumulative)
+        return self.cumulative[upcard]
+
+    def sample(self, upcard, rng = random):
+        """ Sample a dealer final (total, or NATURAL) from upcard without dealing the cards """
+        finals, cumulative = self.getCumulative(upcard)
+        return finals[min(bisect(cumulative, rng.random()), len(finals) - 1)]
+
+    def sampleArray(self, upcards, rng):
+        """
+        Sample dealer finals for a numpy array of upcards with a numpy Generator
+        returns: (totals, naturals) arrays, a natural has a total of 21
+        """
+        import numpy as np
+        totals = np.zeros(len(upcards), dtype=np.int16)
+        naturals = np.zeros(len(upcards), dtype=bool)
+        draws = rng.random(len(upcards))
+        for upcard in range(2, 12):
+            rows = np.nonzero(upcards == upcard)[0]
+            if len(rows) == 0:
+                continue
+            finals, cumulative = self.getCumulative(upcard)
+            picks = np.minimum(np.searchsorted(cumulative, draws[rows], side='right'), len(finals) - 1)
+            finals = np.array(finals)[picks]
+            naturals[rows] = finals == NATURAL
+            totals[rows] = np.where(finals == NATURAL, 21, finals)
+        return totals, naturals
+
+@lru_cache(maxsize=None)
+def dealerTable(composition = None):
+    """ Shared DealerTable for a composition (a tuple), or the infinite deck """
+    return DealerTable(composition)
+
+def dealerOutcomes(upcard):
+    """ Final dealer distribution for the infinite deck when the dealer plays out from upcard """
+    return dealerTable().getOutcomes(upcard)
+
+@lru_cache(maxsize=None)
+def standEV(total, upcard):
+    """ Expected payout per unit bet of standing on total (at most 21) against upcard """
+    ev = 0.0
+    for final, p in dealerOutcomes(upcard).items():
+        dealerTotal = 21 if final == NATURAL else final
+        if dealerTotal > 21 or total > dealerTotal:
+            ev += p
+        elif total < dealerTotal:
+            ev -= p
+    return ev
+
+@lru_cache(maxsize=None)
+def naturalEV(upcard):
+    """ Expected payout of a player blackjack, it pays 1.5 unless the dealer also has one """
+    return 1.5 * (1.0 - dealerOutcomes(upcard).get(NATURAL, 0.0))
+
+@lru_cache(maxsize=None)
+def hitEV(total, soft, upcard):
+    """ Expected payout of hitting and then playing on with hit or stand """
+    ev = 0.0
+    for points, p in cardProbs.items():
+        newTotal, newSoft = addCard(total, soft, points)
+        ev += p * (-1.0 if newTotal > 21 else bestEV(newTotal, newSoft, upcard))
+    return ev
+
+@lru_cache(maxsize=None)
+def bestEV(total, soft, upcard):
+    """ Expected payout of the best of hit and stand (no hitting 21) """
+    if total >= 21:
+        return standEV(total, upcard)
+    return max(standEV(total, upcard), hitEV(total, soft, upcard))
+
+@lru_cache(maxsize=None)
+def doubleEV(total, soft, upcard):
+    """ Expected payout of doubling the bet and taking exactly one card """
+    ev = 0.0
+    for points, p in cardProbs.items():
+        newTotal, newSoft = addCard(total, soft, points)
+        ev += p * (-1.0 if newTotal > 21 else standEV(newTotal, upcard))
+    return 2.0 * ev
+
+@lru_cache(maxsize=None)
+def splitEV(cardVal, upcard):
+    """
+    Expected payout of splitting a pair of cardVal cards. Each hand gets one card, can't double
+    or split again, and a two card 21 counts as a blackjack. The dealer is assumed to play out,
+    so the game's rule that the dealer doesn't draw when the last hand busts is ignored
+    """
+    total, soft = startHand(cardVal)
+    ev = 0.0
+    for points, p in cardProbs.items():
+        newTotal, newSoft = addCard(total, soft, points)
+        ev += p * (naturalEV(upcard) if newTotal == 21 else bestEV(newTotal, newSoft, upcard))
+    return 2.0 * ev
@@ -0,0 +1,229 @@
+from math import sqrt
+
+from gameState import WinStates
+
+"""
+Online statistics of the payout and bet of each round (a dealt hand and its splits), kept with
+Welford's updates so long runs don't lose precision. The house edge is the ratio -sum(payout) / sum(bet),
+its confidence interval comes from the delta method on the per-round payout and bet. GameStats builds
+on them to accumulate everything a run reports, in a form that merges across runs
+"""
+
+# Two sided 95% normal quantile
+Z_95 = 1.959964
+
+# Order outcomes are counted and serialized in, same as Game reports them
+outcomeOrder = [WinStates.WIN, WinStates.PUSH, WinStates.BLACKJACK, WinStates.LOSE]
+
+class RunningStats():
+    """ Running means, variances and covariance of per-round payouts and bets """
+    def __init__(self):
+        self.n = 0
+        self.meanPayout = 0.0
+        self.meanBet = 0.0
+        # Sums of squared deviations from the means, and of the co-deviations of payout and bet
+        self.m2Payout = 0.0
+        self.m2Bet = 0.0
+        self.coMoment = 0.0
+
+    def add(self, payout, bet):
+        """ Count one round """
+        self.n += 1
+        dPayout = payout - self.meanPayout
+        dBet = bet - self.meanBet
+        self.meanPayout += dPayout / self.n
+        self.meanBet += dBet / self.n
+        self.m2Payout += dPayout * (payout - self.meanPayout)
+        self.m2Bet += dBet * (bet - self.meanBet)
+        self.coMoment += dPayout * (bet - self.meanBet)
+
+    def addArrays(self, payouts, bets):
+        """ Count a numpy array of rounds at once """
+        if len(payouts) == 0:
+            return
+        chunk = RunningStats()
+        chunk.n = len(payouts)
+        chunk.meanPayout = float(payouts.mean())
+        chunk.meanBet = float(bets.mean())
+        dPayouts = payouts - chunk.meanPayout
+        dBets = bets - chunk.meanBet
+        chunk.m2Payout = float((dPayouts * dPayouts).sum())
+        chunk.m2Bet = float((dBets * dBets).sum())
+        chunk.coMoment = float((dPayouts * dBets).sum())
+        self.merge(chunk)
+
+    def merge(self, other):
+        """ Add the rounds counted by other, as if they were counted here """
+        n = self.n + other.n
+        if n == 0:
+            return
+        dPayout = other.meanPayout - self.meanPayout
+        dBet = other.meanBet - self.meanBet
+        weight = self.n * other.n / float(n)
+        self.m2Payout += other.m2Payout + dPayout * dPayout * weight
+        self.m2Bet += other.m2Bet + dBet * dBet * weight
+        self.coMoment += other.coMoment + dPayout * dBet * weight
+        self.meanPayout += dPayout * other.n / float(n)
+        self.meanBet += dBet * other.n / float(n)
+        self.n = n
+
+    def houseEdge(self):
+        """ -payout / bet over the rounds counted """
+        return -self.meanPayout / self.meanBet if self.meanBet else 0.0
+
+    def payoutVariance(self):
+        """ Sample variance of the payout of a round """
+        return self.m2Payout / (self.n - 1) if self.n > 1 else float('inf')
+
+    def houseEdgeCI(self, z = Z_95):
+        """ Half width of the confidence interval on the house edge, 95% by default """
+        if self.n < 2 or not self.meanBet:
+            return float('inf')
+        ratio = self.meanPayout / self.meanBet
+        variance = (self.m2Payout - 2 * ratio * self.coMoment + ratio * ratio * self.m2Bet) / (self.n - 1)
+        return z * sqrt(max(variance, 0.0) / self.n) / self.meanBet
+
+class GameStats():
+    """
+    Everything a run reports, accumulated one round at a time: outcome counts, total payout and bet, the
+    RunningStats of the payout and bet per round in units of the bet, how often rounds split and double,
+    the bankroll's extremes and a histogram of the payout per round. Accumulators of runs with the same
+    starting money and bet merge associatively, the bankroll is treated as if the runs were played back
+    to back, and they serialize to a small dict of plain values
+    """
+    def __init__(self, startingMoney, betAmt):
+        self.startingMoney = startingMoney
+        self.betAmt = float(betAmt)
+        self.outcomes = {state : 0 for state in outcomeOrder}
+        self.totalPayout = 0
+        self.totalBet = 0
+        self.running = RunningStats()
+        self.nSplits = 0
+        self.nDoubles = 0
+        # Bankroll relative to the starting money, after the last round and at its highest and lowest
+        self.net = 0
+        self.maxNet = 0
+        self.minNet = 0
+        # Payout of a round in units of the bet -> number of rounds
+        self.histogram = {}
+
+    def add(self, winStates, payout, bet):
+        """ Count one round, the WinStates of its hands and its total payout and bet """
+        for winState in winStates:
+            self.outcomes[winState] += 1
+        self.totalPayout += payout
+        self.totalBet += bet
+
+        units = payout / self.betAmt
+        self.running.add(units, bet / self.betAmt)
+        self.histogram[units] = self.histogram.get(units, 0) + 1
+        if len(winStates) > 1:
+            self.nSplits += 1
+        elif bet > self.betAmt:
+            self.nDoubles += 1
+
+        self.net += payout
+        if self.net > self.maxNet:
+            self.maxNet = self.net
+        if self.net < self.minNet:
+            self.minNet = self.net
+
+    def addArrays(self, outcomeCounts, payouts, bets, splits, doubles):
+        """
+        Count numpy arrays of rounds at once
+        input: outcomeCounts, number of hands with each outcome in outcomeOrder
+        input: payouts, bets, the total payout and bet of each round
+        input: splits, doubles, boolean arrays of the rounds that split or doubled
+        """
+        import numpy as np
+        if len(payouts) == 0:
+            return
+        for state, count in zip(outcomeOrder, outcomeCounts):
+            self.outcomes[state] += int(count)
+        self.totalPayout += float(payouts.sum())
+        self.totalBet += int(bets.sum())
+
+        units = payouts / self.betAmt
+        self.running.addArrays(units, bets / self.betAmt)
+        values, counts = np.unique(units, return_counts = True)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            self.histogram[value] = self.histogram.get(value, 0) + count
+        self.nSplits += int(splits.sum())
+        self.nDoubles += int(doubles.sum())
+
+        money = self.net + np.cumsum(payouts)
+        self.maxNet = max(self.maxNet, float(money.max()))
+        self.minNet = min(self.minNet, float(money.min()))
+        self.net = float(money[-1])
+
+    def merge(self, other):
+        """ Add the rounds of other, played after the rounds counted here """
+        for state, count in other.outcomes.items():
+            self.outcomes[state] += count
+        self.totalPayout += other.totalPayout
+        self.totalBet += other.totalBet
+        self.running.merge(other.running)
+        self.nSplits += other.nSplits
+        self.nDoubles += other.nDoubles
+        for value, count in other.histogram.items():
+            self.histogram[value] = self.histogram.get(value, 0) + count
+
+        self.maxNet = max(self.maxNet, self.net + other.maxNet)
+        self.minNet = min(self.minNet, self.net + other.minNet)
+        self.net += other.net
+        return self
+
+    def toDict(self):
+        """ Plain values of the accumulator, can be written as json and read back with fromDict """
+        running = self.running
+        return {
+            'startingMoney' : self.startingMoney,
+            'betAmt' : self.betAmt,
+            'outcomes' : [self.outcomes[state] for state in outcomeOrder],
+            'totalPayout' : self.totalPayout,
+            'totalBet' : self.totalBet,
+            'running' : [running.n, running.meanPayout, running.meanBet, running.m2Payout, running.m2Bet, running.coMoment],
+            'nSplits' : self.nSplits,
+            'nDoubles' : self.nDoubles,
+            'bankroll' : [self.net, self.maxNet, self.minNet],
+            'histogram' : sorted(self.histogram.items()),
+        }
+
+    @staticmethod
+    def fromDict(values):
+        """ Accumulator serialized by toDict """
+        stats = GameStats(values['startingMoney'], values['betAmt'])
+        stats.outcomes = dict(zip(outcomeOrder, values['outcomes']))
+        stats.totalPayout = values['totalPayout']
+        stats.totalBet = values['totalBet']
+        running = stats.running
+        running.n, running.meanPayout, running.meanBet, running.m2Payout, running.m2Bet, running.coMoment = values['running']
+        stats.nSplits = values['nSplits']
+        stats.nDoubles = values['nDoubles']
+        stats.net, stats.maxNet, stats.minNet = values['bankroll']
+        stats.histogram = {value : count for value, count in values['histogram']}
+        return stats
+
+    def report(self, printSummary = True):
+        """
+        Output the summary of game.reportPerformance
+        returns: its stat dictionary, with the split and double frequencies, the payout histogram and
+            this accumulator serialized as 'gameStats' so runs can be merged later
+        """
+        from game import reportPerformance
+        start = int(self.startingMoney)
+        stats = reportPerformance(self.startingMoney, dict(self.outcomes), self.totalPayout, self.totalBet,
+                                  start + self.net, start + self.maxNet, start + self.minNet, printSummary, self.running)
+        nRounds = float(max(self.running.n, 1))
+        stats['splitFrequency'] = self.nSplits / nRounds
+        stats['doubleFrequency'] = self.nDoubles / nRounds
+        stats['returnHistogram'] = dict(sorted(self.histogram.items()))
+        stats['gameStats'] = self.toDict()
+        return stats
+
+def mergeGameStats(statsList):
+    """ Merge the 'gameStats' of stat dictionaries from separate runs into one GameStats """
+    merged = GameStats.fromDict(statsList[0]['gameStats'])
+    for stats in statsList[1:]:
+        merged.merge(GameStats.fromDict(stats['gameStats']))
+    return merged
@@ -1,4 +1,6 @@
-from blackjack import main as runBlackjack
+from sweep import runSweep, SweepConfig
+from learningCurve import learningCurve
+from runningStats import mergeGameStats
 import matplotlib.pyplot as plt
 from matplotlib.ticker import MultipleLocator, FormatStrFormatter
 from pprint import pprint
@@ -13,22 +15,50 @@ folder = "../imgs/"
 numTraining = 10000
 numTesting  = 100000
 startingMoney = 100000000
+# Processes the sweeps run on, None for one per cpu
+numWorkers = None
 
 
 """
-GET ARGS TO RUN BLACKJACK 
+GET CONFIGS TO RUN BLACKJACK WITH, seeded so their results are cached (see sweep.py)
 """
-def getRandomArgs(n_test = numTesting):
-    return "-a random -n {} -s {}".format(n_test, startingMoney).split(" ")
+def getRandomConfig(n_test = numTesting, seed = 0):
+    return SweepConfig('random', 0, n_test, seed, startingMoney)
 
-def getOptimalArgs(n_test = numTesting):
-    return "-a optimal -n {} -s {}".format(n_test, startingMoney).split(" ")
+def getOptimalConfig(n_test = numTesting, seed = 0):
+    return SweepConfig('optimal', 0, n_test, seed, startingMoney)
 
-def getExpectiArgs(n_test = numTesting):
-    return "-a expectimax -n {} -s {}".format(n_test, startingMoney).split(" ")
+def getExpectiConfig(n_test = numTesting, seed = 0):
+    return SweepConfig('expectimax', 0, n_test, seed, startingMoney)
 
-def getQLearningArgs(n_train = numTraining, n_test = numTesting):
-    return "-a qlearning -t {} -n {} -s {}".format(n_train, n_test, startingMoney).split(" ")
+def getQLearningConfig(n_train = numTraining, n_test = numTesting, seed = 0):
+    return SweepConfig('qlearning', n_train, n_test, seed, startingMoney)
+
+
+"""
+Play the trials of the three baseline agents in one sweep
+returns: (random stats, expectimax stats, optimal stats) lists
+"""
+def sweepBaselines(n_baseline, num_trials_other):
+    configs = [getConfig(n_baseline, trial) for getConfig in (getRandomConfig, getExpectiConfig, getOptimalConfig) for trial in range(num_trials_other)]
+    stats = runSweep(configs, numWorkers)
+    n = num_trials_other
+    return stats[:n], stats[n:2 * n], stats[2 * n:]
+
+"""
+Learning curve of one q-learning training run, its greedy policy played for n_testing hands after each number of training hands
+returns: (training hands, house edge (%)) lists
+"""
+def qLearningCurve(n_trainings, n_testing):
+    curve = list(learningCurve(n_trainings, startingMoney, seed = 0, evalHands = n_testing))
+    return [point.nTraining for point in curve], [100 * point.houseEdge for point in curve]
+
+
+"""
+House edge (%) of several trials of an agent pooled into one run, without playing them again
+"""
+def pooledEdge(stats):
+    return 100 * mergeGameStats(stats).running.houseEdge()
 
 
 """
@@ -137,31 +167,16 @@ def graphQLearningPerformanceVsTrainingHands_SMALLER():
     n_trainings.insert(0,250)
     n_trainings.insert(0,1)
     print(n_trainings)
-    q_stats = []
-
     num_trials_other = 5
-    print("-- STAT ENGINE RUNNING RANDOM  AGENT --")
-    r_stats = [runBlackjack(getRandomArgs(70000)) for i in range (num_trials_other)]
-    print("-- STAT ENGINE RUNNINGEXPECTIMAX AGENT --")
-    e_stats = [runBlackjack(getExpectiArgs(70000)) for i in range(num_trials_other)]
-    print("-- STAT ENGINE RUNNING OPTIMAL AGENT --")
-    o_stats = [runBlackjack(getOptimalArgs(70000)) for i in range(num_trials_other)]
-     
-    for idx, training in enumerate(n_trainings):
-        print("\n--- STAT ENGINE EVALUATING ALGORITHMS VS {} TRAININGS FOR Q-LEARNING ---\n".format(training))
-    
-        print("-- STAT ENGINE RUNNING OPTIMAL AGENT --")
-        q_stats.append(runBlackjack(getQLearningArgs(training, n_testing)))
+    print("-- STAT ENGINE RUNNING BASELINE AGENTS --")
+    r_stats, e_stats, o_stats = sweepBaselines(70000, num_trials_other)
+    print("-- STAT ENGINE RUNNING Q-LEARNING VS {} TRAININGS --".format(n_trainings))
+    n_trainings, q_edge = qLearningCurve(n_trainings, n_testing)
              
-    q_edge = list(map(lambda d: 100 * d['houseEdge'], q_stats))
-    r_edge = list(map(lambda d: 100 * d['houseEdge'], r_stats))
-    e_edge = list(map(lambda d: 100 * d['houseEdge'], e_stats))
-    o_edge = list(map(lambda d: 100 * d['houseEdge'], o_stats))
-
     fig, ax = plt.subplots()
-    ax.axhline(y =sum(r_edge) / num_trials_other, color='b', alpha=.3, ls='-', label = 'Random Avg')
-    ax.axhline(y = sum(e_edge) / num_trials_other, color='g', alpha=.3, ls='-', label= 'Expectimax Avg')
-    ax.axhline(y = sum(o_edge) / num_trials_other, color='k', alpha=.3, ls='-', label = 'Optimal Avg')
+    ax.axhline(y = pooledEdge(r_stats), color='b', alpha=.3, ls='-', label = 'Random Avg')
+    ax.axhline(y = pooledEdge(e_stats), color='g', alpha=.3, ls='-', label= 'Expectimax Avg')
+    ax.axhline(y = pooledEdge(o_stats), color='k', alpha=.3, ls='-', label = 'Optimal Avg')
     ax.plot(n_trainings, q_edge, 'r-.', label="Q-Learning")
     
     
@@ -197,31 +212,16 @@ def graphQLearningPerformanceVsTrainingHands():
     n_trainings.insert(6, 3500)
     n_testing = 40000 
 
-    q_stats = []
-
     num_trials_other = 5
-    print("-- STAT ENGINE RUNNING RANDOM  AGENT --")
-    r_stats = [runBlackjack(getRandomArgs(50000)) for i in range (num_trials_other)]
-    print("-- STAT ENGINE RUNNINGEXPECTIMAX AGENT --")
-    e_stats = [runBlackjack(getExpectiArgs(50000)) for i in range(num_trials_other)]
-    print("-- STAT ENGINE RUNNING OPTIMAL AGENT --")
-    o_stats = [runBlackjack(getOptimalArgs(50000)) for i in range(num_trials_other)]
-     
-    for idx, training in enumerate(n_trainings):
-        print("\n--- STAT ENGINE EVALUATING ALGORITHMS VS {} TRAININGS FOR Q-LEARNING ---\n".format(training))
-    
-        print("-- STAT ENGINE RUNNING OPTIMAL AGENT --")
-        q_stats.append(runBlackjack(getQLearningArgs(training, n_testing)))
+    print("-- STAT ENGINE RUNNING BASELINE AGENTS --")
+    r_stats, e_stats, o_stats = sweepBaselines(50000, num_trials_other)
+    print("-- STAT ENGINE RUNNING Q-LEARNING VS {} TRAININGS --".format(n_trainings))
+    n_trainings, q_edge = qLearningCurve(n_trainings, n_testing)
              
-    q_edge = list(map(lambda d: 100 * d['houseEdge'], q_stats))
-    r_edge = list(map(lambda d: 100 * d['houseEdge'], r_stats))
-    e_edge = list(map(lambda d: 100 * d['houseEdge'], e_stats))
-    o_edge = list(map(lambda d: 100 * d['houseEdge'], o_stats))
-
     fig, ax = plt.subplots()
-    ax.axhline(y =sum(r_edge) / num_trials_other, color='b', alpha=.3, ls='-', label = 'Random Avg')
-    ax.axhline(y = sum(e_edge) / num_trials_other, color='g', alpha=.3, ls='-', label= 'Expectimax Avg')
-    ax.axhline(y = sum(o_edge) / num_trials_other, color='k', alpha=.3, ls='-', label = 'Optimal Avg')
+    ax.axhline(y = pooledEdge(r_stats), color='b', alpha=.3, ls='-', label = 'Random Avg')
+    ax.axhline(y = pooledEdge(e_stats), color='g', alpha=.3, ls='-', label= 'Expectimax Avg')
+    ax.axhline(y = pooledEdge(o_stats), color='k', alpha=.3, ls='-', label = 'Optimal Avg')
     ax.plot(n_trainings, q_edge, 'r-.', label="Q-Learning")
     
     
@@ -241,17 +241,9 @@ def graphQLearningPerformanceVsTrainingHands():
     plt.savefig(folder + 'qlearn_training.png')
 def graphAllPerformance():
     
-    print("-- STAT ENGINE RUNNING OPTIMAL AGENT --")
-    optimal_stats = runBlackjack(getOptimalArgs(100000))
-    
-    print("-- STAT ENGINE RUNNING RANDOM AGENT --")
-    random_stats = runBlackjack(getRandomArgs(100000))
-    
-    print("-- STAT ENGINE RUNNING EXPECTIMAX AGENT --")
-    expecti_stats = runBlackjack(getExpectiArgs(100000))
-
-    print("-- STAT ENGINE RUNNING QLEARNING AGENT --")
-    q_stats = runBlackjack(getQLearningArgs(500000,100000))
+    print("-- STAT ENGINE RUNNING OPTIMAL, RANDOM, EXPECTIMAX AND QLEARNING AGENTS --")
+    optimal_stats, random_stats, expecti_stats, q_stats = runSweep([getOptimalConfig(100000), getRandomConfig(100000),
+                                                                    getExpectiConfig(100000), getQLearningConfig(500000, 100000)], numWorkers)
 
     makePercentageVsAlgPlots(optimal_stats, random_stats, expecti_stats, q_stats)
     makeInversePercentageAlgPlots(optimal_stats, random_stats, expecti_stats, q_stats)
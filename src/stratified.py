@@ -0,0 +1,184 @@
+from math import sqrt
+import random
+import numpy as np
+
+from deck import CARDS, rankPoints, ACE_RANK
+from game import Game
+from runningStats import GameStats, Z_95
+
+"""
+Stratified simulation: with the infinite deck a round starts from one of 55 unordered pairs of player card
+values and 10 upcards, each with a known probability. Instead of drawing the initial deal at random, every
+one of those 550 strata is dealt a planned number of hands, the rest of each hand is played out as usual,
+and the per-stratum averages are combined with their exact probabilities. The variance that came from how
+many hands each starting deal happened to get is gone, so the house edge's confidence interval is tighter
+than plain Monte Carlo's for the same number of hands
+
+Hands go to the strata in proportion to their probability, or by Neyman allocation, in proportion to
+probability times the standard deviation of the stratum's payout, estimated from a proportional pilot
+"""
+
+# Card values, aces are 11, the ranks worth each value and its probability on one draw
+cardValues = list(range(2, 12))
+valueRanks = {value : [rank for rank, points in enumerate(rankPoints) if (11 if rank == ACE_RANK else points) == value] for value in cardValues}
+valueProbs = {value : len(ranks) / float(len(rankPoints)) for value, ranks in valueRanks.items()}
+
+# (lower player card value, higher player card value, upcard value) of every stratum, and its probability
+strata = [(low, high, upcard) for low in cardValues for high in cardValues if low <= high for upcard in cardValues]
+strataProbs = np.array([valueProbs[low] * valueProbs[high] * (1 if low == high else 2) * valueProbs[upcard] for low, high, upcard in strata])
+
+# Hands every stratum gets at least, so each has a variance, and at least in the pilot of a Neyman allocation
+MIN_STRATUM_HANDS = 2
+PILOT_STRATUM_HANDS = 10
+SHRINKAGE_HANDS = 20
+
+def allocate(nHands, weights, minimum = MIN_STRATUM_HANDS):
+    """ Split nHands across strata in proportion to weights after giving each minimum hands, by largest remainders """
+    counts = np.full(len(weights), minimum, dtype=np.int64)
+    if weights.sum() <= 0:
+        weights = strataProbs
+    shares = (nHands - counts.sum()) * weights / weights.sum()
+    counts += np.floor(shares).astype(np.int64)
+    remainders = shares - np.floor(shares)
+    counts[np.argsort(-remainders)[:nHands - counts.sum()]] += 1
+    return counts
+
+def dealStratum(stratum, rng):
+    """ Random (first player card, second player card, upcard) of a stratum, faces and suits drawn by rng """
+    low, high, upcard = strata[stratum]
+    values = [low, high] if rng.random() < .5 else [high, low]
+    return tuple(CARDS[4 * rng.choice(valueRanks[value]) + rng.randrange(4)] for value in values + [upcard])
+
+class StratifiedGame():
+    """
+    StratifiedGame plays the hands of a Game dealt stratum by stratum and reports the same stats as Game.playGame,
+    with the house edge and its confidence interval from the stratified estimate
+    """
+    allocations = ['proportional', 'neyman']
+
+    def __init__(self, agentType, nHands, startingMoney, nTraining = 0, seed = None, allocation = 'proportional', pilotFraction = .1, profile = False):
+        """
+        input: allocation
+            'proportional' or 'neyman'
+        input: pilotFraction
+            fraction of the hands dealt proportionally to estimate each stratum's deviation for Neyman allocation
+        input: profile
+            time each phase of every hand played, training ones included (see phaseProfile.py)
+        other inputs are the same as Game's, a q-learner's training hands are dealt at random
+        """
+        if allocation not in self.allocations:
+            raise ValueError("Allocation must be one of {}".format(self.allocations))
+        self.nHands = int(nHands)
+        minHands = (PILOT_STRATUM_HANDS if allocation == 'neyman' else MIN_STRATUM_HANDS) * len(strata)
+        if self.nHands < minHands:
+            raise ValueError("Stratified runs with {} allocation need at least {} hands, {} for each of the {} strata".format(allocation, minHands, minHands // len(strata), len(strata)))
+        self.allocation = allocation
+        self.pilotFraction = float(pilotFraction)
+        self.game = Game(False, agentType, self.nHands, startingMoney, nTraining, seed, stratified = True, profile = profile)
+        self.nTraining = int(nTraining) if self.game.q else 0
+        self.rng = random.Random(seed)
+        # Subscribe to the game's events here like on a Game
+        self.hooks = self.game.hooks
+
+    def isValidGame(self):
+        return self.game.isValidGame()
+
+    def playStrata(self, counts, hands, stats):
+        """
+        Deal counts[h] hands of every stratum h in a random order and play them
+        input: hands, iterHands of the game. stats, where each hand's (stratum, payout, bet) is appended
+        returns: False if the agent ran out of money
+        """
+        order = np.repeat(np.arange(len(strata)), counts).tolist()
+        self.rng.shuffle(order)
+        deals = self.game.gameState.deck.deals
+        deals.extend(dealStratum(stratum, self.rng) for stratum in order)
+        for stratum in order:
+            result = next(hands, None)
+            if result is None:
+                return False
+            stats.append((stratum, result))
+        return True
+
+    def playGame(self, report = True, targetCI = None):
+        """ Play the training hands, then every stratum's hands
+        returns: stat dictionary with summary of performance, same as Game.playGame but for the stratified
+            'houseEdge' and 'houseEdgeCI'. The plain average of the hands played is 'sampledHouseEdge'
+        """
+        if targetCI is not None:
+            raise ValueError("Stratified runs play a fixed number of hands")
+        game = self.game
+        hands = game.iterHands()
+        game.gameState.deck.deals.extend([None] * self.nTraining)
+        for i in range(self.nTraining):
+            next(hands)
+
+        played = []
+        if self.allocation == 'neyman':
+            nPilot = max(PILOT_STRATUM_HANDS * len(strata), int(self.nHands * self.pilotFraction))
+            if self.playStrata(allocate(nPilot, strataProbs, PILOT_STRATUM_HANDS), hands, played):
+                deviations = self.pilotDeviations(played, game.player.getBetAmt())
+                self.playStrata(allocate(self.nHands - nPilot, strataProbs * deviations, 0), hands, played)
+        else:
+            self.playStrata(allocate(self.nHands, strataProbs), hands, played)
+
+        gameStats = GameStats(game.startingMoney, game.player.getBetAmt())
+        for stratum, result in played:
+            gameStats.add(result.winStates, result.payout, result.bet)
+        stats = gameStats.report(report)
+
+        houseEdge, houseEdgeCI = self.estimate(played, gameStats.betAmt)
+        stats['sampledHouseEdge'] = stats['houseEdge']
+        stats['houseEdge'] = houseEdge
+        stats['houseEdgeCI'] = houseEdgeCI
+        stats['allocation'] = self.allocation
+        if game.profiler is not None:
+            stats['profile'] = game.profiler.report(report)
+        if report:
+            print("Stratified house edge: {:.3%} +/- {:.3%} with {} allocation across {} starting deals (the plain average of the same hands is {:.3%} +/- {:.3%})\n".format(
+                houseEdge, houseEdgeCI, self.allocation, len(strata), stats['sampledHouseEdge'], gameStats.running.houseEdgeCI()))
+        return stats
+
+    def strataSums(self, played, betAmt):
+        """ Number of hands, sums of payouts, bets and their squares and products of each stratum, in units of the bet """
+        idx = np.array([stratum for stratum, result in played], dtype=np.int64)
+        payouts = np.array([result.payout for stratum, result in played], dtype=float) / betAmt
+        bets = np.array([result.bet for stratum, result in played], dtype=float) / betAmt
+        sums = [np.bincount(idx, weights=values, minlength=len(strata)) for values in (np.ones(len(idx)), payouts, bets, payouts * payouts, bets * bets, payouts * bets)]
+        return sums
+
+    def pilotDeviations(self, played, betAmt):
+        """
+        Deviation of the round's payout in each stratum for Neyman allocation. A stratum's few pilot hands give a noisy
+        variance, so it's shrunk toward the variance of all the pilot hands as if that had been seen in SHRINKAGE_HANDS more
+        """
+        n, meanPayout, meanBet, variances = self.strataVariances(played, betAmt)
+        pooled = (strataProbs * variances).sum()
+        return np.sqrt((np.maximum(n - 1, 0) * variances + SHRINKAGE_HANDS * pooled) / (np.maximum(n - 1, 0) + SHRINKAGE_HANDS))
+
+    def strataVariances(self, played, betAmt):
+        """
+        Stratified means of the payout and bet of a round, weighted by the strata's exact probabilities, and the
+        sample variance of payout - ratio * bet within each stratum, where -ratio is the house edge estimate
+        returns: (hands of each stratum, mean payout, mean bet, variances)
+        """
+        n, payout, bet, payout2, bet2, payoutBet = self.strataSums(played, betAmt)
+        counted = np.maximum(n, 1)
+        meanPayout = (strataProbs * payout / counted).sum()
+        meanBet = (strataProbs * bet / counted).sum()
+        ratio = meanPayout / meanBet
+        sumSquares = payout2 - 2 * ratio * payoutBet + ratio * ratio * bet2
+        sumResiduals = payout - ratio * bet
+        variances = np.maximum(sumSquares - sumResiduals * sumResiduals / counted, 0) / np.maximum(n - 1, 1)
+        return n, meanPayout, meanBet, variances
+
+    def estimate(self, played, betAmt, z = Z_95):
+        """
+        Stratified estimate of the house edge and the half width of its confidence interval by the delta method,
+        infinite if a stratum has fewer than two hands
+        returns: (houseEdge, houseEdgeCI)
+        """
+        n, meanPayout, meanBet, variances = self.strataVariances(played, betAmt)
+        if (n < 2).any():
+            return -meanPayout / meanBet, float('inf')
+        return -meanPayout / meanBet, z * sqrt((strataProbs * strataProbs * variances / n).sum()) / meanBet
@@ -0,0 +1,112 @@
+from multiprocessing import Pool
+from collections import namedtuple
+from modulefinder import ModuleFinder
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from game import Game
+from runningStats import GameStats
+from util import atomicWrite
+
+"""
+Experiment sweeps: run a list of game configurations across a pool of worker processes and cache
+each result on disk, keyed by the configuration, its seed, the version of the simulator's code and numpy's.
+A sweep only plays the configurations that aren't cached yet, so regenerating graphs after nothing
+has changed plays no hands at all. Results are cached as their GameStats accumulator (see runningStats.py)
+and come back as the same stat dictionary a run returns
+"""
+
+# One run: agent type, q-learning training hands, testing hands, seed and starting money. Unseeded runs are never cached
+SweepConfig = namedtuple('SweepConfig', ['agentType', 'nTraining', 'nTesting', 'seed', 'startingMoney'])
+
+cacheFolder = "../sweepCache/"
+
+srcFolder = os.path.dirname(os.path.abspath(__file__))
+policyFile = os.path.join(srcFolder, '..', 'policy', 'optimal.csv')
+
+def codeFiles():
+    """
+    Source the results depend on: every module of this folder game.py imports, directly or not and wherever
+    the import is, found by reading the source so it doesn't depend on what the caller imported, and the optimal policy
+    """
+    finder = ModuleFinder(path = [srcFolder])
+    finder.run_script(os.path.join(srcFolder, 'game.py'))
+    modules = set(os.path.abspath(module.__file__) for module in finder.modules.values() if module.__file__)
+    return sorted(modules) + [policyFile]
+
+def codeVersion():
+    """ Hash of the contents of the code files, any change to the simulator changes it """
+    digest = hashlib.sha1()
+    for path in codeFiles():
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def cacheKey(config, version):
+    """ File name the result of a config is cached under for a code version and numpy version, whose generators deal the seeded cards """
+    fields = json.dumps([config.agentType, int(config.nTraining), int(config.nTesting), config.seed, int(config.startingMoney), version, np.__version__])
+    return hashlib.sha1(fields.encode()).hexdigest() + '.json'
+
+def runConfig(config):
+    """ Worker: play one config and return its GameStats accumulator as a dict, without printing a summary """
+    game = Game(False, config.agentType, config.nTesting, config.startingMoney, config.nTraining, config.seed)
+    return game.playGame(report = False)['gameStats']
+
+def readCached(path):
+    """ Cached accumulator at path, None if there's none """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def writeCached(path, values):
+    """ Cache an accumulator at path """
+    atomicWrite(path, 'w', lambda f: json.dump(values, f))
+
+def runSweep(configs, nWorkers = None, cacheDir = cacheFolder):
+    """
+    Run every config that isn't cached, across nWorkers processes (one per cpu if None), and cache the results
+    input: configs
+        list of SweepConfig, a config listed more than once is only played once
+    input: cacheDir
+        folder of the cached results, None to not cache
+    returns: list with the stat dictionary of each config, in order, see GameStats.report
+    """
+    configs = [SweepConfig(*config) for config in configs]
+    results = {}
+    paths = {}
+    if cacheDir is not None:
+        os.makedirs(cacheDir, exist_ok = True)
+        version = codeVersion()
+        for config in configs:
+            if config.seed is not None and config not in paths:
+                paths[config] = os.path.join(cacheDir, cacheKey(config, version))
+                cached = readCached(paths[config])
+                if cached is not None:
+                    results[config] = cached
+
+    toRun = []
+    for config in configs:
+        if config not in results and (config.seed is None or config not in toRun):
+            toRun.append(config)
+    print("-- SWEEP: playing {} runs for {} configs, the rest are cached or repeated --".format(len(toRun), len(configs)))
+
+    # Unseeded configs listed more than once are separate runs, so they're matched to results by position
+    unseeded = []
+    if toRun:
+        with Pool(nWorkers) as pool:
+            for config, values in zip(toRun, pool.imap(runConfig, toRun)):
+                if config.seed is None:
+                    unseeded.append(values)
+                    continue
+                results[config] = values
+                if config in paths:
+                    writeCached(paths[config], values)
+
+    unseeded = iter(unseeded)
+    return [GameStats.fromDict(results[config] if config.seed is not None else next(unseeded)).report(printSummary = False) for config in configs]
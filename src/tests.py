@@ -1,6 +1,33 @@
 from gameState import WinStates, GameState
-from deck import Hand, Card, Deck, Suit, Face
+from deck import Hand, Card, Deck, Shoe, Suit, Face
 from game import Game
+import probability
+import random
+from houseEdge import HouseEdgeCalculator, policyChooser, randomChooser
+from diskIO import readPolicy, readPolicyTable, policyStateCode, handTypeIdx, CAN_HIT, CAN_DOUBLE, CAN_SPLIT
+from agents import Expectimax, Dealer, QLearning, QState, qStateIdx, actionIdx
+from diskIO import QDictIO, policyStates, legalActionsFromMask
+import csv
+from actions import Actions
+from events import Events, MetricsCounter
+from runningStats import RunningStats, GameStats
+import json
+import os
+import tempfile
+from handHistory import HandHistoryWriter, HandHistory
+from offPolicy import OffPolicyEvaluator, epsilonGreedyChooser
+from sweep import runSweep, SweepConfig
+from learningCurve import learningCurve
+from houseEdge import qLearningChooser
+from compare import compareAgents
+from stratified import StratifiedGame, strata, strataProbs, allocate
+from deck import StratifiedDeck, CARDS
+from phaseProfile import Phases
+from benchmark import runBenchmarks, compareResults, writeResults, readResults, benchmarks
+from memProfile import MemoryProfiler
+import tracemalloc
+from batchGame import BatchGame
+from parallel import playParallel
 
 
 def checkActions():
@@ -68,9 +95,9 @@ def checkHand():
     hand.hand[0] = Card(Face.KING, Suit.CLUBS)
     status.append(hand.isBlackjack())
 
-    # checks for soft and hard hands
-    status.append(hand.isHard())
-    status.append(not hand.isSoft())
+    # checks for soft and hard hands, king and ace is a soft 21
+    status.append(not hand.isHard())
+    status.append(hand.isSoft())
     hand.receiveCard(Card(Face.QUEEN, Suit.HEARTS))
     status.append(hand.isHard())
     status.append(not hand.isSoft())
@@ -88,6 +115,515 @@ def checkHand():
 
     return status
 
+def checkProbability():
+    status = []
+
+    # dealer final totals are a distribution for every upcard
+    status.append(all(abs(sum(probability.dealerOutcomes(up).values()) - 1) < 1e-9 for up in range(2, 12)))
+
+    # only a ten or ace upcard can end in a dealer blackjack
+    status.append(abs(probability.dealerOutcomes(11)[probability.NATURAL] - 4 / 13.0) < 1e-9)
+    status.append(probability.NATURAL not in probability.dealerOutcomes(9))
+
+    # standing on 21 never loses, hitting hard 4 never busts
+    status.append(probability.standEV(21, 10) >= 0)
+    status.append(probability.hitEV(4, False, 6) > -1)
+
+    return status
+
+def checkHouseEdge():
+    status = []
+
+    # the optimal policy has a small house edge, the random one a huge one
+    optimal = HouseEdgeCalculator(policyChooser(readPolicy("../policy/optimal.csv"))).calculate()
+    status.append(0 < optimal['houseEdge'] < .01)
+    random = HouseEdgeCalculator(randomChooser()).calculate()
+    status.append(.25 < random['houseEdge'] < .4)
+
+    # doubling and splitting mean more than one bet per hand on average
+    status.append(optimal['expectedBet'] > 1)
+
+    return status
+
+def checkShoe():
+    status = []
+
+    # a full deck deals every card exactly once before running out
+    shoe = Shoe(1, 1.0)
+    dealt = [shoe.getRandomCard() for i in range(52)]
+    status.append(len(set((card.face, card.suit) for card in dealt)) == 52)
+    status.append(shoe.getNumCardsLeft() == 0)
+
+    # a hand started past the cut card reshuffles the whole shoe
+    shoe = Shoe(2, .5)
+    for i in range(52):
+        shoe.getRandomCard()
+    shoe.checkCutCard()
+    status.append(shoe.getNumCardsLeft() == 104)
+
+    return status
+
+def checkDeck():
+    status = []
+
+    # decks seeded the same deal the same cards, across block boundaries too
+    deck1 = Deck(random.Random(182), blockSize = 10)
+    deck2 = Deck(random.Random(182), blockSize = 10)
+    status.append([deck1.getRandomCard() for i in range(25)] == [deck2.getRandomCard() for i in range(25)])
+
+    # every card can come up
+    status.append(len(set((card.face, card.suit) for card in (deck1.getRandomCard() for i in range(5000)))) == 52)
+
+    return status
+
+def checkEvents():
+    status = []
+
+    # a metrics subscriber sees every hand, action and outcome the game reports
+    game = Game(False, 'optimal', 200, 1000000, 0, seed = 182)
+    metrics = game.hooks.subscribe(MetricsCounter())
+    stats = game.playGame(report = False)
+    status.append(metrics.events[Events.NEW_HAND] == 200)
+    status.append(metrics.outcomes == {state : n for state, n in stats['outcomes'].items() if n > 0})
+    status.append(sum(metrics.actions.values()) > 0)
+
+    # unsubscribed games emit nothing
+    game.hooks.unsubscribe(metrics)
+    status.append(len(game.hooks) == 0)
+
+    return status
+
+def checkIterHands():
+    status = []
+
+    # the stream has a record per hand that adds up to what playGame reports for the same seed
+    results = list(Game(False, 'random', 300, 1000000, 0, seed = 182).iterHands())
+    stats = Game(False, 'random', 300, 1000000, 0, seed = 182).playGame(report = False)
+    status.append(len(results) == 300)
+    status.append(sum(result.payout for result in results) == stats['totalWinnings'])
+    status.append(results[-1].money == stats['moneyLeft'])
+
+    # a q-learner's training hands come first and are flagged
+    results = list(Game(False, 'qlearning', 20, 1000000, 30, seed = 182).iterHands())
+    status.append([result.training for result in results] == [True] * 30 + [False] * 20)
+
+    # spelled 'q-learning' too
+    results = list(Game(False, 'q-learning', 20, 1000000, 30, seed = 182).iterHands())
+    status.append([result.training for result in results] == [True] * 30 + [False] * 20)
+
+    return status
+
+def checkRunningStats():
+    status = []
+
+    # merging two halves gives the same stats as counting every round in one
+    rounds = [(1, 1), (-2, 2), (0, 1), (1.5, 1), (-1, 1), (2, 2), (-1, 1)]
+    whole = RunningStats()
+    first = RunningStats()
+    second = RunningStats()
+    for i, (payout, bet) in enumerate(rounds):
+        whole.add(payout, bet)
+        (first if i < 3 else second).add(payout, bet)
+    first.merge(second)
+    status.append(first.n == whole.n)
+    status.append(abs(first.houseEdge() - whole.houseEdge()) < 1e-12)
+    status.append(abs(first.houseEdgeCI() - whole.houseEdgeCI()) < 1e-12)
+    status.append(abs(whole.houseEdge() - (-.5 / 9)) < 1e-12)
+
+    # a run stopped at a target confidence interval reaches it before the most hands allowed
+    stats = Game(False, 'optimal', 1000000, 100000000, 0, seed = 182).playGame(report = False, targetCI = .02)
+    status.append(stats['houseEdgeCI'] < .02 and stats['nRounds'] < 1000000)
+
+    return status
+
+def checkGameStats():
+    status = []
+
+    # merging is associative and survives a round trip through json
+    rounds = [([WinStates.WIN], 10, 10), ([WinStates.LOSE, WinStates.WIN], 0, 20), ([WinStates.LOSE], -20, 20),
+              ([WinStates.BLACKJACK], 15, 10), ([WinStates.PUSH], 0, 10), ([WinStates.LOSE], -10, 10)]
+    parts = []
+    for i in range(3):
+        part = GameStats(1000, 10)
+        for winStates, payout, bet in rounds[2 * i : 2 * i + 2]:
+            part.add(winStates, payout, bet)
+        parts.append(GameStats.fromDict(json.loads(json.dumps(part.toDict()))))
+    left = GameStats.fromDict(parts[0].toDict()).merge(GameStats.fromDict(parts[1].toDict())).merge(parts[2])
+    right = GameStats.fromDict(parts[0].toDict()).merge(GameStats.fromDict(parts[1].toDict()).merge(parts[2]))
+    whole = GameStats(1000, 10)
+    for winStates, payout, bet in rounds:
+        whole.add(winStates, payout, bet)
+    for merged in (left, right):
+        status.append(merged.outcomes == whole.outcomes and merged.histogram == whole.histogram)
+        status.append((merged.net, merged.maxNet, merged.minNet) == (whole.net, whole.maxNet, whole.minNet) == (-5, 10, -10))
+        status.append(abs(merged.running.houseEdgeCI() - whole.running.houseEdgeCI()) < 1e-12)
+    status.append((whole.nSplits, whole.nDoubles) == (1, 1))
+
+    return status
+
+def checkHandHistory():
+    status = []
+
+    # every round is written and read back with the payouts and bets the game reported
+    path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+    game = Game(False, 'optimal', 500, 1000000, 0, seed = 182)
+    writer = game.hooks.subscribe(HandHistoryWriter(path, bufferSize = 64))
+    stats = game.playGame(report = False)
+    writer.close()
+    records = HandHistory(path).records
+    status.append(len(records) == 500)
+    status.append(records['payouts'].sum() == stats['totalWinnings'] and records['bets'].sum() == stats['totalBet'])
+    status.append((records['nHands'] == 2).sum() == stats['gameStats']['nSplits'])
+    status.append(all(records['nPlayerCards'][:, 0] >= 2) and all(records['nDealerCards'] >= 1))
+
+    # the infinite deck's longest hands fit a record whole: six aces, a six and nine more aces
+    path = os.path.join(tempfile.mkdtemp(), 'long.bin')
+    writer = HandHistoryWriter(path)
+    hand = Hand()
+    for card in [Card(Face.ACE, Suit.SPADES)] * 6 + [Card(Face.SIX, Suit.CLUBS)] + [Card(Face.ACE, Suit.HEARTS)] * 9:
+        hand.receiveCard(card)
+    dealerHand = Hand()
+    dealerHand.receiveCard(Card(Face.TEN, Suit.CLUBS))
+    fields = {'playerHands' : [hand], 'dealerHand' : dealerHand, 'winStates' : [WinStates.PUSH], 'bets' : [10], 'payouts' : [0]}
+    writer.onEvent(Events.PAYOUT, fields)
+    writer.close()
+    records = HandHistory(path).records
+    status.append(records['nPlayerCards'][0, 0] == 16 and list(records['playerCards'][0, 0, :16]) == [card.index for card in hand.hand])
+
+    # and a hand too long for a record isn't cut short
+    for i in range(6):
+        hand.receiveCard(Card(Face.ACE, Suit.CLUBS))
+    writer = HandHistoryWriter(os.path.join(tempfile.mkdtemp(), 'tooLong.bin'))
+    try:
+        writer.onEvent(Events.PAYOUT, fields)
+        status.append(False)
+    except ValueError:
+        status.append(True)
+    writer.close()
+
+    return status
+
+def checkOffPolicy():
+    status = []
+
+    path = os.path.join(tempfile.mkdtemp(), 'random.bin')
+    game = Game(False, 'random', 3000, 1000000, 0, seed = 182)
+    writer = game.hooks.subscribe(HandHistoryWriter(path))
+    stats = game.playGame(report = False)
+    writer.close()
+    evaluator = OffPolicyEvaluator(path)
+
+    # the behavior policy scored against its own hands gets exactly what it played
+    results = evaluator.evaluate(randomChooser())
+    status.append(abs(results['houseEdge'] - stats['houseEdge']) < 1e-9)
+    status.append(abs(results['drHouseEdge'] - stats['houseEdge']) < .05)
+
+    # a mostly optimal policy scores far better than the random one
+    optimal = policyChooser(readPolicy("../policy/optimal.csv"))
+    status.append(evaluator.evaluate(epsilonGreedyChooser(optimal, .5))['houseEdge'] < results['houseEdge'] - .05)
+
+    return status
+
+def checkExpectimaxTable():
+    status = []
+
+    agent = Expectimax(1000)
+    hard, double = handTypeIdx['hard'], handTypeIdx['double']
+    status.append(agent.policy.getAction(policyStateCode(hard, 16, 10, CAN_HIT | CAN_DOUBLE)) == Actions.HIT)
+    status.append(agent.policy.getAction(policyStateCode(hard, 11, 6, CAN_HIT | CAN_DOUBLE)) == Actions.DOUBLE_DOWN)
+    status.append(agent.policy.getAction(policyStateCode(hard, 11, 6, CAN_HIT)) == Actions.HIT)
+    status.append(agent.policy.getAction(policyStateCode(double, 8, 6, CAN_HIT | CAN_DOUBLE | CAN_SPLIT)) == Actions.SPLIT)
+
+    # The first agent solves and writes the table, the next loads it, and a file that isn't a table is solved over
+    path = os.path.join(tempfile.mkdtemp(), 'expectimax.npy')
+    status.append(Expectimax(1000, path).policy.table == agent.policy.table)
+    status.append(readPolicyTable(path).table == agent.policy.table)
+    with open(path, 'w') as f:
+        f.write('not a table')
+    status.append(Expectimax(1000, path).policy.table == agent.policy.table)
+    status.append(readPolicyTable(path).table == agent.policy.table)
+
+    return status
+
+def checkSweep():
+    status = []
+
+    cacheDir = tempfile.mkdtemp()
+    configs = [SweepConfig('optimal', 0, 2000, seed, 1000000) for seed in (1, 2, 1)] + [SweepConfig('qlearning', 500, 1000, 3, 1000000)]
+    first = runSweep(configs, 2, cacheDir)
+    # A repeated config is played once, and every seeded config is cached
+    status.append(first[0] == first[2] and first[0] != first[1])
+    status.append(len(os.listdir(cacheDir)) == 3)
+    status.append(first[1]['houseEdge'] == Game(False, 'optimal', 2000, 1000000, 0, 2).playGame(report = False)['houseEdge'])
+
+    # Running it again reads every result back from the cache
+    status.append(runSweep(configs, 2, cacheDir) == first)
+
+    return status
+
+def checkLearningCurve():
+    status = []
+
+    curve = list(learningCurve([3000, 500, 1500], 1000000, seed = 4))
+    status.append([point.nTraining for point in curve] == [500, 1500, 3000])
+    status.append(all(point.houseEdgeCI == 0.0 for point in curve))
+
+    # The last point is the policy of the same agent trained on its own
+    game = Game(False, 'qlearning', 0, 1000000, 3000, 4)
+    for result in game.iterHands():
+        pass
+    status.append(abs(curve[-1].houseEdge - HouseEdgeCalculator(qLearningChooser(game.player)).calculate()['houseEdge']) < 1e-12)
+
+    simulated = list(learningCurve([500, 1500], 1000000, seed = 4, evalHands = 20000))
+    status.append(all(0 < point.houseEdgeCI < .05 for point in simulated))
+    status.append(all(abs(point.houseEdge - exact.houseEdge) < .05 for point, exact in zip(simulated, curve)))
+
+    return status
+
+def checkPairedComparison():
+    status = []
+
+    # Agents on the paired deck are dealt the same starting hands, and a q-learner's first hand after training is everyone's first hand
+    starts = []
+    for agentType, nTraining in (('optimal', 0), ('random', 0), ('qlearning', 50)):
+        game = Game(False, agentType, 100, 1000000, nTraining, 9, paired = True)
+        hands = []
+        game.hooks.subscribe(lambda event, fields: hands.append([]) if event == Events.NEW_HAND else hands[-1].append(fields['card']), [Events.NEW_HAND, Events.DEAL])
+        for result in game.iterHands():
+            pass
+        starts.append([hand[:3] for hand in hands[nTraining:]])
+    status.append(starts[0] == starts[1] == starts[2])
+
+    results = compareAgents(['optimal', 'expectimax', 'random'], 5000, 1000000, seed = 9, report = False)
+    status.append(results['nHands'] == 5000)
+    expectimax = results['differences']['expectimax']
+    edges = {agentType : stats['houseEdge'] for agentType, stats in results['agents'].items()}
+    status.append(abs(expectimax['difference'] - (edges['expectimax'] - edges['optimal'])) < 1e-12)
+    # Close policies on the same cards differ far less than their runs vary
+    status.append(expectimax['ci'] < expectimax['independentCI'] / 3)
+    status.append(results['differences']['random']['difference'] > .2)
+
+    return status
+
+def checkStratified():
+    status = []
+
+    status.append(len(strata) == 550 and abs(strataProbs.sum() - 1) < 1e-12)
+    counts = allocate(5000, strataProbs)
+    status.append(counts.sum() == 5000 and counts.min() >= 2)
+
+    # A chosen deal is dealt first, then random cards
+    deck = StratifiedDeck(random.Random(3))
+    deck.deals.extend([(CARDS[0], CARDS[40], CARDS[20]), None])
+    deck.checkCutCard()
+    status.append([deck.getRandomCard(), deck.getRandomCard(), deck.getDealerCard()] == [CARDS[0], CARDS[40], CARDS[20]])
+    deck.checkCutCard()
+    status.append(deck.getRandomCard() in CARDS)
+    # Past the queued deals hands are dealt at random, a stratified game works on its own
+    deck.checkCutCard()
+    status.append(deck.getRandomCard() in CARDS and deck.getDealerCard() in CARDS)
+    status.append(Game(False, 'optimal', 200, 1000000, 0, seed = 3, stratified = True).playGame(report = False)['nRounds'] == 200)
+
+    exact = HouseEdgeCalculator(policyChooser(readPolicy("../policy/optimal.csv"))).calculate()['houseEdge']
+    for allocation in ('proportional', 'neyman'):
+        stats = StratifiedGame('optimal', 6000, 1000000, seed = 11, allocation = allocation).playGame(report = False)
+        status.append(stats['nRounds'] == 6000 and stats['allocation'] == allocation)
+        status.append(abs(stats['houseEdge'] - exact) < 2 * stats['houseEdgeCI'])
+
+    return status
+
+def checkPhaseProfile():
+    status = []
+
+    stats = Game(False, 'qlearning', 1000, 1000000, 1000, seed = 4, profile = True).playGame(report = False)
+    profile = stats['profile']
+    phases = profile['phases']
+    status.append(profile['nHands'] == 2000 and phases[Phases.DEAL]['calls'] == 2000 and phases[Phases.WIN_STATE]['calls'] == 2000)
+    status.append(profile['nDecisions'] == phases[Phases.ACTION]['calls'] == phases[Phases.SUCCESSOR]['calls'] > 0)
+    status.append(phases[Phases.Q_UPDATE]['calls'] > 0 and phases[Phases.DEALER]['calls'] > 0)
+    status.append(abs(sum(values['percent'] for values in phases.values()) - 1) < 1e-9 and profile['handsPerSec'] > 0)
+
+    # Nothing is timed without profiling
+    game = Game(False, 'optimal', 100, 1000000, 0, seed = 4)
+    status.append(game.profiler is None and 'profile' not in game.playGame(report = False))
+
+    return status
+
+def checkBenchmarks():
+    status = []
+
+    results = runBenchmarks(scale = .01, repeats = 1, report = False)
+    status.append(sorted(results['benchmarks']) == sorted(benchmark.name for benchmark in benchmarks))
+    status.append(all(result['opsPerSec'] > 0 and result['ops'] > 0 for result in results['benchmarks'].values()))
+
+    path = os.path.join(tempfile.mkdtemp(), 'bench.json')
+    writeResults(results, path)
+    status.append(readResults(path) == json.loads(json.dumps(results)))
+
+    # A benchmark 20% slower is a regression at a 10% threshold and not at 25%
+    slower = json.loads(json.dumps(results))
+    slower['benchmarks']['deck.getRandomCard']['opsPerSec'] *= .8
+    comparison = compareResults(results, slower, .1, report = False)
+    status.append([name for name, values in comparison.items() if values['regression']] == ['deck.getRandomCard'])
+    status.append(abs(comparison['deck.getRandomCard']['change'] + .2) < 1e-9)
+    status.append(not any(values['regression'] for values in compareResults(results, slower, .25, report = False).values()))
+
+    return status
+
+def checkMemProfile():
+    status = []
+
+    game = Game(False, 'qlearning', 500, 1000000, 1000, seed = 6)
+    memory = game.hooks.subscribe(MemoryProfiler(game.player, interval = 500))
+    memory.start()
+    game.playGame(report = False)
+    stats = memory.report(printSummary = False)
+    status.append(not tracemalloc.is_tracing())
+
+    status.append(stats['nHands'] == 1500 and stats['peakBytes'] > 0 and 0 < stats['handPeakBytes'] <= stats['maxHandPeakBytes'] <= stats['peakBytes'])
+    status.append(0 < len(stats['topModules']) <= 10 and all(module['module'].endswith('.py') or module['module'].startswith('<') for module in stats['topModules']))
+
+    # A point at the start and every 500 hands, the q-learner sees more states as it plays
+    timeline = stats['timeline']
+    status.append([point['nHands'] for point in timeline] == [0, 500, 1000, 1500])
+    status.append(timeline[0]['qStatesSeen'] == 0 and timeline[-1]['qStatesSeen'] >= timeline[1]['qStatesSeen'] > 0)
+    status.append(timeline[-1]['pairsVisited'] == int((game.player.NVisited > 0).sum()))
+
+    return status
+
+def checkBatchGame():
+    status = []
+
+    # The vectorized rules land on the exact house edge of the same policy, within the run's interval
+    exact = HouseEdgeCalculator(policyChooser(readPolicy("../policy/optimal.csv"))).calculate()['houseEdge']
+    stats = BatchGame('optimal', 400000, 100000000, seed = 5).playGame(report = False)
+    status.append(abs(exact - .00481) < 1e-4)
+    status.append(stats['nRounds'] == 400000 and abs(stats['houseEdge'] - exact) < stats['houseEdgeCI'])
+
+    # The same seed plays the same hands
+    again = BatchGame('optimal', 400000, 100000000, seed = 5).playGame(report = False)
+    status.append(again['gameStats'] == stats['gameStats'])
+
+    return status
+
+def checkGameSeeding():
+    status = []
+
+    # A seeded game leaves the global random module alone
+    state = random.getstate()
+    Game(False, 'random', 50, 1000000, 0, seed = 7).playGame(report = False)
+    status.append(random.getstate() == state)
+
+    # Games built and played in between don't change a seeded game's hands
+    first = Game(False, 'qlearning', 500, 1000000, 500, seed = 7)
+    Game(False, 'random', 200, 1000000, 0, seed = 8).playGame(report = False)
+    interleaved = [(result.payout, result.bet) for result in first.iterHands()]
+    alone = [(result.payout, result.bet) for result in Game(False, 'qlearning', 500, 1000000, 500, seed = 7).iterHands()]
+    status.append(interleaved == alone)
+
+    return status
+
+def checkParallelSeeding():
+    status = []
+
+    # The same seed and number of workers play the same hands
+    first = playParallel('qlearning', 3000, 1000000, 1000, 3, seed = 12)
+    second = playParallel('qlearning', 3000, 1000000, 1000, 3, seed = 12)
+    status.append(first['gameStats'] == second['gameStats'])
+    status.append(first['nRounds'] == 3000)
+
+    return status
+
+def checkQTables():
+    status = []
+
+    # Hard 16 against a ten
+    agent = QLearning(1000000, 100)
+    playerHand = Hand()
+    playerHand.receiveCard(Card(Face.NINE, Suit.CLUBS))
+    playerHand.receiveCard(Card(Face.SEVEN, Suit.HEARTS))
+    dealerHand = Hand()
+    dealerHand.receiveCard(Card(Face.TEN, Suit.SPADES))
+    state = GameState(False, Dealer(), dealerHand, agent, [playerHand], Deck(random.Random(0)))
+    row = qStateIdx(10, 16, True)
+
+    # Standing ends the player's turn, the next state is worth nothing and the first visit has alpha 1
+    nextState = state.generatePlayerSuccessor(Actions.STAND)
+    agent.update(state, Actions.STAND, nextState, -10)
+    status.append(agent.QValues[row, actionIdx[Actions.STAND]] == -10 and agent.NVisited[row, actionIdx[Actions.STAND]] == 1)
+    agent.update(state, Actions.STAND, nextState, 10)
+    status.append(abs(agent.QValues[row, actionIdx[Actions.STAND]] - (-10 + 20 / 2 ** agent.omega)) < 1e-12)
+    status.append(agent.NVisited[row, actionIdx[Actions.STAND]] == 2 and agent.NVisited.sum() == 2)
+    status.append(agent.QValues[row, actionIdx[Actions.HIT]] == 0 and (agent.QValues != 0).sum() == 1)
+
+    # The dict has the seen state with every action (split too, 16 is even) and is what QDictIO writes
+    QDict = agent.getQDict()
+    status.append(list(QDict.keys()) == [QState.fromValues(10, 16, True)])
+    values = QDict[QState.fromValues(10, 16, True)]
+    status.append(sorted(values) == sorted(Actions.allActs) and values[Actions.STAND] == agent.QValues[row, actionIdx[Actions.STAND]])
+
+    folder = os.path.join(tempfile.mkdtemp(), 'src')
+    os.mkdir(folder)
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        QDictIO(QDict).write()
+    finally:
+        os.chdir(cwd)
+    with open(os.path.join(folder, '..', 'Q.csv')) as f:
+        rows = list(csv.DictReader(f))
+    status.append(len(rows) == 1 and (rows[0]['pv'], rows[0]['dv'], rows[0]['hard']) == ('16', '10', 'True'))
+    status.append(float(rows[0]['stand']) == values[Actions.STAND] and float(rows[0]['hit']) == 0.0 and rows[0]['policy'].split('-')[0] == Actions.STAND)
+
+    return status
+
+def checkCompiledPolicy():
+    status = []
+
+    # Every state's compiled action is the first legal one of the dictionary's list, as the lookup resolved it
+    policy = readPolicy("../policy/optimal.csv")
+    matches = []
+    for handType, playerVal, total, soft, dealerVal, legalMask in policyStates():
+        actions = policy.getActionsFromPolicy(handType, playerVal, dealerVal)
+        expected = next((action for action in actions if action in legalActionsFromMask(legalMask)), None)
+        matches.append(policy.getAction(policyStateCode(handTypeIdx[handType], playerVal, dealerVal, legalMask)) == expected)
+    status.append(len(matches) > 0 and all(matches))
+
+    # Double else hit and double else stand fall back once doubling isn't allowed
+    status.append(policy.getActionsFromPolicy('hard', 11, 6) == [Actions.DOUBLE_DOWN, Actions.HIT])
+    status.append(policy.getAction(policyStateCode(handTypeIdx['hard'], 11, 6, CAN_HIT | CAN_DOUBLE)) == Actions.DOUBLE_DOWN)
+    status.append(policy.getAction(policyStateCode(handTypeIdx['hard'], 11, 6, CAN_HIT)) == Actions.HIT)
+    status.append(policy.getActionsFromPolicy('soft', 18, 6) == [Actions.DOUBLE_DOWN, Actions.STAND])
+    status.append(policy.getAction(policyStateCode(handTypeIdx['soft'], 18, 6, CAN_HIT)) == Actions.STAND)
+
+    return status
+
+def checkDealerSampling():
+    import numpy as np
+    status = []
+
+    # Frequencies of the sampled finals for every upcard match the exact distribution, within 4 standard errors
+    table = probability.dealerTable()
+    n = 100000
+    upcards = np.repeat(np.arange(2, 12), n)
+    totals, naturals = table.sampleArray(upcards, np.random.default_rng(9))
+    status.append(all(totals[naturals] == 21))
+    for upcard in range(2, 12):
+        rows = upcards == upcard
+        for final, p in table.getOutcomes(upcard).items():
+            if final == probability.NATURAL:
+                freq = naturals[rows].mean()
+            else:
+                freq = ((totals[rows] == final) & ~naturals[rows]).mean()
+            status.append(abs(freq - p) <= 4 * (p * (1 - p) / n) ** .5 + 1e-12)
+
+    # One at a time too
+    rng = random.Random(9)
+    draws = [table.sample(6, rng) for i in range(n)]
+    status.append(all(abs(draws.count(final) / float(n) - p) <= 4 * (p * (1 - p) / n) ** .5 for final, p in table.getOutcomes(6).items()))
+
+    return status
+
 
 print('Test #1: Correct Hand Functionality')
 if all(test == True for test in checkHand()[:4]):
@@ -154,3 +690,147 @@ if checkActions()[4]:
     print('Pass')
 else:
     print ('Fail')
+
+print('Test #12: Exact Dealer Probabilities')
+if all(checkProbability()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #13: Exact House Edge')
+if all(checkHouseEdge()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #14: Shoe Dealing and Reshuffling')
+if all(checkShoe()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #15: Seeded Deck Draws')
+if all(checkDeck()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #16: Game Events')
+if all(checkEvents()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #17: Streamed Hand Results')
+if all(checkIterHands()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #18: Running Stats and Early Stopping')
+if all(checkRunningStats()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #19: Mergeable Game Stats')
+if all(checkGameStats()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #20: Hand History Log')
+if all(checkHandHistory()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #21: Off-Policy Evaluation')
+if all(checkOffPolicy()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #22: Expectimax Policy Table')
+if all(checkExpectimaxTable()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #23: Cached Experiment Sweeps')
+if all(checkSweep()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #24: Q-Learning Curve From One Run')
+if all(checkLearningCurve()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #25: Paired Comparison on Common Cards')
+if all(checkPairedComparison()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #26: Stratified Initial Deals')
+if all(checkStratified()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #27: Per-Phase Profiling')
+if all(checkPhaseProfile()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #28: Benchmark Suite')
+if all(checkBenchmarks()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #29: Memory Profiling')
+if all(checkMemProfile()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #30: Batch Simulator Against the Exact House Edge')
+if all(checkBatchGame()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #31: Seeded Games Keep Their Own Streams')
+if all(checkGameSeeding()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #32: Parallel Runs Reproduce With the Same Seed')
+if all(checkParallelSeeding()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #33: Q-Learning Tables')
+if all(checkQTables()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #34: Compiled Policy Table Matches the Dictionary Lookup')
+if all(checkCompiledPolicy()):
+    print('Pass')
+else:
+    print ('Fail')
+
+print('Test #35: Sampled Dealer Finals Match Their Distribution')
+if all(checkDealerSampling()):
+    print('Pass')
+else:
+    print ('Fail')
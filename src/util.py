@@ -1,4 +1,4 @@
-import sys, inspect, random
+import sys, inspect, random, os
 
 def raiseNotDefined():
     """ Raise not defined: Print the error location and exit if function hasn't been defined """
@@ -25,3 +25,15 @@ def vPrint(string, verbosity):
     if verbosity:
         print(string)
 
+def atomicWrite(path, mode, writer):
+    """
+    Write a file through writer, a function of the open file, to a temporary file next to path and
+    move it over path in one step, so readers (or other processes writing it) never see half of it
+    input: mode
+        'w' or 'wb'
+    """
+    tmpName = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmpName, mode) as f:
+        writer(f)
+    os.replace(tmpName, path)
+